@@ -0,0 +1,59 @@
+"""
+Compara a decodificação completa com a decodificação reduzida (draft) de JPEGs.
+
+Mede o tempo de carregamento + redimensionamento para a resolução alvo nos dois
+modos e a diferença visual entre os resultados (PSNR, em dB).
+
+Exemplo:
+    python benchmark_decode.py --megapixels 24 --repeat 5
+    python benchmark_decode.py foto1.jpg foto2.jpg
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark_pipeline import psnr, synthetic_image
+from photo_processor_core import TARGET_RESOLUTION, load_image, resize_to_cover
+
+
+def make_synthetic_jpeg(path, megapixels):
+    """Gera um JPEG 3:2 com gradientes e textura fina (detalhe que o draft pode perder)."""
+    width = int((megapixels * 1_000_000 * 1.5) ** 0.5)
+    synthetic_image(width, int(width / 1.5)).save(path, "JPEG", quality=92)
+
+
+def time_path(path, fast_decode, repeat):
+    """Tempo médio (s) de load_image + resize_to_cover e o último resultado."""
+    elapsed = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = resize_to_cover(load_image(path, TARGET_RESOLUTION, fast_decode), TARGET_RESOLUTION)
+        elapsed.append(time.perf_counter() - started)
+    return sum(elapsed) / len(elapsed), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark da decodificação reduzida (draft) de JPEGs.")
+    parser.add_argument("files", nargs="*", help="JPEGs a medir (padrão: gera um arquivo sintético)")
+    parser.add_argument("--megapixels", type=float, default=24, help="Tamanho do JPEG sintético (padrão: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições por modo (padrão: %(default)s)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = [Path(f) for f in args.files]
+        if not files:
+            files = [Path(tmp) / f"sintetica_{args.megapixels:g}mp.jpg"]
+            make_synthetic_jpeg(files[0], args.megapixels)
+
+        print(f"{'arquivo':<30} {'completo (s)':>12} {'draft (s)':>10} {'ganho':>7} {'PSNR (dB)':>10}")
+        for path in files:
+            full_time, full_img = time_path(path, False, args.repeat)
+            draft_time, draft_img = time_path(path, True, args.repeat)
+            print(f"{path.name[:30]:<30} {full_time:>12.3f} {draft_time:>10.3f} "
+                  f"{full_time / draft_time:>6.1f}x {psnr(full_img, draft_img):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
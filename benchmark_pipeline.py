@@ -0,0 +1,387 @@
+"""
+Benchmark do pipeline de fotos com arquivos sintéticos.
+
+Gera um conjunto de entrada (JPEG/PNG/TIFF/BMP em 12/24/45 MP, com e sem GPS
+no EXIF, retrato, paisagem e panorâmica), mede cada estágio isoladamente
+(decodificação, redimensionamento, metadados, marca d'água, codificação e
+gravação) e a execução completa via run_batch, nos backends de transformação
+PIL e NumPy/OpenCV (com verificação de paridade por PSNR). O geocoding é resolvido por um
+gazetteer local, sem acesso à rede. O resultado é um JSON com fotos/s,
+latências p50/p95 por estágio e pico de memória (RSS), para comparar commits.
+
+Exemplo:
+    python benchmark_pipeline.py --sizes 12,24 --workers 1,4 --output bench.json
+    python benchmark_pipeline.py --sizes 24 --backends pil,opencv --min-psnr 35 --parity-sizes 2
+"""
+import argparse
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import PIL
+from PIL import Image
+from PIL.TiffImagePlugin import IFDRational
+
+from encoder_profiles import DEFAULT_PROFILE, ENCODER_PROFILES
+from geocode_cache import GeocodeConfig
+from memory_budget import peak_rss_mb as process_peak_rss_mb
+from geocode_stage import GeocodeStage
+from photo_processor_core import (TARGET_RESOLUTION, TRANSFORM_BACKENDS, apply_address, apply_image_watermark,
+                                  build_metadata, decode_image, encode_jpeg, read_exif, resize_to_cover, run_batch)
+
+# (formato, extensão, suporta EXIF)
+FIXTURE_FORMATS = {
+    "jpg": ("JPEG", ".jpg", True),
+    "png": ("PNG", ".png", True),
+    "tiff": ("TIFF", ".tiff", True),
+    "bmp": ("BMP", ".bmp", False),
+}
+FIXTURE_GPS = (-3.1019, -60.0250) # Manaus: resolvido pelo gazetteer sintético
+STAGES = ("decode", "resize", "metadata", "watermark", "encode", "write")
+DEFAULT_MIN_PSNR = 35.0 # dB: abaixo disso o backend opencv diverge visivelmente do PIL
+DEFAULT_PARITY_SIZES = [2] # Megapixels extras da paridade: fotos com menos de 1080 linhas passam pela ampliação
+
+
+def synthetic_image(width, height, seed=0):
+    """Imagem RGB com gradientes e textura fina (detalhe que a decodificação reduzida pode perder)."""
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    rng = np.random.default_rng(seed)
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    pixels[..., 0] = (x + y) / 2
+    pixels[..., 1] = np.abs(x - y)
+    pixels[..., 2] = np.clip(128 + 60 * np.sin(x / 7.0) * np.cos(y / 11.0), 0, 255)
+    pixels[::2, ::2] = np.clip(pixels[::2, ::2].astype(np.int16) + rng.integers(-20, 20, (1, 1, 3)), 0, 255)
+    return Image.fromarray(pixels)
+
+
+def _dimensions(megapixels, aspect):
+    """Largura e altura para o total de megapixels e a proporção (largura/altura)."""
+    height = int((megapixels * 1_000_000 / aspect) ** 0.5)
+    return int(height * aspect), height
+
+
+def _gps_exif(lat, lon):
+    """EXIF com data de captura e coordenadas GPS."""
+    def dms(value):
+        value = abs(value)
+        degrees = int(value)
+        minutes = int((value - degrees) * 60)
+        seconds = round(((value - degrees) * 60 - minutes) * 60 * 100)
+        return (IFDRational(degrees, 1), IFDRational(minutes, 1), IFDRational(seconds, 100))
+
+    exif = Image.Exif()
+    exif[0x0132] = "2025:03:15 20:30:00" # DateTime
+    exif[0x010F] = "Benchmark" # Make
+    exif[0x0110] = "Sintetica" # Model
+    exif.get_ifd(0x8825).update({1: "N" if lat >= 0 else "S", 2: dms(lat), 3: "E" if lon >= 0 else "W", 4: dms(lon)})
+    return exif
+
+
+def fixture_specs(sizes, formats):
+    """Lista (nome, megapixels, formato, proporção, com GPS) do conjunto sintético."""
+    specs = []
+    for megapixels in sizes:
+        for fmt in formats:
+            has_exif = FIXTURE_FORMATS[fmt][2]
+            specs.append((f"{megapixels:g}mp_paisagem_{'gps' if has_exif else 'semgps'}", megapixels, fmt, 3 / 2, has_exif))
+            specs.append((f"{megapixels:g}mp_retrato_semgps", megapixels, fmt, 2 / 3, False))
+        specs.append((f"{megapixels:g}mp_panoramica_gps", megapixels, "jpg", 3.0, True))
+    return specs
+
+
+def generate_fixtures(folder, sizes, formats):
+    """Cria (ou reaproveita) os arquivos sintéticos e o gazetteer usado no lugar do Nominatim."""
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    files = []
+    for seed, (name, megapixels, fmt, aspect, with_gps) in enumerate(fixture_specs(sizes, formats)):
+        pil_format, extension, _ = FIXTURE_FORMATS[fmt]
+        path = folder / f"{name}{extension}"
+        if not path.exists():
+            img = synthetic_image(*_dimensions(megapixels, aspect), seed=seed)
+            options = {"exif": _gps_exif(*FIXTURE_GPS)} if with_gps else {}
+            if pil_format == "JPEG":
+                options["quality"] = 92
+            elif pil_format == "PNG":
+                options["compress_level"] = 1 # Gerar PNGs grandes com compressão máxima levaria minutos
+            img.save(path, pil_format, **options)
+        files.append(path)
+
+    gazetteer_path = folder / "gazetteer.csv"
+    gazetteer_path.write_text("lat,lon,city,state,country,postcode\n"
+                              f"{FIXTURE_GPS[0]},{FIXTURE_GPS[1]},Manaus,Amazonas,Brasil,69000-000\n",
+                              encoding="utf-8")
+    watermark_path = folder / "marca.png"
+    if not watermark_path.exists():
+        Image.new("RGBA", (600, 150), (255, 255, 255, 160)).save(watermark_path)
+    return files, gazetteer_path, watermark_path
+
+
+def psnr(a, b):
+    """Relação sinal-ruído de pico entre duas imagens RGB do mesmo tamanho."""
+    mse = np.mean((np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)) ** 2)
+    return float("inf") if mse == 0 else float(10 * np.log10(255.0 ** 2 / mse))
+
+
+def transform(img, watermark_path, backend):
+    """Redimensionamento + marca d'água no backend escolhido; retorna a imagem e a duração (s) de cada etapa."""
+    if backend == "opencv":
+        from cv_transform import blend_watermark, resize_to_cover_array
+        t0 = time.perf_counter()
+        frame = resize_to_cover_array(img, TARGET_RESOLUTION)
+        t1 = time.perf_counter()
+        blend_watermark(frame, str(watermark_path))
+        frame = Image.fromarray(frame) # Conversão de volta para PIL conta junto com a marca d'água
+    else:
+        t0 = time.perf_counter()
+        frame = resize_to_cover(img, TARGET_RESOLUTION)
+        t1 = time.perf_counter()
+        frame = apply_image_watermark(frame, str(watermark_path))
+    return frame, t1 - t0, time.perf_counter() - t1
+
+
+def percentile(values, pct):
+    """Percentil (0-100) por interpolação linear; None para lista vazia."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples):
+    """Estatísticas (em ms) de uma lista de durações em segundos."""
+    return {
+        "count": len(samples),
+        "mean_ms": round(1000 * sum(samples) / len(samples), 2) if samples else None,
+        "p50_ms": round(1000 * percentile(samples, 50), 2) if samples else None,
+        "p95_ms": round(1000 * percentile(samples, 95), 2) if samples else None,
+    }
+
+
+def peak_rss_mb():
+    """Pico de memória residente deste processo e dos processos filhos já encerrados."""
+    own = process_peak_rss_mb()
+    if own is None:
+        return None
+    return {"self": own, "children": process_peak_rss_mb(children=True)}
+
+
+def locate(metadata, geocoder):
+    """Endereço das coordenadas dos metadados pelo GeocodeStage (o mesmo caminho do run_batch)."""
+    coordinates = metadata["exif_data"]["location"]["coordinates"]
+    if coordinates:
+        address_details, _ = geocoder.submit(*coordinates).result()
+        apply_address(metadata, address_details)
+    return metadata
+
+
+def bench_stages(files, watermark_path, fast_decode, repeat, output_dir, geocoder, backend="pil",
+                 profile=DEFAULT_PROFILE):
+    """Mede cada estágio isoladamente, no processo atual (metadados incluem o geocoding pelo geocoder)."""
+    samples = {stage: [] for stage in STAGES}
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for path in files:
+            data = path.read_bytes()
+
+            t0 = time.perf_counter()
+            with Image.open(io.BytesIO(data)) as source_img:
+                exif_data = read_exif(source_img)
+                img = decode_image(source_img, TARGET_RESOLUTION, fast_decode)
+            t1 = time.perf_counter()
+            frame, resize_seconds, watermark_seconds = transform(img, watermark_path, backend)
+            t2 = time.perf_counter()
+            locate(build_metadata(path, exif_data), geocoder)
+            t3 = time.perf_counter()
+            jpeg_bytes = encode_jpeg(frame, ENCODER_PROFILES[profile])
+            t4 = time.perf_counter()
+            (Path(output_dir) / f"{path.stem}.jpg").write_bytes(jpeg_bytes)
+            t5 = time.perf_counter()
+
+            for stage, seconds in zip(STAGES, (t1 - t0, resize_seconds, t3 - t2, watermark_seconds, t4 - t3, t5 - t4)):
+                samples[stage].append(seconds)
+    elapsed = time.perf_counter() - started
+    images = len(files) * repeat
+    return {
+        "backend": backend,
+        "profile": profile,
+        "fast_decode": fast_decode,
+        "images": images,
+        "images_per_s": round(images / elapsed, 2),
+        "stages": {stage: summarize(values) for stage, values in samples.items()},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_backend_parity(files, watermark_path, fast_decode, min_psnr):
+    """Compara a saída (redimensionamento + marca d'água) do backend opencv com a do PIL, foto a foto."""
+    rows = []
+    for path in files:
+        with Image.open(path) as source_img:
+            img = decode_image(source_img, TARGET_RESOLUTION, fast_decode)
+        reference, pil_resize, pil_watermark = transform(img, watermark_path, "pil")
+        candidate, cv_resize, cv_watermark = transform(img, watermark_path, "opencv")
+        rows.append({
+            "file": path.name,
+            "psnr_db": round(psnr(reference, candidate), 2),
+            "pil_ms": round(1000 * (pil_resize + pil_watermark), 2),
+            "opencv_ms": round(1000 * (cv_resize + cv_watermark), 2),
+        })
+    worst = min(row["psnr_db"] for row in rows)
+    return {"fast_decode": fast_decode, "min_psnr_db": worst, "threshold_db": min_psnr, "ok": worst >= min_psnr,
+            "files": rows}
+
+
+def bench_end_to_end(input_dir, watermark_path, geocode_config, workers, fast_decode, output_dir, backend="pil",
+                     profile=DEFAULT_PROFILE, memory_budget_mb=None):
+    """Executa run_batch completo e coleta as durações por estágio de cada foto."""
+    samples = {}
+    started = time.perf_counter()
+
+    def on_progress(completed, total, result):
+        for stage, seconds in (result.timings or {}).items():
+            samples.setdefault(stage, []).append(seconds)
+
+    summary = run_batch(input_dir, output_dir, watermark_path=str(watermark_path), workers=workers,
+                        geocode_config=geocode_config, fast_decode=fast_decode, resume=False,
+                        transform_backend=backend, encoder_profile=profile, memory_budget_mb=memory_budget_mb,
+                        on_progress=on_progress)
+    elapsed = time.perf_counter() - started
+    return {
+        "workers": workers,
+        "backend": backend,
+        "profile": profile,
+        "fast_decode": fast_decode,
+        "images": summary.processed,
+        "errors": len(summary.errors),
+        "wall_s": round(elapsed, 3),
+        "images_per_s": round(summary.processed / elapsed, 2) if elapsed > 0 else None,
+        "stages": {stage: summarize(values) for stage, values in samples.items()},
+        "peak_rss_mb": peak_rss_mb(),
+        "memory": summary.memory._asdict(),
+    }
+
+
+def _int_list(value):
+    return [int(part) for part in value.split(",") if part]
+
+
+def _float_list(value):
+    return [float(part) for part in value.split(",") if part]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline de fotos com entradas sintéticas.")
+    parser.add_argument("--sizes", type=_float_list, default=[12, 24, 45],
+                        help="Tamanhos em megapixels, separados por vírgula (padrão: 12,24,45)")
+    parser.add_argument("--formats", default="jpg,png,tiff,bmp",
+                        help="Formatos de entrada (padrão: %(default)s)")
+    parser.add_argument("--workers", type=_int_list, default=[1, 4],
+                        help="Quantidades de processos para a execução completa (padrão: 1,4)")
+    parser.add_argument("--decode", default="fast,full", help="Modos de decodificação: fast, full (padrão: %(default)s)")
+    parser.add_argument("--backends", default="pil,opencv",
+                        help="Backends de transformação a comparar (padrão: %(default)s)")
+    parser.add_argument("--profiles", default=DEFAULT_PROFILE,
+                        help=f"Perfis JPEG a medir ({', '.join(ENCODER_PROFILES)}; padrão: %(default)s)")
+    parser.add_argument("--min-psnr", type=float, default=DEFAULT_MIN_PSNR,
+                        help="PSNR mínimo (dB) do backend opencv em relação ao PIL (padrão: %(default)s)")
+    parser.add_argument("--parity-sizes", type=_float_list, default=DEFAULT_PARITY_SIZES,
+                        help="Tamanhos extras (megapixels) só para a paridade dos backends (padrão: 2)")
+    parser.add_argument("--memory-budget", type=float, default=None,
+                        help="Orçamento de memória (MiB) da execução completa (padrão: sem limite)")
+    parser.add_argument("--repeat", type=int, default=1, help="Repetições da medição por estágio (padrão: %(default)s)")
+    parser.add_argument("--fixtures", default=None,
+                        help="Pasta dos arquivos sintéticos (reaproveitados entre execuções; padrão: temporária)")
+    parser.add_argument("--skip-stages", action="store_true", help="Não mede os estágios isoladamente")
+    parser.add_argument("--skip-end-to-end", action="store_true", help="Não executa o pipeline completo")
+    parser.add_argument("--output", default=None, help="Arquivo JSON de saída (padrão: imprime na tela)")
+    args = parser.parse_args(argv)
+
+    formats = [fmt.strip().lower() for fmt in args.formats.split(",") if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in FIXTURE_FORMATS]
+    if unknown:
+        parser.error(f"formatos desconhecidos: {', '.join(unknown)}")
+    decode_modes = [mode.strip() == "fast" for mode in args.decode.split(",") if mode.strip()]
+    backends = [backend.strip().lower() for backend in args.backends.split(",") if backend.strip()]
+    unknown = [backend for backend in backends if backend not in TRANSFORM_BACKENDS]
+    if unknown:
+        parser.error(f"backends desconhecidos: {', '.join(unknown)}")
+    profiles = [profile.strip().lower() for profile in args.profiles.split(",") if profile.strip()]
+    unknown = [profile for profile in profiles if profile not in ENCODER_PROFILES]
+    if unknown:
+        parser.error(f"perfis desconhecidos: {', '.join(unknown)}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixtures_dir = Path(args.fixtures) if args.fixtures else Path(tmp) / "entrada"
+        input_dir = fixtures_dir / "fotos"
+        files, gazetteer_path, watermark_path = generate_fixtures(input_dir, args.sizes, formats)
+        # Gazetteer e marca d'água ficam fora da pasta de fotos varrida pelo run_batch
+        gazetteer_path = gazetteer_path.replace(fixtures_dir / gazetteer_path.name)
+        watermark_path = watermark_path.replace(fixtures_dir / watermark_path.name)
+        geocode_config = GeocodeConfig(cache_path=None, offline=True, gazetteer_path=str(gazetteer_path))
+
+        report = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "target_resolution": list(TARGET_RESOLUTION),
+            "fixtures": [{"file": path.name, "bytes": path.stat().st_size} for path in files],
+            "stages": [],
+            "end_to_end": [],
+            "backend_parity": [],
+        }
+
+        if "pil" in backends and "opencv" in backends:
+            # Fora da pasta de fotos: os tamanhos extras não entram nas medições por estágio nem no run_batch
+            extra_sizes = [size for size in args.parity_sizes if size not in args.sizes]
+            parity_files = files + (generate_fixtures(fixtures_dir / "paridade", extra_sizes, formats)[0]
+                                    if extra_sizes else [])
+            for fast_decode in decode_modes:
+                report["backend_parity"].append(bench_backend_parity(parity_files, watermark_path, fast_decode,
+                                                                     args.min_psnr))
+
+        if not args.skip_stages:
+            geocoder = GeocodeStage(geocode_config) # Geocoding dos estágios isolados, no processo atual
+            try:
+                for backend in backends:
+                    for profile in profiles:
+                        for fast_decode in decode_modes:
+                            stage_dir = Path(tmp) / f"estagios_{backend}_{profile}_{int(fast_decode)}"
+                            stage_dir.mkdir()
+                            report["stages"].append(bench_stages(files, watermark_path, fast_decode, args.repeat,
+                                                                 stage_dir, geocoder, backend, profile))
+            finally:
+                geocoder.close()
+
+        if not args.skip_end_to_end:
+            for workers in args.workers:
+                for backend in backends:
+                    for profile in profiles:
+                        for fast_decode in decode_modes:
+                            output_dir = Path(tmp) / f"saida_{workers}_{backend}_{profile}_{int(fast_decode)}"
+                            report["end_to_end"].append(bench_end_to_end(input_dir, watermark_path, geocode_config,
+                                                                         workers, fast_decode, output_dir, backend,
+                                                                         profile, args.memory_budget))
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    # Código de saída 1 se o backend opencv divergir do PIL (útil em integração contínua)
+    return 0 if all(parity["ok"] for parity in report["backend_parity"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Backend de transformação com NumPy/OpenCV (alternativo ao PIL).
+
+Ao reduzir, o corte central é calculado em coordenadas da imagem de origem,
+antes do redimensionamento: só a região que aparece no quadro final é
+reamostrada. Ao ampliar (origem menor que o alvo), a imagem inteira é
+redimensionada primeiro e cortada em coordenadas de saída, como no PIL: cortar
+antes arredondaria o deslocamento para pixels inteiros da origem, e a ampliação
+deslocaria o quadro em até um pixel de saída. A
+marca d'água é combinada na região que ela cobre com aritmética NumPy in-place,
+sem converter o quadro para RGBA.
+
+Selecionado com transform_backend="opencv" (ver run_batch); o resultado deve
+ficar visualmente equivalente ao do PIL (ver benchmark_pipeline.py --backends).
+"""
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from photo_processor_core import WATERMARK_CACHE_SIZE, cover_size, fitted_size, prepare_watermark
+
+# Os processos de trabalho já ocupam os núcleos: sem threads extras do OpenCV em cada um
+cv2.setNumThreads(1)
+
+# Marca d'água em arrays por processo: {(caminho, mtime, tamanho da base): (RGB float32, alfa float32, posição)}
+_watermark_arrays = {}
+
+
+def cover_crop_box(source_size, target_resolution):
+    """Região (left, top, largura, altura) da origem que, escalada, cobre exatamente a resolução alvo."""
+    source_width, source_height = source_size
+    target_width, target_height = target_resolution
+    scale = max(target_width / source_width, target_height / source_height)
+    crop_width = min(source_width, max(1, round(target_width / scale)))
+    crop_height = min(source_height, max(1, round(target_height / scale)))
+    return (source_width - crop_width) // 2, (source_height - crop_height) // 2, crop_width, crop_height
+
+
+def resize_to_cover_array(img, target_resolution):
+    """Redimensiona para cobrir a resolução alvo e corta o centro; retorna um array RGB (altura, largura, 3)."""
+    target_width, target_height = target_resolution
+    left, top, width, height = cover_crop_box(img.size, target_resolution)
+    if width >= target_width:
+        # Redução: só a região cortada é reamostrada (INTER_AREA, sem serrilhado, como o LANCZOS do PIL)
+        region = np.asarray(img.crop((left, top, left + width, top + height)))
+        return cv2.resize(region, tuple(target_resolution), interpolation=cv2.INTER_AREA)
+
+    # Ampliação: redimensiona tudo e corta no mesmo deslocamento de crop_center (origem pequena, custo baixo)
+    scaled_width, scaled_height = cover_size(img.size, target_resolution)
+    scaled = cv2.resize(np.asarray(img), (scaled_width, scaled_height), interpolation=cv2.INTER_LANCZOS4)
+    left = round((scaled_width - target_width) / 2)
+    top = round((scaled_height - target_height) / 2)
+    return np.ascontiguousarray(scaled[top:top + target_height, left:left + target_width])
+
+
+def resize_to_contain_array(img, size):
+    """Redimensiona a imagem inteira para size (já ajustado para caber na versão); retorna um array RGB."""
+    shrinking = size[0] <= img.width
+    interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_LANCZOS4
+    return cv2.resize(np.asarray(img), tuple(size), interpolation=interpolation)
+
+
+def prepare_watermark_arrays(watermark_image_path, base_size):
+    """Marca d'água de prepare_watermark convertida para arrays (RGB e alfa em 0..1), em cache por processo."""
+    key = (str(watermark_image_path), os.path.getmtime(watermark_image_path), tuple(base_size))
+    cached = _watermark_arrays.get(key)
+    if cached is not None:
+        return cached
+
+    watermark, position = prepare_watermark(watermark_image_path, base_size)
+    pixels = np.asarray(watermark, dtype=np.float32)
+    arrays = (pixels[..., :3], pixels[..., 3:] / 255.0, position)
+
+    if len(_watermark_arrays) >= WATERMARK_CACHE_SIZE:
+        _watermark_arrays.clear()
+    _watermark_arrays[key] = arrays
+    return arrays
+
+
+def blend_watermark(frame, watermark_image_path):
+    """Combina a marca d'água no canto inferior direito do quadro (array RGB), alterando-o no lugar."""
+    try:
+        rgb, alpha, (x, y) = prepare_watermark_arrays(watermark_image_path, (frame.shape[1], frame.shape[0]))
+
+        # Recorta a marca d'água aos limites do quadro (marca maior que a imagem)
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + rgb.shape[1], frame.shape[1]), min(y + rgb.shape[0], frame.shape[0])
+        if x1 <= x0 or y1 <= y0:
+            return frame
+        rgb = rgb[y0 - y:y1 - y, x0 - x:x1 - x]
+        alpha = alpha[y0 - y:y1 - y, x0 - x:x1 - x]
+
+        # região += (marca - região) * alfa, apenas na área coberta
+        roi = frame[y0:y1, x0:x1]
+        blended = roi.astype(np.float32)
+        delta = rgb - blended
+        delta *= alpha
+        blended += delta
+        np.rint(blended, out=blended)
+        roi[...] = blended
+        return frame
+
+    except Exception as e:
+        print(f"Erro ao aplicar marca d'água de imagem: {e}")
+        return frame
+
+
+def render_frame(img, rendition, watermark_path=None):
+    """Gera a versão (cover ou contain) e aplica a marca d'água (se houver); retorna a imagem PIL pronta para codificar."""
+    if rendition.fit == "contain":
+        frame = resize_to_contain_array(img, fitted_size(img.size, rendition))
+    else:
+        frame = resize_to_cover_array(img, rendition.size)
+    if watermark_path:
+        blend_watermark(frame, watermark_path)
+    return Image.fromarray(frame)
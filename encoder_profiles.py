@@ -0,0 +1,63 @@
+"""
+Perfis de codificação JPEG das fotos processadas.
+
+- archive: qualidade 95 com passe extra de otimização Huffman (comportamento original);
+- web: qualidade 85, progressivo, sem o passe de otimização;
+- proof: qualidade 75, sem otimização, para provas rápidas.
+
+Cada perfil define também a subamostragem de croma e se o EXIF e o perfil de
+cor (ICC) da origem são copiados para o JPEG final. O perfil usado fica
+registrado no manifesto e no JSON de metadados de cada foto.
+"""
+from collections import namedtuple
+
+SUBSAMPLING_MODES = ("4:4:4", "4:2:2", "4:2:0")
+
+# subsampling=None usa o padrão do Pillow (4:2:0)
+EncoderProfile = namedtuple("EncoderProfile", ["name", "quality", "optimize", "progressive", "subsampling",
+                                               "keep_exif", "keep_icc"])
+
+ENCODER_PROFILES = {
+    "archive": EncoderProfile("archive", quality=95, optimize=True, progressive=False, subsampling=None,
+                              keep_exif=False, keep_icc=False),
+    "web": EncoderProfile("web", quality=85, optimize=False, progressive=True, subsampling="4:2:0",
+                          keep_exif=False, keep_icc=True),
+    "proof": EncoderProfile("proof", quality=75, optimize=False, progressive=False, subsampling="4:2:0",
+                            keep_exif=False, keep_icc=False),
+}
+DEFAULT_PROFILE = "archive"
+
+
+def get_profile(profile):
+    """Aceita um EncoderProfile ou o nome de um perfil pré-definido."""
+    if isinstance(profile, EncoderProfile):
+        return profile
+    try:
+        return ENCODER_PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"Perfil de codificação desconhecido: {profile!r} "
+                         f"(use {', '.join(ENCODER_PROFILES)})") from None
+
+
+def carried_metadata(img, profile):
+    """EXIF e ICC da imagem de origem (recém-aberta) que o perfil manda copiar para o JPEG final."""
+    carried = {}
+    if profile.keep_exif:
+        exif = img.info.get("exif")
+        if not exif:
+            exif = img.getexif().tobytes() if len(img.getexif()) else None
+        if exif:
+            carried["exif"] = exif
+    # Um ICC de CMYK ou tons de cinza não vale para a saída RGB
+    if profile.keep_icc and img.mode in ("RGB", "RGBA") and img.info.get("icc_profile"):
+        carried["icc_profile"] = img.info["icc_profile"]
+    return carried
+
+
+def save_options(profile, carried=None):
+    """Argumentos de Image.save(..., "JPEG") para o perfil."""
+    options = {"quality": profile.quality, "optimize": profile.optimize, "progressive": profile.progressive}
+    if profile.subsampling is not None:
+        options["subsampling"] = profile.subsampling
+    options.update(carried or {})
+    return options
@@ -0,0 +1,185 @@
+"""
+Índice EXIF da pasta de entrada: uma passada só pelos cabeçalhos (sem
+decodificar pixels), em paralelo, com a data da captura (DateTimeOriginal),
+a câmera, o GPS e as dimensões de cada foto.
+
+O índice fica em FT TRATADAS 2025/.exif_index.jsonl e é atualizado de forma
+incremental: fotos com o mesmo tamanho e mtime não são relidas. Com ele o plano
+da execução segue a ordem da captura (fotos de várias câmeras intercaladas
+pelo horário), a duração é estimada antes de começar (megapixels pendentes ×
+custo por megapixel medido na execução anterior) e as coordenadas de todas as
+fotos vão para o geocoding logo no início.
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import json
+import os
+import time
+
+from PIL import ExifTags, Image
+
+from photo_processor_core import gps_coordinates, read_exif
+
+INDEX_NAME = ".exif_index.jsonl"
+DEFAULT_INDEX_THREADS = 8 # Leitura de cabeçalhos: limitada pela latência do disco (ou da rede), não pela CPU
+DEFAULT_SECONDS_PER_MEGAPIXEL = 0.1 # Custo por megapixel de um processo de trabalho, até a primeira medição
+MIN_CALIBRATION_PHOTOS = 10 # Execuções menores não atualizam o custo por megapixel
+
+# Cabeçalho de uma foto: chave (caminho relativo à pasta de entrada), tamanho e mtime do arquivo
+# quando foi lido, data da captura (ISO 8601, com frações de segundo; None se não houver no EXIF),
+# câmera ("Marca Modelo"), GPS ((lat, lon) ou None) e dimensões em pixels.
+ExifRecord = namedtuple("ExifRecord", ["source", "size", "mtime_ns", "captured", "camera", "gps", "width", "height"])
+
+# Estimativa de uma execução: fotos e megapixels pendentes, segundos previstos, custo por megapixel
+# usado e se ele veio de uma execução anterior (measured) ou do padrão.
+RunEstimate = namedtuple("RunEstimate", ["photos", "megapixels", "seconds", "seconds_per_megapixel", "measured"])
+
+
+def parse_exif_datetime(value, subseconds=None):
+    """'2025:03:01 14:22:05' (+ SubSecTimeOriginal) em ISO 8601; None se vazio ou inválido (ex: '0000:00:00')."""
+    if not isinstance(value, str):
+        return None
+    try:
+        captured = time.strptime(value.strip("\x00 ")[:19], "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+    iso = time.strftime("%Y-%m-%dT%H:%M:%S", captured)
+    digits = "".join(ch for ch in str(subseconds or "") if ch.isdigit())
+    return f"{iso}.{digits[:6]}" if digits else iso
+
+
+def read_record(image_path, source_key, stat=None):
+    """ExifRecord da foto, lendo só o cabeçalho; fotos ilegíveis ficam sem data, câmera e dimensões."""
+    stat = stat or os.stat(image_path)
+    captured = camera = gps = None
+    width = height = 0
+    try:
+        with Image.open(image_path) as img:
+            width, height = img.size
+            exif_data = read_exif(img)
+        if exif_data:
+            exif = {ExifTags.TAGS[k]: v for k, v in exif_data.items() if k in ExifTags.TAGS}
+            captured = (parse_exif_datetime(exif.get("DateTimeOriginal"), exif.get("SubsecTimeOriginal"))
+                        or parse_exif_datetime(exif.get("DateTime"), exif.get("SubsecTime")))
+            camera = " ".join(str(exif[tag]).strip("\x00 ") for tag in ("Make", "Model") if exif.get(tag)) or None
+            gps = gps_coordinates(exif)
+    except Exception:
+        pass # A falha real aparece na decodificação, no estágio de CPU
+    return ExifRecord(source_key, stat.st_size, stat.st_mtime_ns, captured, camera, gps, width, height)
+
+
+class ExifIndex:
+    """
+    Índice em disco ({chave da foto: ExifRecord}), só com acréscimos e
+    compactado quando acumula registros antigos. Guarda também o custo por
+    megapixel medido na última execução (para as estimativas).
+    """
+
+    def __init__(self, processed_base_dir):
+        self.path = Path(processed_base_dir) / INDEX_NAME
+        self.records = {}
+        self.seconds_per_megapixel = None
+        self.line_count = 0
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue # Última linha truncada por uma queda: ignora
+                    self.line_count += 1
+                    if "seconds_per_megapixel" in entry:
+                        self.seconds_per_megapixel = entry["seconds_per_megapixel"]
+                    else:
+                        entry["gps"] = tuple(entry["gps"]) if entry.get("gps") else None
+                        self.records[entry["source"]] = ExifRecord(**entry)
+
+    def update(self, image_paths, input_dir, threads=DEFAULT_INDEX_THREADS, on_progress=None):
+        """
+        Garante um registro atual para cada foto (relendo só as novas ou
+        alteradas, em threads) e retorna os registros na ordem de image_paths.
+        Fotos que não existem mais saem do índice na próxima compactação.
+        """
+        input_dir = Path(input_dir)
+        entries = []
+        stale = []
+        for image_path in image_paths:
+            source_key = Path(image_path).relative_to(input_dir).as_posix()
+            try:
+                stat = os.stat(image_path)
+            except OSError:
+                continue # Removida depois da varredura
+            record = self.records.get(source_key)
+            if record is None or record.size != stat.st_size or record.mtime_ns != stat.st_mtime_ns:
+                stale.append((image_path, source_key, stat))
+            entries.append((image_path, source_key))
+
+        if stale:
+            with ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="exif-index") as pool:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    for done, record in enumerate(pool.map(lambda item: read_record(*item), stale), 1):
+                        self.records[record.source] = record
+                        f.write(json.dumps(record._asdict(), ensure_ascii=False) + "\n")
+                        self.line_count += 1
+                        if on_progress is not None and done % 100 == 0:
+                            on_progress(done, len(stale))
+            if on_progress is not None:
+                on_progress(len(stale), len(stale))
+
+        current = {source_key for _, source_key in entries}
+        if self.line_count > 2 * len(current) + 1:
+            self._compact(current)
+        return [(image_path, self.records[source_key]) for image_path, source_key in entries]
+
+    def _compact(self, keep):
+        """Reescreve o índice só com o último registro de cada foto em keep (e o custo por megapixel)."""
+        self.records = {source_key: record for source_key, record in self.records.items() if source_key in keep}
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in self.records.values():
+                f.write(json.dumps(record._asdict(), ensure_ascii=False) + "\n")
+            if self.seconds_per_megapixel is not None:
+                f.write(json.dumps({"seconds_per_megapixel": self.seconds_per_megapixel}) + "\n")
+        os.replace(tmp_path, self.path)
+        self.line_count = len(self.records) + (self.seconds_per_megapixel is not None)
+
+    def calibrate(self, render_seconds, megapixels, photos):
+        """
+        Guarda o custo por megapixel de um processo de trabalho: render_seconds é
+        a soma do estágio de CPU (decodificação, transformação e codificação) das
+        fotos renderizadas nesta execução, sem leitura, gravação nem geocoding.
+        """
+        if photos < MIN_CALIBRATION_PHOTOS or megapixels <= 0:
+            return
+        self.seconds_per_megapixel = round(render_seconds / megapixels, 4)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"seconds_per_megapixel": self.seconds_per_megapixel}) + "\n")
+        self.line_count += 1
+
+    def estimate(self, records, workers):
+        """RunEstimate para processar records com workers processos."""
+        megapixels = sum(record.width * record.height for record in records) / 1e6
+        measured = self.seconds_per_megapixel is not None
+        rate = self.seconds_per_megapixel if measured else DEFAULT_SECONDS_PER_MEGAPIXEL
+        return RunEstimate(len(records), round(megapixels, 1), megapixels * rate / effective_workers(workers), rate,
+                           measured)
+
+
+def effective_workers(workers):
+    """Processos que de fato rodam em paralelo (não mais que os núcleos)."""
+    return max(1, min(workers, os.cpu_count() or 1))
+
+
+def capture_order(entries):
+    """
+    Ordena [(caminho, ExifRecord)] pela data da captura; fotos sem data no EXIF
+    usam o mtime do arquivo. Empates (rajadas sem frações de segundo) seguem o
+    nome do arquivo.
+    """
+    def key(entry):
+        record = entry[1]
+        captured = record.captured or time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.mtime_ns / 1e9))
+        return captured, record.source
+
+    return sorted(entries, key=key)
@@ -0,0 +1,325 @@
+"""
+Monitoramento contínuo da pasta de entrada (modo evento ao vivo).
+
+FolderWatcher entrega primeiro as imagens que já estão na pasta e, depois,
+cada arquivo novo ou alterado assim que ele estiver completo, até stop().
+run_batch(watcher=...) consome essa sequência: a numeração continua a do
+manifesto (as fotos novas recebem os próximos NNN-NN e completam o Lote_NNN
+atual) e só as chegadas são processadas.
+
+No Linux, as mudanças chegam pelo inotify (sem custo enquanto nada muda); em
+outros sistemas, ou quando o inotify não está disponível, as pastas são
+consultadas a cada poll_seconds e só as que mudaram são listadas de novo. Em
+compartilhamentos de rede (SMB/NFS) o inotify não recebe as gravações feitas
+por outras máquinas: use o modo por consulta (use_inotify=False).
+
+Um arquivo só é entregue quando tamanho e data de modificação ficam parados
+por settle_seconds; JPEGs sem o marcador final (FFD9) esperam mais, até
+INCOMPLETE_JPEG_GRACE_SECONDS, porque uma cópia pela rede pode pausar no meio.
+Uma data de modificação antiga só dispensa a espera na primeira vez que o
+arquivo é visto (ex: na varredura inicial): uma cópia que preserva a data
+continua crescendo, e um arquivo que mudou desde a última conferência nunca é
+entregue na mesma.
+"""
+from pathlib import Path
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from image_scan import SUPPORTED_FORMATS, scan_images
+
+DEFAULT_SETTLE_SECONDS = 1.5 # Tamanho/data parados por este tempo: arquivo completo
+DEFAULT_POLL_SECONDS = 2.0 # Intervalo do modo por consulta
+FULL_RESCAN_SECONDS = 60 # No modo por consulta, confere também os arquivos existentes (regravados no lugar)
+HEARTBEAT_SECONDS = 0.5 # Sem novidades, a sequência entrega None neste ritmo (a execução recolhe resultados)
+INCOMPLETE_JPEG_GRACE_SECONDS = 30 # JPEG sem o marcador final é entregue assim mesmo depois disto
+
+# Constantes do inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT_HEADER = struct.Struct("iIII") # wd, mask, cookie, len (seguido do nome)
+
+
+def _is_excluded(path, exclude):
+    path = os.path.abspath(path)
+    return any(path == folder or path.startswith(folder + os.sep) for folder in exclude)
+
+
+def _walk_dirs(folder, exclude):
+    """Pastas de folder (inclusive), sem seguir links, como scan_images."""
+    stack = [folder]
+    while stack:
+        current = stack.pop()
+        if _is_excluded(current, exclude):
+            continue
+        yield current
+        try:
+            with os.scandir(current) as entries:
+                stack.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+        except OSError:
+            continue
+
+
+def jpeg_complete(path):
+    """False se o arquivo é um JPEG ainda sem o marcador de fim de imagem (FFD9)."""
+    if not path.lower().endswith((".jpg", ".jpeg")):
+        return True
+    try:
+        with open(path, "rb") as f:
+            f.seek(-2, os.SEEK_END)
+            return f.read(2) == b"\xff\xd9"
+    except OSError:
+        return False
+
+
+class InotifyWatch:
+    """Mudanças na árvore de pastas pelo inotify do Linux (via ctypes, sem dependências)."""
+
+    name = "inotify"
+
+    def __init__(self, root, exclude=()):
+        self.exclude = tuple(exclude)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1: {os.strerror(errno)}")
+        self.dirs = {} # {descritor do inotify: pasta}
+        self.add_tree(root)
+
+    def add_tree(self, folder):
+        """Observa folder e as subpastas; retorna as imagens já presentes nelas."""
+        for current in _walk_dirs(folder, self.exclude):
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(current), WATCH_MASK)
+            if wd < 0: # Ex: limite de fs.inotify.max_user_watches
+                print(f"Aviso: não foi possível observar a pasta {current}: {os.strerror(ctypes.get_errno())}")
+            else:
+                self.dirs[wd] = current
+        return [str(path) for path in scan_images(folder)]
+
+    def wait(self, timeout):
+        """Espera até timeout segundos; retorna (arquivos alterados, True se eventos foram perdidos)."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return [], False
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return [], False
+        changed = []
+        overflow = False
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += _EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None) # Pasta removida
+                continue
+            folder = self.dirs.get(wd)
+            if folder is None or not name:
+                continue
+            path = os.path.join(folder, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not _is_excluded(path, self.exclude):
+                    changed.extend(self.add_tree(path)) # Arquivos copiados antes de a pasta ser observada
+            else:
+                changed.append(path)
+        return changed, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatch:
+    """
+    Mudanças na árvore de pastas por consulta periódica: só as pastas cuja data
+    de modificação mudou são listadas de novo (novos arquivos e renomeações);
+    a cada FULL_RESCAN_SECONDS, todos os arquivos são conferidos.
+    """
+
+    name = "consulta"
+
+    def __init__(self, root, exclude=(), poll_seconds=DEFAULT_POLL_SECONDS):
+        self.root = root
+        self.exclude = tuple(exclude)
+        self.poll_seconds = poll_seconds
+        self.dirs = {} # {pasta: mtime_ns}
+        for folder in _walk_dirs(root, self.exclude):
+            self._stat_dir(folder)
+        self._next_poll = time.monotonic() + poll_seconds
+        self._next_full = time.monotonic() + FULL_RESCAN_SECONDS
+
+    def _stat_dir(self, folder):
+        try:
+            self.dirs[folder] = os.stat(folder).st_mtime_ns
+        except OSError:
+            self.dirs.pop(folder, None)
+
+    def _list(self, folder):
+        """Imagens de folder, registrando as subpastas novas (e as imagens delas)."""
+        files = []
+        self._stat_dir(folder)
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.path not in self.dirs and not _is_excluded(entry.path, self.exclude):
+                            files.extend(self._list(entry.path))
+                    elif entry.name.lower().endswith(SUPPORTED_FORMATS):
+                        files.append(entry.path)
+        except OSError:
+            self.dirs.pop(folder, None)
+        return files
+
+    def wait(self, timeout):
+        now = time.monotonic()
+        if self._next_poll - now > timeout:
+            time.sleep(timeout)
+            return [], False
+        time.sleep(max(0.0, self._next_poll - now))
+        self._next_poll = time.monotonic() + self.poll_seconds
+        if time.monotonic() >= self._next_full:
+            self._next_full = time.monotonic() + FULL_RESCAN_SECONDS
+            return [], True # Conferência completa, como após eventos perdidos
+        changed = []
+        for folder, mtime_ns in list(self.dirs.items()):
+            try:
+                current = os.stat(folder).st_mtime_ns
+            except OSError:
+                self.dirs.pop(folder, None)
+                continue
+            if current != mtime_ns:
+                changed.extend(self._list(folder))
+        return changed, False
+
+    def close(self):
+        pass
+
+
+class FolderWatcher:
+    """
+    Sequência contínua das imagens de input_dir para run_batch(watcher=...).
+    stop() (de qualquer thread) encerra a sequência em até HEARTBEAT_SECONDS.
+    """
+
+    def __init__(self, input_dir, settle_seconds=DEFAULT_SETTLE_SECONDS, poll_seconds=DEFAULT_POLL_SECONDS,
+                 use_inotify=None):
+        self.input_dir = str(input_dir) # Caminhos entregues no mesmo formato da varredura normal
+        self.settle_seconds = settle_seconds
+        self.poll_seconds = poll_seconds
+        self.use_inotify = sys.platform.startswith("linux") if use_inotify is None else use_inotify
+        self.backend_name = None
+        self._stop = threading.Event()
+        self._exclude = ()
+        self._emitted = {} # {caminho: (tamanho, mtime_ns)} já entregues
+        self._pending = {} # {caminho: [assinatura, estável desde, visto pela primeira vez]}
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def _open_backend(self, exclude):
+        if self.use_inotify:
+            try:
+                return InotifyWatch(self.input_dir, exclude)
+            except (OSError, AttributeError) as e: # Sem inotify (outro sistema, limite de instâncias)
+                print(f"Aviso: inotify indisponível ({e}); consultando a pasta a cada {self.poll_seconds:g}s")
+        return PollingWatch(self.input_dir, exclude, self.poll_seconds)
+
+    def paths(self, exclude=()):
+        """
+        Gera as imagens (Path) prontas para processar e None a cada
+        HEARTBEAT_SECONDS sem novidades. exclude: pastas ignoradas (ex: a de
+        saída, se ficar dentro da pasta de entrada).
+        """
+        self._exclude = tuple(os.path.abspath(folder) for folder in exclude)
+        backend = self._open_backend(self._exclude) # Antes da varredura inicial: nada chega sem ser visto
+        self.backend_name = backend.name
+        try:
+            for path in scan_images(self.input_dir):
+                self._observe(str(path))
+            yield from self._ready()
+
+            while not self._stop.is_set():
+                changed, lost = backend.wait(self._timeout())
+                if lost: # Eventos perdidos ou conferência periódica: todos os arquivos viram candidatos
+                    changed = [str(path) for path in scan_images(self.input_dir)]
+                for path in changed:
+                    self._observe(path)
+                ready = list(self._ready())
+                yield from ready
+                if not ready:
+                    yield None
+        finally:
+            backend.close()
+
+    def retry(self, path):
+        """Entrega path de novo quando estiver pronto (ex: regravado enquanto a versão anterior era processada)."""
+        path = str(path)
+        self._emitted.pop(path, None)
+        self._observe(path)
+
+    def _observe(self, path):
+        if not path.lower().endswith(SUPPORTED_FORMATS) or _is_excluded(path, self._exclude):
+            return
+        now = time.monotonic()
+        entry = self._pending.setdefault(path, [None, now, now])
+        entry[1] = now # Nova atividade no arquivo: recomeça a contagem
+
+    def _timeout(self):
+        """
+        Espera até o próximo arquivo pendente completar settle_seconds (no máximo
+        HEARTBEAT_SECONDS; os que já completaram e ainda esperam, como um JPEG
+        sem o marcador final, são conferidos nesse ritmo).
+        """
+        now = time.monotonic()
+        deadlines = [since + self.settle_seconds for _, since, _ in self._pending.values()
+                     if since + self.settle_seconds > now]
+        return min([HEARTBEAT_SECONDS] + [max(0.05, deadline - now) for deadline in deadlines])
+
+    def _ready(self):
+        """Entrega os pendentes parados há settle_seconds (e, se JPEG, com o marcador final)."""
+        now = time.monotonic()
+        for path, entry in list(self._pending.items()): # Ordem de chegada: a numeração segue a das fotos
+            try:
+                stat = os.stat(path)
+            except OSError: # Removido ou renomeado antes de terminar
+                del self._pending[path]
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if signature == self._emitted.get(path):
+                del self._pending[path] # Evento sem mudança real (ex: só aberto e fechado)
+                continue
+            first_sighting = entry[0] is None
+            if signature != entry[0]:
+                entry[0], entry[1] = signature, now
+                if not first_sighting:
+                    continue # Mudou desde a última passada: ainda está sendo gravado, mesmo com mtime antigo
+            # Só na primeira passada: mtime antigo é de um arquivo parado antes de ser visto (ex: varredura inicial)
+            already_settled = first_sighting and time.time() - stat.st_mtime >= self.settle_seconds
+            if now - entry[1] < self.settle_seconds and not already_settled:
+                continue
+            if stat.st_size == 0 or (not jpeg_complete(path) and now - entry[2] < INCOMPLETE_JPEG_GRACE_SECONDS):
+                continue
+            del self._pending[path]
+            self._emitted[path] = signature
+            yield Path(path)
@@ -0,0 +1,186 @@
+"""
+Cache persistente de geocoding reverso (SQLite) e resolução offline.
+
+As coordenadas são quantizadas em uma grade (em graus), de modo que fotos
+tiradas no mesmo local compartilham uma única consulta ao Nominatim.
+"""
+from collections import namedtuple
+from pathlib import Path
+import csv
+import json
+import math
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_CACHE_PATH = Path.home() / ".restorephotos" / "geocode_cache.sqlite"
+DEFAULT_GRID_DEGREES = 0.01 # ~1,1 km no equador
+DEFAULT_TTL_DAYS = 180
+DEFAULT_MAX_ENTRIES = 100000
+GAZETTEER_MAX_DISTANCE_KM = 30 # Distância máxima para aceitar a localidade mais próxima do gazetteer
+DEFAULT_CLUSTER_RADIUS_KM = 1.0 # Fotos a menos disso de um ponto já consultado reaproveitam a consulta
+DEFAULT_NETWORK_TIMEOUT = 10 # Segundos por consulta ao Nominatim
+DEFAULT_RETRIES = 3 # Novas tentativas após GeocoderTimedOut
+
+# Configuração do geocoding, usada pelo GeocodeStage no processo principal.
+# cache_path=None desativa o cache em disco; gazetteer_path é um CSV com
+# colunas lat,lon,city,state,country,postcode. nominatim_url (ex:
+# http://127.0.0.1:8080) troca o servidor do Nominatim, por exemplo por um
+# servidor local de testes (ver nominatim_stub.py).
+GeocodeConfig = namedtuple("GeocodeConfig",
+                           ["cache_path", "grid_degrees", "ttl_days", "max_entries", "offline", "gazetteer_path",
+                            "nominatim_url", "network_timeout", "cluster_radius_km", "retries"],
+                           defaults=[str(DEFAULT_CACHE_PATH), DEFAULT_GRID_DEGREES, DEFAULT_TTL_DAYS,
+                                     DEFAULT_MAX_ENTRIES, False, None, None, DEFAULT_NETWORK_TIMEOUT,
+                                     DEFAULT_CLUSTER_RADIUS_KM, DEFAULT_RETRIES])
+
+
+class GeocodeCache:
+    """Endereços já resolvidos, guardados em SQLite com chave na coordenada quantizada."""
+
+    def __init__(self, db_path, grid_degrees=DEFAULT_GRID_DEGREES, ttl_days=DEFAULT_TTL_DAYS):
+        self.db_path = Path(db_path)
+        self.grid_degrees = grid_degrees
+        self.ttl_seconds = ttl_days * 86400
+        self.hits = 0
+        self.misses = 0
+
+        import sqlite3 # Só quando há cache em disco: fora da partida da interface
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Vários processos de trabalho usam o mesmo arquivo: WAL + timeout evitam "database is locked"
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocode ("
+            " qlat INTEGER, qlon INTEGER, grid REAL, address TEXT, created_at REAL,"
+            " PRIMARY KEY (qlat, qlon, grid))"
+        )
+        self.conn.commit()
+
+    def _key(self, lat, lon):
+        """Quantiza a coordenada para a célula da grade."""
+        return round(lat / self.grid_degrees), round(lon / self.grid_degrees), self.grid_degrees
+
+    def get(self, lat, lon):
+        """Retorna o endereço (dict) da célula, ou None se ausente ou expirado."""
+        row = self.conn.execute(
+            "SELECT address, created_at FROM geocode WHERE qlat = ? AND qlon = ? AND grid = ?",
+            self._key(lat, lon)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, lat, lon, address):
+        """Grava (ou substitui) o endereço da célula."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO geocode (qlat, qlon, grid, address, created_at) VALUES (?, ?, ?, ?, ?)",
+            self._key(lat, lon) + (json.dumps(address, ensure_ascii=False), time.time())
+        )
+        self.conn.commit()
+
+    def prune(self, max_entries=DEFAULT_MAX_ENTRIES):
+        """Remove entradas expiradas e, acima de max_entries, as mais antigas."""
+        self.conn.execute("DELETE FROM geocode WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        self.conn.execute(
+            "DELETE FROM geocode WHERE rowid NOT IN"
+            " (SELECT rowid FROM geocode ORDER BY created_at DESC LIMIT ?)",
+            (max_entries,)
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class Gazetteer:
+    """Localidades de um arquivo CSV local, consultadas pela mais próxima (sem rede)."""
+
+    def __init__(self, csv_path):
+        self.cells = {} # {(lat inteira, lon inteira): [(lat, lon, endereço), ...]}
+        with open(csv_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                lat, lon = float(row["lat"]), float(row["lon"])
+                address = {key: row[key] for key in ("city", "state", "country", "postcode") if row.get(key)}
+                self.cells.setdefault((math.floor(lat), math.floor(lon)), []).append((lat, lon, address))
+
+    def nearest(self, lat, lon, max_distance_km=GAZETTEER_MAX_DISTANCE_KM):
+        """Endereço da localidade mais próxima, ou None se nenhuma estiver dentro do limite."""
+        best, best_distance = None, max_distance_km
+        cell_lat, cell_lon = math.floor(lat), math.floor(lon)
+        for d_lat in (-1, 0, 1):
+            for d_lon in (-1, 0, 1):
+                for place_lat, place_lon, address in self.cells.get((cell_lat + d_lat, cell_lon + d_lon), ()):
+                    distance = haversine_km(lat, lon, place_lat, place_lon)
+                    if distance <= best_distance:
+                        best, best_distance = address, distance
+        return best
+
+
+class GeocodeResolver:
+    """
+    Resolve coordenadas na ordem: cache em disco, gazetteer local e, fora do
+    modo offline, Nominatim. O ritmo das consultas à rede (1 req/s) e as novas
+    tentativas ficam com quem chama (ver geocode_stage.GeocodeStage).
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.cache = GeocodeCache(config.cache_path, config.grid_degrees, config.ttl_days) if config.cache_path else None
+        self.gazetteer = Gazetteer(config.gazetteer_path) if config.gazetteer_path else None
+        self.geolocator = None # Criado apenas na primeira consulta à rede
+
+    def resolve_local(self, lat, lon):
+        """
+        (endereço, origem) pelo cache em disco ou pelo gazetteer, sem rede; None se
+        nenhum resolver. O endereço segue o formato de 'address' do Nominatim
+        (city/town/village, state, country, postcode).
+        """
+        if self.cache is not None:
+            address = self.cache.get(lat, lon)
+            if address is not None:
+                return address, "cache_hit"
+
+        if self.gazetteer is not None:
+            address = self.gazetteer.nearest(lat, lon)
+            if address is not None:
+                return address, "gazetteer"
+        return None
+
+    def remember(self, lat, lon, address):
+        """Guarda no cache em disco um endereço obtido da rede."""
+        if address is not None and self.cache is not None:
+            self.cache.put(lat, lon, address)
+
+    def reverse_online(self, lat, lon):
+        """Uma consulta ao Nominatim, sem rate limiting (quem chama controla o ritmo)."""
+        if self.geolocator is None:
+            self.geolocator = _build_geolocator(self.config)
+        location = self.geolocator.reverse((lat, lon), language="pt-BR")
+        if location and location.address:
+            return location.raw.get('address', {})
+        return None
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+
+
+def _build_geolocator(config):
+    """Cliente do Nominatim (o público, ou o servidor de config.nominatim_url)."""
+    from geopy.geocoders import Nominatim # Importado só na primeira consulta à rede (o geopy pesa na partida)
+
+    options = {"user_agent": "photo_watermark_app", "timeout": config.network_timeout}
+    if config.nominatim_url:
+        url = urlsplit(config.nominatim_url)
+        options.update(domain=url.netloc + url.path.rstrip("/"), scheme=url.scheme or "http")
+    return Nominatim(**options)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distância em km entre dois pontos (fórmula de haversine)."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
@@ -0,0 +1,170 @@
+"""
+Estágio assíncrono de geocoding reverso (asyncio, em uma thread própria).
+
+As coordenadas chegam assim que cada foto é lida (antes da decodificação) e
+são agrupadas: um ponto a menos de cluster_radius_km de outro já consultado (ou
+em consulta) reaproveita aquela consulta. As consultas que sobram passam pelo
+cache em disco e pelo gazetteer e, só então, vão ao Nominatim por um único
+rate limiter global (1 req/s), com novas tentativas e espera crescente após
+GeocoderTimedOut. Enquanto isso, o pool de processos continua transformando
+as fotos; o nome final de cada arquivo é definido quando a localização chega.
+"""
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from geocode_cache import GeocodeResolver, haversine_km
+
+NOMINATIM_MIN_INTERVAL = 1.0 # Política de uso do Nominatim: no máximo 1 requisição por segundo
+RETRY_BACKOFF_SECONDS = 2.0 # Espera antes da 1ª nova tentativa (dobra a cada tentativa)
+KM_PER_DEGREE = 111.32
+
+
+class AsyncRateLimiter:
+    """Garante um intervalo mínimo entre as chamadas de wait(), na ordem em que foram feitas."""
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._lock = asyncio.Lock()
+        self._next_slot = 0.0
+
+    async def wait(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next_slot - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_slot = loop.time() + self.min_interval
+
+
+class _Cluster:
+    """Ponto já consultado (ou em consulta) e a tarefa que resolve o seu endereço."""
+
+    def __init__(self, lat, lon, task):
+        self.lat = lat
+        self.lon = lon
+        self.task = task
+
+
+class GeocodeStage:
+    """
+    Resolve coordenadas em segundo plano. submit(lat, lon) retorna um
+    concurrent.futures.Future com (endereço ou None, origem); a origem é a do
+    GeocodeResolver (cache_hit, gazetteer, network, unresolved) ou "cluster"
+    quando a consulta de um ponto próximo foi reaproveitada. Depois de
+    esgotadas as tentativas, o Future termina com a exceção do geopy.
+    """
+
+    def __init__(self, config, min_interval=NOMINATIM_MIN_INTERVAL, backoff_seconds=RETRY_BACKOFF_SECONDS,
+                 profile=None):
+        self.config = config
+        self.profile = profile # RunProfile: espera do rate limiter (geocode_wait) e consultas (geocode_network)
+        self.min_interval = min_interval
+        self.backoff_seconds = backoff_seconds
+        self.network_requests = 0
+        self.retries = 0
+
+        self._cell_degrees = max(config.cluster_radius_km, 1e-6) / KM_PER_DEGREE
+        self._clusters = {} # {(célula lat, célula lon): [_Cluster, ...]}
+        self._network = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nominatim") # geopy é síncrono
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="geocoding", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        # SQLite só pode ser usado na thread que abriu a conexão: o resolver nasce aqui
+        self.resolver = GeocodeResolver(self.config)
+        self.limiter = AsyncRateLimiter(self.min_interval)
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self.resolver.close()
+            self._loop.close()
+
+    def submit(self, lat, lon):
+        """Enfileira a coordenada (de qualquer thread) e retorna o Future do resultado."""
+        return asyncio.run_coroutine_threadsafe(self._locate(lat, lon), self._loop)
+
+    def close(self):
+        """Encerra a thread do estágio (as consultas pendentes são canceladas)."""
+        if self._thread.is_alive():
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop) # Para o loop ao terminar
+            self._thread.join()
+        self._network.shutdown(wait=False)
+
+    async def _shutdown(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop.stop()
+
+    async def _locate(self, lat, lon):
+        cluster = self._find_cluster(lat, lon)
+        if cluster is not None:
+            address, _ = await asyncio.shield(cluster.task)
+            return address, "cluster"
+
+        cluster = _Cluster(lat, lon, asyncio.ensure_future(self._resolve(lat, lon)))
+        self._clusters.setdefault(self._cell(lat, lon), []).append(cluster)
+        return await asyncio.shield(cluster.task)
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self._cell_degrees), math.floor(lon / self._cell_degrees)
+
+    def _find_cluster(self, lat, lon):
+        """Cluster existente mais próximo dentro do raio (as células em longitude encolhem com a latitude)."""
+        cell_lat, cell_lon = self._cell(lat, lon)
+        lon_span = math.ceil(1 / max(math.cos(math.radians(lat)), 0.01))
+        best, best_distance = None, self.config.cluster_radius_km
+        for d_lat in (-1, 0, 1):
+            for d_lon in range(-lon_span, lon_span + 1):
+                for cluster in self._clusters.get((cell_lat + d_lat, cell_lon + d_lon), ()):
+                    if cluster.task.done() and (cluster.task.cancelled() or cluster.task.exception() is not None):
+                        continue # Consulta que falhou não serve de referência
+                    distance = haversine_km(lat, lon, cluster.lat, cluster.lon)
+                    if distance <= best_distance:
+                        best, best_distance = cluster, distance
+        return best
+
+    async def _resolve(self, lat, lon):
+        local = self.resolver.resolve_local(lat, lon)
+        if local is not None:
+            return local
+        if self.config.offline:
+            return None, "unresolved"
+
+        from geopy.exc import GeocoderTimedOut, GeocoderUnavailable # Só aqui: o geopy pesa na partida
+
+        for attempt in range(self.config.retries + 1):
+            started = time.perf_counter()
+            await self.limiter.wait()
+            if self.profile is not None:
+                self.profile.record("geocode_wait", started)
+            self.network_requests += 1
+            try:
+                address = await self._reverse_online(lat, lon)
+            except (GeocoderTimedOut, GeocoderUnavailable):
+                if attempt == self.config.retries:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self.backoff_seconds * 2 ** attempt)
+                continue
+            self.resolver.remember(lat, lon, address)
+            return address, "network"
+
+    async def _reverse_online(self, lat, lon):
+        """Uma consulta ao Nominatim, na thread de rede (o geopy é síncrono)."""
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._network, self.resolver.reverse_online,
+                                                                    lat, lon)
+        finally:
+            if self.profile is not None:
+                self.profile.record("geocode_network", started)
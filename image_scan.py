@@ -0,0 +1,76 @@
+"""
+Varredura incremental da pasta de entrada com os.scandir.
+
+As imagens são entregues assim que encontradas (gerador), na mesma ordem do
+os.walk: primeiro os arquivos de uma pasta, depois as subpastas. O resultado
+de uma varredura completa pode ser reaproveitado enquanto nenhuma pasta mudar.
+"""
+from pathlib import Path
+import os
+
+SUPPORTED_FORMATS = (".jpg", ".jpeg", ".png", ".bmp", ".tiff")
+
+
+def scan_images(input_dir, dir_mtimes=None):
+    """
+    Gera os caminhos das imagens suportadas em input_dir (recursivamente).
+    Se dir_mtimes for um dict, recebe {pasta: mtime_ns} de cada pasta visitada.
+    """
+    stack = [str(input_dir)]
+    while stack:
+        current = stack.pop()
+        subdirs = []
+        try:
+            if dir_mtimes is not None:
+                dir_mtimes[current] = os.stat(current).st_mtime_ns
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False # Mesmo critério do os.walk: tratado como arquivo
+                    if is_dir:
+                        if not entry.is_symlink(): # Como o os.walk, não segue links para pastas
+                            subdirs.append(entry.path)
+                    elif entry.name.lower().endswith(SUPPORTED_FORMATS):
+                        yield Path(entry.path)
+        except OSError as e:
+            print(f"Aviso: não foi possível ler a pasta {current}: {e}")
+            continue
+        # Pilha invertida para visitar as subpastas na ordem em que foram listadas
+        stack.extend(reversed(subdirs))
+
+
+class ImageScan:
+    """Varredura completa guardada para reuso (ex: a contagem feita ao escolher a pasta)."""
+
+    def __init__(self, input_dir):
+        self.input_dir = str(input_dir)
+        self.files = []
+        self.dir_mtimes = {}
+
+    def run(self, on_found=None, report_every=100):
+        """Varre a pasta; on_found(quantidade) é chamado a cada report_every imagens e no final."""
+        self.files = []
+        self.dir_mtimes = {}
+        for image_path in scan_images(self.input_dir, self.dir_mtimes):
+            self.files.append(image_path)
+            if on_found is not None and len(self.files) % report_every == 0:
+                on_found(len(self.files))
+        if on_found is not None:
+            on_found(len(self.files))
+        return self.files
+
+    def is_current(self, input_dir=None):
+        """True se nenhuma pasta foi criada, removida ou alterada desde a varredura."""
+        if input_dir is not None and os.path.abspath(input_dir) != os.path.abspath(self.input_dir):
+            return False
+        if not self.dir_mtimes:
+            return False
+        for folder, mtime_ns in self.dir_mtimes.items():
+            try:
+                if os.stat(folder).st_mtime_ns != mtime_ns:
+                    return False
+            except OSError:
+                return False
+        return True
@@ -0,0 +1,156 @@
+"""
+Orçamento de memória da execução: estimativa do tamanho decodificado de cada
+foto a partir do cabeçalho e admissão das fotos no pipeline só enquanto o
+total em andamento couber no orçamento.
+
+Imagens enormes (panoramas TIFF/PNG de 100+ MP, digitalizações de 16 bits)
+seguem por um caminho reduzido: o arquivo não é lido inteiro para a memória
+do processo principal (o processo de trabalho o abre pelo caminho) e a imagem
+é reduzida por um fator inteiro logo após a carga (Image.reduce), antes da
+conversão para RGB e do LANCZOS final.
+"""
+from collections import namedtuple
+import os
+import sys
+import threading
+
+
+try:
+    import resource # Indisponível no Windows
+except ImportError:
+    resource = None
+
+MIB = 1024 * 1024
+HUGE_IMAGE_PIXELS = 40_000_000 # Acima disto (e fora do draft do JPEG), a imagem é reduzida na carga
+SOURCE_IN_MEMORY_LIMIT = 64 * MIB # Arquivos maiores não são lidos para a memória do processo principal
+RENDER_OVERHEAD = 2 # Cada versão existe ao menos duas vezes (escalada e cortada/com marca d'água)
+
+# Cabeçalho da imagem (sem decodificar os pixels)
+ImageHeader = namedtuple("ImageHeader", ["format", "mode", "size"])
+
+# Memória de uma execução: orçamento e pico admitido pelo agendador, pico de RSS
+# do processo principal e dos processos de trabalho (o maior e a soma dos picos),
+# e quantas fotos passaram sozinhas por serem maiores que o orçamento.
+MemoryReport = namedtuple("MemoryReport", ["budget_mb", "peak_admitted_mb", "main_peak_rss_mb",
+                                           "worker_peak_rss_mb", "workers_total_rss_mb", "oversized"])
+
+
+def read_header(source):
+    """Formato, modo e tamanho da imagem (caminho ou arquivo), lendo só o cabeçalho; None se não abrir."""
+    from PIL import Image
+
+    try:
+        with Image.open(source) as img:
+            return ImageHeader(img.format, img.mode, img.size)
+    except Exception:
+        return None # A falha real aparece na decodificação, no estágio de CPU
+
+
+def pixel_bytes(mode):
+    """Bytes por pixel de uma imagem do Pillow em memória (modos de várias bandas ocupam 4 bytes)."""
+    if mode in ("1", "L", "P"):
+        return 1
+    if mode.startswith("I;16"):
+        return 2
+    return 4
+
+
+def draft_scale(size, target_size):
+    """Fator (1, 2, 4 ou 8) que o draft do JPEG aplica sem ficar menor que target_size."""
+    scale = 1
+    while scale < 8 and size[0] // (scale * 2) >= target_size[0] and size[1] // (scale * 2) >= target_size[1]:
+        scale *= 2
+    return scale
+
+
+def reduce_factor(size, target_size, max_pixels=HUGE_IMAGE_PIXELS):
+    """
+    Fator inteiro de redução na carga de uma imagem enorme (1 se ela não passa
+    de max_pixels): o maior que ainda mantém a imagem cobrindo target_size.
+    """
+    if size[0] * size[1] <= max_pixels:
+        return 1
+    return max(1, min(size[0] // max(1, target_size[0]), size[1] // max(1, target_size[1])))
+
+
+def reduce_on_load(img, factor):
+    """Carrega a imagem e a reduz pela média de blocos factor x factor (modos sem reduce passam por RGB antes)."""
+    try:
+        return img.reduce(factor)
+    except ValueError: # "1", "P" e "I;16" não têm reduce
+        return img.convert("RGB").reduce(factor)
+
+
+def estimate_peak_bytes(header, target_size, rendition_pixels, fast_decode=True, source_bytes=0):
+    """
+    Pico estimado de memória de uma foto no pipeline: os bytes do arquivo (se
+    forem lidos para a memória), a imagem decodificada no modo de origem, a cópia
+    RGB (ou a imagem reduzida, no caminho de imagens enormes) e as versões geradas
+    (rendition_pixels: soma dos pixels de todas as versões antes do corte).
+    """
+    width, height = header.size
+    native = width * height * pixel_bytes(header.mode)
+    factor = 1
+    if fast_decode and header.format == "JPEG":
+        scale = draft_scale(header.size, target_size)
+        native //= scale * scale
+        rgb = width * height * 4 // (scale * scale)
+    else:
+        factor = reduce_factor(header.size, target_size) if fast_decode else 1
+        rgb = width * height * 4 // (factor * factor)
+    if factor > 1 and (header.mode in ("1", "P") or header.mode.startswith("I;16")):
+        rgb += width * height * 4 # Modo sem reduce: convertido para RGB inteiro antes de reduzir
+    return source_bytes + native + rgb + rendition_pixels * 4 * RENDER_OVERHEAD
+
+
+def peak_rss_mb(children=False):
+    """
+    Pico de memória residente (MiB) deste processo ou, com children, do maior
+    processo filho já encerrado. None onde o módulo resource não existe (Windows).
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    divisor = MIB if sys.platform == "darwin" else 1024 # macOS em bytes, Linux em KiB
+    return round(usage.ru_maxrss / divisor, 1)
+
+
+def process_peak():
+    """(pid, pico de RSS em MiB) do processo atual, para os processos de trabalho informarem o seu pico."""
+    return os.getpid(), peak_rss_mb()
+
+
+class MemoryBudget:
+    """
+    Admite fotos em ordem de chegada enquanto a soma das estimativas em
+    andamento couber em limit_bytes. Uma foto maior que o orçamento inteiro
+    espera o pipeline esvaziar e passa sozinha (em vez de nunca ser processada).
+    """
+
+    def __init__(self, limit_bytes):
+        self.limit = limit_bytes
+        self.in_use = 0
+        self.peak = 0
+        self.oversized = 0
+        self._condition = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+
+    def acquire(self, cost):
+        """Bloqueia até a vez desta foto e até ela caber no orçamento."""
+        with self._condition:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._condition.wait_for(lambda: self._serving == ticket
+                                     and (self.in_use == 0 or self.in_use + cost <= self.limit))
+            self._serving += 1
+            if cost > self.limit:
+                self.oversized += 1
+            self.in_use += cost
+            self.peak = max(self.peak, self.in_use)
+            self._condition.notify_all()
+
+    def release(self, cost):
+        with self._condition:
+            self.in_use -= cost
+            self._condition.notify_all()
@@ -0,0 +1,199 @@
+"""
+Destino dos metadados das fotos processadas.
+
+- json: um <nome>_metadata.json (indentado) ao lado de cada JPEG (comportamento original);
+- jsonl: um registro compacto por linha em Lote_NNN/metadados.jsonl;
+- sqlite: uma tabela em FT TRATADAS 2025/metadados.sqlite, com índices por data,
+  cidade e câmera (ex: todas as fotos de Manaus em março).
+
+Nos modos jsonl e sqlite os registros são acumulados e gravados em lotes
+(a cada SINK_BATCH_SIZE registros ou SINK_FLUSH_SECONDS), e não há um arquivo
+por foto. Cada registro é o conteúdo do antigo JSON da foto mais o caminho do
+JPEG ("output", relativo a FT TRATADAS 2025); vale o último registro de cada
+(origem, versão). O comando export recria os JSONs por arquivo quando for
+preciso:
+
+    python metadata_sink.py export "saida/FT TRATADAS 2025"
+"""
+import abc
+import argparse
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+METADATA_SINKS = ("json", "jsonl", "sqlite")
+JSONL_NAME = "metadados.jsonl"
+SQLITE_NAME = "metadados.sqlite"
+SINK_BATCH_SIZE = 200
+SINK_FLUSH_SECONDS = 2.0
+
+
+def sink_record(metadata, output_path, base_dir):
+    """Registro compacto de uma versão: os metadados do antigo JSON mais o caminho relativo do JPEG."""
+    return dict(metadata, output=Path(output_path).relative_to(base_dir).as_posix())
+
+
+class MetadataSink(abc.ABC):
+    """Acumula registros (de qualquer thread) e os grava em lotes; close() grava o que restar.
+
+    Cada destino implementa _write(records); um destino incompleto falha ao ser criado, não no meio da execução.
+    """
+
+    def __init__(self, base_dir):
+        self.base_dir = Path(base_dir)
+        self.written = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def add(self, metadata, output_path):
+        with self._lock:
+            self._pending.append(sink_record(metadata, output_path, self.base_dir))
+            if len(self._pending) >= SINK_BATCH_SIZE or time.monotonic() - self._last_flush >= SINK_FLUSH_SECONDS:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        self.flush()
+
+    def _flush_locked(self):
+        if self._pending:
+            self._write(self._pending)
+            self.written += len(self._pending)
+            self._pending = []
+        self._last_flush = time.monotonic()
+
+    @abc.abstractmethod
+    def _write(self, records):
+        """Grava um lote de registros (chamado com o lock tomado)."""
+
+
+class JsonlSink(MetadataSink):
+    """Um arquivo metadados.jsonl por lote, só com acréscimos."""
+
+    def _write(self, records):
+        by_lot = {}
+        for record in records:
+            by_lot.setdefault(record["output"].split("/", 1)[0], []).append(record)
+        for lot_name, lot_records in by_lot.items():
+            with open(self.base_dir / lot_name / JSONL_NAME, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+                             for record in lot_records)
+
+
+class SqliteSink(MetadataSink):
+    """Tabela photos em metadados.sqlite; cada (origem, versão) tem uma única linha, a mais recente."""
+
+    def __init__(self, base_dir, run_started=None):
+        import sqlite3 # Só com metadata_sink="sqlite": fora da partida da interface
+
+        super().__init__(base_dir)
+        self.run_started = run_started or time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.conn = sqlite3.connect(str(self.base_dir / SQLITE_NAME), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS photos ("
+            " source TEXT, rendition TEXT, output TEXT, datetime TEXT, city TEXT, state TEXT, country TEXT,"
+            " camera TEXT, lat REAL, lon REAL, run_started TEXT, record TEXT,"
+            " PRIMARY KEY (source, rendition))"
+        )
+        for column in ("datetime", "city", "camera"):
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS photos_{column} ON photos ({column})")
+        self.conn.commit()
+
+    def _write(self, records):
+        rows = []
+        for record in records:
+            exif = record["exif_data"]
+            location = exif["location"]
+            coordinates = location.get("coordinates") or [None, None]
+            rows.append((record["original_file"], record.get("rendition", {}).get("name"), record["output"],
+                         _or_null(exif["datetime"]), _or_null(location["city"]), _or_null(location["state"]),
+                         _or_null(location["country"]), _or_null(exif["camera_info"]), coordinates[0],
+                         coordinates[1], self.run_started, json.dumps(record, ensure_ascii=False)))
+        self.conn.executemany("INSERT OR REPLACE INTO photos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self.conn.commit()
+
+    def close(self):
+        super().close()
+        self.conn.close()
+
+
+def _or_null(value):
+    return None if value == "N/A" else value
+
+
+def open_sink(kind, base_dir):
+    """Destino dos metadados da execução; None no modo json (um arquivo por foto, gravado pelo núcleo)."""
+    if kind not in METADATA_SINKS:
+        raise ValueError(f"Destino de metadados desconhecido: {kind!r} (use {', '.join(METADATA_SINKS)})")
+    if kind == "jsonl":
+        return JsonlSink(base_dir)
+    if kind == "sqlite":
+        return SqliteSink(base_dir)
+    return None
+
+
+def iter_records(base_dir):
+    """Registros válidos de FT TRATADAS 2025 (JSONL dos lotes e SQLite): o último de cada (origem, versão)."""
+    base_dir = Path(base_dir)
+    latest = {}
+    for jsonl_path in sorted(base_dir.glob(f"Lote_*/{JSONL_NAME}")):
+        with open(jsonl_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue # Linha truncada por uma queda
+                latest[(record["original_file"], record.get("rendition", {}).get("name"))] = record
+    db_path = base_dir / SQLITE_NAME
+    if db_path.exists():
+        import sqlite3
+
+        conn = sqlite3.connect(str(db_path))
+        try:
+            for (record_json,) in conn.execute("SELECT record FROM photos"):
+                record = json.loads(record_json)
+                latest[(record["original_file"], record.get("rendition", {}).get("name"))] = record
+        finally:
+            conn.close()
+    return latest.values()
+
+
+def export_legacy_json(base_dir):
+    """Recria o <nome>_metadata.json de cada JPEG existente a partir dos registros; retorna quantos gravou."""
+    from photo_processor_core import metadata_path_for # O núcleo importa este módulo
+
+    base_dir = Path(base_dir)
+    written = 0
+    for record in iter_records(base_dir):
+        output_path = base_dir / record["output"]
+        if not output_path.exists():
+            continue # Saída renomeada ou removida depois deste registro
+        metadata = {key: value for key, value in record.items() if key != "output"}
+        with open(metadata_path_for(output_path), "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=4, ensure_ascii=False)
+        written += 1
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ferramentas dos metadados gravados em JSONL/SQLite.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="Recria os JSONs por foto (<nome>_metadata.json)")
+    export.add_argument("processed_dir", help="Pasta 'FT TRATADAS 2025' de uma execução")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        written = export_legacy_json(args.processed_dir)
+        print(f"{written} arquivos de metadados gravados em {args.processed_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
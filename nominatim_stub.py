@@ -0,0 +1,116 @@
+"""
+Servidor HTTP local que imita o endpoint /reverse do Nominatim, para testar o
+geocoding sem acessar a internet.
+
+Responde com a localidade mais próxima de um CSV (mesmo formato do gazetteer)
+ou com um endereço fixo, e registra o horário de cada requisição (para conferir
+o rate limiting). Com --fail-every N, cada N-ésima requisição recebe HTTP 504
+(GeocoderTimedOut no geopy), para exercitar as novas tentativas. Os testes
+(tests/test_geocode_stage.py) usam start_server(port=0), em uma porta livre.
+
+Exemplo:
+    python nominatim_stub.py --port 8088 --gazetteer localidades.csv --fail-every 3
+    python photo_processor_cli.py entrada saida --no-watermark --nominatim-url http://127.0.0.1:8088
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from geocode_cache import Gazetteer
+
+DEFAULT_ADDRESS = {"city": "Manaus", "state": "Amazonas", "country": "Brasil", "postcode": "69000-000"}
+
+
+class StubState:
+    """Configuração e contadores compartilhados pelas threads do servidor."""
+
+    def __init__(self, gazetteer=None, fail_every=0, delay=0.0):
+        self.gazetteer = gazetteer
+        self.fail_every = fail_every
+        self.delay = delay
+        self.requests = [] # [(horário, lat, lon, status)]
+        self.lock = threading.Lock()
+
+    def register(self, lat, lon):
+        """Conta a requisição e decide o status da resposta."""
+        with self.lock:
+            number = len(self.requests) + 1
+            status = 504 if self.fail_every and number % self.fail_every == 0 else 200
+            self.requests.append((time.monotonic(), lat, lon, status))
+            return status
+
+
+def make_handler(state):
+    class ReverseHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path.rstrip("/") != "/reverse":
+                self.send_error(404)
+                return
+            query = parse_qs(url.query)
+            try:
+                lat, lon = float(query["lat"][0]), float(query["lon"][0])
+            except (KeyError, ValueError):
+                self.send_error(400)
+                return
+
+            status = state.register(lat, lon)
+            if state.delay:
+                time.sleep(state.delay)
+            if status != 200:
+                self.send_error(status)
+                return
+
+            address = state.gazetteer.nearest(lat, lon) if state.gazetteer else DEFAULT_ADDRESS
+            if address is None:
+                body = {"error": "Unable to geocode"}
+            else:
+                body = {"lat": str(lat), "lon": str(lon), "address": address,
+                        "display_name": ", ".join(address.get(key, "") for key in ("city", "state", "country"))}
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            print(f"[{time.strftime('%H:%M:%S')}] {self.address_string()} {format % args}")
+
+    return ReverseHandler
+
+
+def start_server(port=0, gazetteer_path=None, fail_every=0, delay=0.0):
+    """Inicia o servidor em uma thread; retorna (servidor, estado). A porta real fica em servidor.server_port."""
+    state = StubState(Gazetteer(gazetteer_path) if gazetteer_path else None, fail_every, delay)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, name="nominatim-stub", daemon=True).start()
+    return server, state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local que imita o /reverse do Nominatim.")
+    parser.add_argument("--port", type=int, default=8088, help="Porta (padrão: %(default)s)")
+    parser.add_argument("--gazetteer", default=None, help="CSV de localidades (lat,lon,city,state,country,postcode)")
+    parser.add_argument("--fail-every", type=int, default=0, help="Responde 504 a cada N requisições (0: nunca)")
+    parser.add_argument("--delay", type=float, default=0.0, help="Atraso de cada resposta, em segundos")
+    args = parser.parse_args(argv)
+
+    server, state = start_server(args.port, args.gazetteer, args.fail_every, args.delay)
+    print(f"Nominatim local em http://127.0.0.1:{server.server_port} (Ctrl+C para sair)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        intervals = [b[0] - a[0] for a, b in zip(state.requests, state.requests[1:])]
+        print(f"{len(state.requests)} requisições"
+              + (f", menor intervalo entre elas: {min(intervals):.2f}s" if intervals else ""))
+
+
+if __name__ == "__main__":
+    main()
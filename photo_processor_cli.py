@@ -0,0 +1,292 @@
+"""
+Execução do processamento de fotos pela linha de comando, sem interface gráfica.
+
+Exemplo:
+    python photo_processor_cli.py ./entrada ./saida --watermark marca.png --workers 8
+"""
+import argparse
+import signal
+import sys
+import time
+
+from encoder_profiles import DEFAULT_PROFILE, ENCODER_PROFILES, SUBSAMPLING_MODES
+from folder_watch import DEFAULT_POLL_SECONDS, DEFAULT_SETTLE_SECONDS, FolderWatcher
+from geocode_cache import (DEFAULT_CACHE_PATH, DEFAULT_CLUSTER_RADIUS_KM, DEFAULT_GRID_DEGREES, DEFAULT_RETRIES,
+                           DEFAULT_TTL_DAYS, GeocodeConfig)
+from photo_processor_core import (DEFAULT_WORKERS, IMAGES_PER_LOT, PLAN_ORDERS, TARGET_RESOLUTION, TRANSFORM_BACKENDS,
+                                  run_batch)
+from metadata_sink import METADATA_SINKS
+from progress_report import ProgressTracker
+from render_cache import DEFAULT_RENDER_CACHE_DIR, DEFAULT_RENDER_CACHE_MB, RenderCacheConfig
+from renditions import RENDITION_PRESETS, parse_rendition
+from shard_ledger import DEFAULT_LEASE_SECONDS, ShardConfig
+from staged_pipeline import DEFAULT_READER_THREADS, DEFAULT_WRITER_THREADS
+
+
+def parse_resolution(value):
+    """Converte 'LARGURAxALTURA' (ex: 1920x1080) em uma tupla de inteiros."""
+    try:
+        width, height = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Resolução inválida: {value!r} (use LARGURAxALTURA, ex: 1920x1080)")
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError(f"Resolução inválida: {value!r}")
+    return width, height
+
+
+def rendition_arg(value):
+    """Converte o argumento de --rendition (preset ou nome=LxA[:opções]) em uma Rendition."""
+    try:
+        return parse_rendition(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser():
+    """Define os argumentos aceitos pela linha de comando."""
+    parser = argparse.ArgumentParser(description="Aplica marca d'água e organiza fotos em lotes, sem interface gráfica.")
+    parser.add_argument("input_dir", help="Pasta de origem das fotos (varrida recursivamente)")
+    parser.add_argument("output_dir", help="Pasta de destino (as fotos vão para 'FT TRATADAS 2025' dentro dela)")
+    parser.add_argument("--watermark", default="", help="Imagem PNG da marca d'água")
+    parser.add_argument("--no-watermark", action="store_true", help="Não aplica marca d'água")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Número de processos de trabalho (padrão: {DEFAULT_WORKERS})")
+    parser.add_argument("--readers", type=int, default=DEFAULT_READER_THREADS,
+                        help="Threads de leitura das fotos de origem (padrão: %(default)s)")
+    parser.add_argument("--writers", type=int, default=DEFAULT_WRITER_THREADS,
+                        help="Threads de gravação dos resultados (padrão: %(default)s)")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="Máximo de fotos em memória ao mesmo tempo (padrão: 2 x processos + leitores)")
+    parser.add_argument("--memory-budget", type=float, default=None, metavar="MIB",
+                        help="Orçamento de memória das fotos em andamento, em MiB (padrão: sem limite); "
+                             "cada foto só entra quando a estimativa pelo cabeçalho cabe no orçamento")
+    parser.add_argument("--order", choices=PLAN_ORDERS, default="scan",
+                        help="Numeração das fotos novas: pela ordem da varredura, com o processamento começando já "
+                             "nas primeiras fotos, ou pela data da captura (EXIF, com índice em disco e estimativa de "
+                             "duração; começa depois da leitura de todos os cabeçalhos) (padrão: %(default)s)")
+    parser.add_argument("--lot-size", type=int, default=IMAGES_PER_LOT,
+                        help=f"Fotos por lote (padrão: {IMAGES_PER_LOT})")
+    parser.add_argument("--resolution", type=parse_resolution, default=None,
+                        help="Resolução final LARGURAxALTURA de uma versão única (padrão: %dx%d)" % TARGET_RESOLUTION)
+    parser.add_argument("--rendition", type=rendition_arg, action="append", default=None,
+                        help="Versão a gerar (repetível): preset (%s) ou "
+                             "nome=LARGURAxALTURA[:cover|contain][:marca|sem-marca][:perfil]"
+                             % ", ".join(RENDITION_PRESETS))
+    parser.add_argument("--no-fast-decode", action="store_true",
+                        help="Decodifica JPEGs em resolução total (desativa a decodificação reduzida do libjpeg)")
+    parser.add_argument("--backend", choices=TRANSFORM_BACKENDS, default="pil",
+                        help="Redimensionamento e marca d'água com PIL ou NumPy/OpenCV (padrão: %(default)s)")
+    parser.add_argument("--profile", choices=list(ENCODER_PROFILES), default=DEFAULT_PROFILE,
+                        help="Perfil JPEG: archive (qualidade 95, otimizado), web (85, progressivo) "
+                             "ou proof (rápido) (padrão: %(default)s)")
+    parser.add_argument("--subsampling", choices=SUBSAMPLING_MODES, default=None,
+                        help="Subamostragem de croma (padrão: a do perfil)")
+    parser.add_argument("--keep-exif", action="store_true", help="Copia o EXIF da origem para o JPEG final")
+    parser.add_argument("--keep-icc", action="store_true", help="Copia o perfil de cor (ICC) da origem")
+    parser.add_argument("--metadata-sink", choices=METADATA_SINKS, default="json",
+                        help="Metadados em um JSON por foto, em um JSONL por lote ou em um SQLite na pasta de saída "
+                             "(padrão: %(default)s; 'python metadata_sink.py export' recria os JSONs por foto)")
+    parser.add_argument("--profiling", default=None, metavar="PASTA",
+                        help="Modo de perfil: grava perfil.pstats (cProfile) e trace.json (linha do tempo para "
+                             "chrome://tracing ou ui.perfetto.dev) nesta pasta")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Reprocessa todas as fotos, mesmo as já concluídas no manifesto (a numeração é mantida)")
+    parser.add_argument("--verify-content", action="store_true",
+                        help="Detecta alterações na origem pelo hash do conteúdo, não só por tamanho/data")
+    parser.add_argument("--render-cache", nargs="?", const=str(DEFAULT_RENDER_CACHE_DIR), default=None, metavar="PASTA",
+                        help="Reaproveita JPEGs já renderizados (mesmo conteúdo e configurações) de execuções "
+                             "anteriores, guardados nesta pasta (padrão, sem PASTA: %(const)s)")
+    parser.add_argument("--render-cache-mb", type=float, default=DEFAULT_RENDER_CACHE_MB,
+                        help="Tamanho máximo do cache de renderização em MiB; acima disso, remove as entradas "
+                             "usadas há mais tempo (padrão: %(default)s)")
+    parser.add_argument("--watch", action="store_true",
+                        help="Modo contínuo: depois da varredura, processa cada foto nova ou alterada na pasta de "
+                             "entrada assim que termina de ser gravada, até Ctrl+C")
+    parser.add_argument("--watch-settle", type=float, default=DEFAULT_SETTLE_SECONDS, metavar="SEG",
+                        help="Segundos sem mudança de tamanho/data para considerar um arquivo completo "
+                             "(padrão: %(default)s)")
+    parser.add_argument("--watch-poll", action="store_true",
+                        help="Consulta a pasta periodicamente em vez de usar o inotify (necessário em "
+                             "compartilhamentos de rede gravados por outras máquinas)")
+    parser.add_argument("--watch-poll-seconds", type=float, default=DEFAULT_POLL_SECONDS, metavar="SEG",
+                        help="Intervalo das consultas no modo --watch-poll (padrão: %(default)s)")
+    parser.add_argument("--shard", action="store_true",
+                        help="Modo distribuído: divide os lotes com outras máquinas que usam a mesma pasta de saída "
+                             "(compartilhada), pelo livro de tarefas em 'FT TRATADAS 2025/.ledger'")
+    parser.add_argument("--node-id", default=None,
+                        help="Nome deste nó no modo distribuído (padrão: <máquina>-<pid>)")
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+                        help="Sem renovação por este tempo, o lote de um nó é assumido por outro (padrão: %(default)s)")
+    parser.add_argument("--geocode-cache", default=str(DEFAULT_CACHE_PATH),
+                        help="Arquivo SQLite do cache de geocoding (padrão: %(default)s)")
+    parser.add_argument("--no-geocode-cache", action="store_true", help="Não usa o cache de geocoding em disco")
+    parser.add_argument("--geocode-grid", type=float, default=DEFAULT_GRID_DEGREES,
+                        help="Tamanho da célula da grade do cache, em graus (padrão: %(default)s)")
+    parser.add_argument("--geocode-ttl-days", type=float, default=DEFAULT_TTL_DAYS,
+                        help="Validade das entradas do cache, em dias (padrão: %(default)s)")
+    parser.add_argument("--gazetteer", default=None,
+                        help="CSV local de localidades (lat,lon,city,state,country,postcode)")
+    parser.add_argument("--offline", action="store_true",
+                        help="Não consulta o Nominatim: resolve apenas pelo cache e pelo gazetteer")
+    parser.add_argument("--nominatim-url", default=None,
+                        help="Servidor Nominatim alternativo (ex: http://127.0.0.1:8088, ver nominatim_stub.py)")
+    parser.add_argument("--cluster-radius-km", type=float, default=DEFAULT_CLUSTER_RADIUS_KM,
+                        help="Fotos a menos desta distância compartilham uma consulta de geocoding (padrão: %(default)s)")
+    parser.add_argument("--geocode-retries", type=int, default=DEFAULT_RETRIES,
+                        help="Novas tentativas após timeout do Nominatim (padrão: %(default)s)")
+    return parser
+
+
+def main(argv=None):
+    """Ponto de entrada da linha de comando. Retorna o código de saída do processo."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    apply_watermark = not args.no_watermark
+    if apply_watermark and not args.watermark:
+        parser.error("informe --watermark ARQUIVO.png ou use --no-watermark")
+    if args.lot_size <= 0:
+        parser.error("--lot-size deve ser maior que zero")
+    if args.memory_budget is not None and args.memory_budget <= 0:
+        parser.error("--memory-budget deve ser maior que zero")
+    if args.geocode_grid <= 0:
+        parser.error("--geocode-grid deve ser maior que zero")
+    if args.rendition and args.resolution:
+        parser.error("use --resolution ou --rendition, não os dois")
+    if args.shard and args.watch:
+        parser.error("use --shard ou --watch, não os dois")
+    if args.shard and args.metadata_sink == "sqlite":
+        parser.error("--shard não aceita --metadata-sink sqlite (o banco não é seguro em pasta de rede)")
+    if args.lease_seconds <= 0:
+        parser.error("--lease-seconds deve ser maior que zero")
+
+    geocode_config = GeocodeConfig(cache_path=None if args.no_geocode_cache else args.geocode_cache,
+                                   grid_degrees=args.geocode_grid,
+                                   ttl_days=args.geocode_ttl_days,
+                                   offline=args.offline,
+                                   gazetteer_path=args.gazetteer,
+                                   nominatim_url=args.nominatim_url,
+                                   cluster_radius_km=max(0.0, args.cluster_radius_km),
+                                   retries=max(0, args.geocode_retries))
+
+    render_cache_config = None
+    if args.render_cache:
+        render_cache_config = RenderCacheConfig(cache_dir=args.render_cache, max_mb=args.render_cache_mb)
+
+    profile = ENCODER_PROFILES[args.profile]
+    if args.subsampling:
+        profile = profile._replace(subsampling=args.subsampling)
+    if args.keep_exif:
+        profile = profile._replace(keep_exif=True)
+    if args.keep_icc:
+        profile = profile._replace(keep_icc=True)
+
+    watcher = None
+    if args.watch:
+        watcher = FolderWatcher(args.input_dir, settle_seconds=max(0.0, args.watch_settle),
+                                poll_seconds=max(0.1, args.watch_poll_seconds),
+                                use_inotify=False if args.watch_poll else None)
+
+        def stop_watching(signum, frame):
+            print("Encerrando: concluindo as fotos em andamento (Ctrl+C de novo interrompe)")
+            watcher.stop()
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+
+        signal.signal(signal.SIGINT, stop_watching)
+        if hasattr(signal, "SIGTERM"):
+            signal.signal(signal.SIGTERM, stop_watching)
+        print(f"Monitorando {args.input_dir} (Ctrl+C para encerrar)")
+
+    tracker = ProgressTracker()
+    planned = [] # Total de fotos da execução, depois de on_plan (antes disso o total ainda cresce com a varredura)
+
+    def on_plan(total):
+        planned.append(total)
+
+    def on_progress(completed, total, result):
+        tracker.update(completed, total, result)
+        status = "ok" if result.error is None else f"ERRO: {result.error}"
+        count = f"{completed}/{total}" if planned else f"{completed}/{total}, varredura em andamento"
+        print(f"[{count}] {result.job.source_path} -> {status}")
+
+    def on_scan(found):
+        print(f"Varredura: {found} imagens encontradas")
+
+    def on_index(done, total):
+        print(f"Índice EXIF: {done}/{total} cabeçalhos lidos")
+
+    def on_estimate(estimate):
+        origin = "medido na última execução" if estimate.measured else "valor padrão"
+        duration = f"{estimate.seconds:.0f}s" if estimate.seconds < 120 else f"{estimate.seconds / 60:.0f} min"
+        print(f"Estimativa: {estimate.photos} fotos, {estimate.megapixels:.0f} MP, ~{duration} "
+              f"({estimate.seconds_per_megapixel:.3f} s/MP por processo, {origin})")
+
+    started = time.perf_counter()
+    summary = run_batch(args.input_dir, args.output_dir,
+                        watermark_path=args.watermark,
+                        apply_watermark=apply_watermark,
+                        workers=args.workers,
+                        readers=args.readers,
+                        writers=args.writers,
+                        max_in_flight=args.max_in_flight,
+                        lot_size=args.lot_size,
+                        target_resolution=args.resolution or TARGET_RESOLUTION,
+                        renditions=args.rendition,
+                        geocode_config=geocode_config,
+                        fast_decode=not args.no_fast_decode,
+                        resume=not args.no_resume,
+                        verify_content=args.verify_content,
+                        transform_backend=args.backend,
+                        encoder_profile=profile,
+                        memory_budget_mb=args.memory_budget,
+                        render_cache_config=render_cache_config,
+                        metadata_sink=args.metadata_sink,
+                        profile_dir=args.profiling,
+                        watcher=watcher,
+                        shard_config=ShardConfig(args.node_id, args.lease_seconds) if args.shard else None,
+                        order=args.order,
+                        on_scan=on_scan,
+                        on_index=on_index,
+                        on_estimate=on_estimate,
+                        on_plan=on_plan,
+                        on_progress=on_progress)
+    elapsed = time.perf_counter() - started
+
+    print(f"Concluído: {summary.processed}/{summary.total} fotos em {elapsed:.1f}s "
+          f"({summary.skipped} já processadas, {len(summary.errors)} erros) -> {summary.processed_base_dir}")
+    if tracker.completed:
+        print(f"{tracker.throughput():.1f} img/s · tempo médio por foto: {tracker.stage_line()}")
+    if summary.processed:
+        print(f"Leitura de origem: {summary.bytes_read / summary.processed / 1024:.0f} KiB por foto "
+              f"({summary.bytes_read / (1024 * 1024):.1f} MiB no total)")
+    if summary.stage_stats.histograms:
+        print("Tempo por estágio:")
+        for line in summary.stage_stats.summary_lines():
+            print("  " + line)
+    if summary.shard_lots is not None:
+        print(f"Modo distribuído: {summary.shard_lots} lotes concluídos por este nó")
+    if args.profiling:
+        print(f"Perfil gravado em {args.profiling} (perfil.pstats, trace.json)")
+    if render_cache_config is not None:
+        print(f"Cache de renderização: {summary.cache_hits} fotos reaproveitadas de {summary.processed}")
+    if summary.duplicates:
+        print(f"{len(summary.duplicates)} grupos de fotos idênticas na entrada:")
+        for group in summary.duplicates:
+            print("  " + " = ".join(group))
+    memory = summary.memory
+    if memory.main_peak_rss_mb is not None:
+        line = f"Memória: pico de RSS {memory.main_peak_rss_mb:.0f} MiB no processo principal"
+        if memory.worker_peak_rss_mb is not None:
+            line += (f", {memory.worker_peak_rss_mb:.0f} MiB no maior processo de trabalho "
+                     f"({memory.workers_total_rss_mb:.0f} MiB somando todos)")
+        print(line)
+    if memory.budget_mb:
+        print(f"Orçamento de memória: {memory.budget_mb:.0f} MiB, pico admitido {memory.peak_admitted_mb:.0f} MiB"
+              + (f", {memory.oversized} fotos maiores que o orçamento processadas sozinhas" if memory.oversized else ""))
+    if summary.geocode_stats:
+        print("Geocoding: " + ", ".join(f"{source}={count}" for source, count in sorted(summary.geocode_stats.items())))
+    return 1 if summary.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1241 @@
+"""
+Núcleo de processamento de fotos, independente da interface gráfica.
+
+Pode ser importado por outros scripts ou executado pela linha de comando
+(photo_processor_cli.py), sem criar uma janela Tk.
+"""
+import hashlib
+import io
+import os
+import json
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import partial
+from datetime import datetime
+from pathlib import Path
+import time
+
+from encoder_profiles import DEFAULT_PROFILE, ENCODER_PROFILES, carried_metadata, get_profile, save_options
+from geocode_cache import GeocodeCache, GeocodeConfig
+from image_scan import scan_images
+from metadata_sink import METADATA_SINKS, open_sink
+from memory_budget import (MIB, SOURCE_IN_MEMORY_LIMIT, MemoryBudget, MemoryReport, estimate_peak_bytes, peak_rss_mb,
+                           process_peak, read_header, reduce_factor, reduce_on_load)
+from processing_manifest import ProcessingManifest, source_signature
+from render_cache import RenderCache, content_hash, link_or_copy
+from shard_ledger import ShardLedger
+from run_profile import RunProfile, StageClock, merge_pstats, TRACE_NAME, WORKER_PSTATS_PATTERN, worker_profile
+from renditions import DEFAULT_RENDITIONS, rendition_for_resolution, validate_renditions
+from staged_pipeline import DEFAULT_READER_THREADS, DEFAULT_WRITER_THREADS, StagedPipeline
+
+# Constantes para processamento
+TARGET_RESOLUTION = DEFAULT_RENDITIONS[0].size # Versão principal (as demais: renditions.py)
+IMAGES_PER_LOT = 50
+PROCESSED_DIR_NAME = "FT TRATADAS 2025" # Pasta criada dentro do destino escolhido
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 1) - 1) # Deixa um núcleo livre para a interface
+WATERMARK_CACHE_SIZE = 4 # Marcas d'água preparadas mantidas em memória por processo
+TRANSFORM_BACKENDS = ("pil", "opencv") # Redimensionamento/marca d'água: PIL ou NumPy/OpenCV (cv_transform)
+PLAN_ORDERS = ("scan", "capture") # Numeração pela ordem da varredura (em fluxo) ou pela data da captura (índice EXIF)
+
+# --- Pipeline de processamento (executado nos processos de trabalho) ---
+
+# Descritor de trabalho enviado aos processos: tudo o que é necessário para
+# processar uma foto e dar nome ao arquivo, sem depender da ordem de conclusão.
+PhotoJob = namedtuple("PhotoJob", ["source_path", "index", "lot_number", "lot_slot"])
+
+# Configurações da execução, repassadas a cada trabalho (precisam ser "picklable").
+ProcessingSettings = namedtuple("ProcessingSettings",
+                                ["processed_base_dir", "watermark_path", "apply_watermark", "renditions",
+                                 "fast_decode", "transform_backend", "encoder_profile", "profile_dir"],
+                                defaults=[DEFAULT_RENDITIONS, True, "pil", ENCODER_PROFILES[DEFAULT_PROFILE], None])
+
+# Saída do estágio de leitura: bytes do arquivo de origem, o tempo gasto lendo e o tamanho
+# do arquivo. data é None para arquivos enormes, que o processo de trabalho abre pelo caminho.
+SourceData = namedtuple("SourceData", ["data", "read_seconds", "size"])
+
+# Saída do estágio de CPU: JPEGs já codificados, ainda não gravados em disco.
+# outputs traz [(Rendition, bytes do JPEG)] na ordem das versões configuradas (no lugar dos
+# bytes, o caminho do JPEG no cache de renderização, quando a foto já estava lá).
+# timings guarda a duração (s) de cada estágio já executado: read, decode, resize, watermark,
+# metadata, encode, render (total do estágio de CPU) e write (ver run_profile.STAGES).
+# peak_rss é (pid, pico de RSS em MiB) do processo de trabalho que renderizou a foto;
+# spans, só no modo de perfil, os intervalos [(estágio, início, duração)] para o trace.
+RenderedPhoto = namedtuple("RenderedPhoto", ["job", "filename_stem", "outputs", "metadata", "geocode_stats",
+                                             "bytes_read", "error", "timings", "peak_rss", "spans"],
+                           defaults=[None])
+
+# Resultado devolvido pelo pipeline para quem iniciou a execução.
+# geocode_stats conta a origem de cada geocoding (cache_hit, network, ...);
+# bytes_read é o total lido do arquivo de origem (uma única leitura por foto).
+# output_path é a versão principal (a primeira); outputs lista {rendition, output_path, ...} de todas.
+# pending (PendingLocation) indica JPEGs gravados com nome provisório, à espera da localização.
+PhotoResult = namedtuple("PhotoResult", ["job", "output_path", "error", "geocode_stats", "bytes_read", "timings",
+                                         "outputs", "pending"],
+                         defaults=[None, 0, None, None, None])
+
+# Foto cujo nome depende de um geocoding ainda em andamento no GeocodeStage:
+# location é o Future de (endereço, origem); paths, os JPEGs provisórios de cada versão.
+PendingLocation = namedtuple("PendingLocation", ["location", "rendered", "paths"])
+
+# Resumo de uma execução completa de run_batch.
+# skipped conta as fotos já concluídas em execuções anteriores (manifesto);
+# memory (MemoryReport) traz o orçamento de memória e os picos de RSS da execução;
+# cache_hits conta as fotos vindas do cache de renderização e duplicates lista os
+# grupos de fotos com conteúdo idêntico na entrada ([chaves no manifesto], na ordem dos índices);
+# stage_stats (run_profile.RunProfile) traz os histogramas de duração de cada estágio;
+# shard_lots conta os lotes concluídos por este nó no modo distribuído (None fora dele).
+BatchSummary = namedtuple("BatchSummary", ["total", "processed", "errors", "first_output", "processed_base_dir",
+                                           "geocode_stats", "bytes_read", "skipped", "memory", "cache_hits",
+                                           "duplicates", "stage_stats", "shard_lots"], defaults=[None])
+
+# Marca d'água preparada por processo: {(caminho, mtime, tamanho da base): (imagem RGBA, posição)}
+_watermark_cache = {}
+
+
+def job_for_index(image_path, index, lot_size=IMAGES_PER_LOT):
+    """Descritor de trabalho para o índice global (1, 2, ...): o lote e a posição derivam dele."""
+    return PhotoJob(source_path=str(image_path), index=index,
+                    lot_number=(index - 1) // lot_size + 1, lot_slot=(index - 1) % lot_size + 1)
+
+
+def settings_fingerprint(settings, lot_size=IMAGES_PER_LOT):
+    """Resumo das configurações que alteram o resultado (marca d'água, versões, perfis JPEG, lotes)."""
+    payload = dict(_render_payload(settings), lot_size=lot_size)
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def render_fingerprint(settings):
+    """Resumo das configurações que alteram os JPEGs (sem os lotes): chave do cache de renderização."""
+    return hashlib.sha256(json.dumps(_render_payload(settings), sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _render_payload(settings):
+    watermark_hash = None
+    if settings.apply_watermark and settings.watermark_path:
+        with open(settings.watermark_path, "rb") as f:
+            watermark_hash = hashlib.sha256(f.read()).hexdigest()
+    return {
+        "watermark": watermark_hash,
+        "renditions": [dict(rendition._asdict(), size=list(rendition.size),
+                            profile=profile_for(rendition, settings)._asdict())
+                       for rendition in settings.renditions],
+        "fast_decode": settings.fast_decode,
+        "transform_backend": settings.transform_backend,
+    }
+
+
+class JobPlanner:
+    """
+    Planeja cada foto assim que a varredura a encontra, a partir do manifesto.
+    Fotos já conhecidas mantêm o índice (e portanto o lote) atribuído na primeira
+    execução; fotos novas recebem os próximos índices livres. Com resume, fotos
+    concluídas com a mesma origem e as mesmas configurações são puladas.
+    """
+
+    def __init__(self, input_dir, manifest, fingerprint, lot_size=IMAGES_PER_LOT, resume=True, verify_content=False):
+        self.input_dir = Path(input_dir)
+        self.manifest = manifest
+        self.fingerprint = fingerprint
+        self.lot_size = lot_size
+        self.resume = resume
+        self.verify_content = verify_content
+        self.next_index = manifest.next_index()
+        self.skipped = [] # Registros do manifesto das fotos puladas
+        self.sources = {} # {índice: (chave no manifesto, assinatura da origem)}
+
+    def plan(self, image_path):
+        """Retorna o PhotoJob da foto, ou None se ela já está concluída."""
+        source_key = Path(image_path).relative_to(self.input_dir).as_posix()
+        signature = source_signature(image_path, self.verify_content)
+        record = self.manifest.get(source_key)
+        if record is None:
+            index = self.next_index
+            self.next_index += 1
+            # O plano é gravado antes de processar: uma execução interrompida retoma com a mesma numeração
+            self.manifest.record(source_key, flush=False, index=index, status="planned")
+        elif self.resume and self.manifest.is_done(source_key, signature, self.fingerprint):
+            self.skipped.append(record)
+            return None
+        else:
+            index = record["index"]
+        self.sources[index] = (source_key, signature)
+        return job_for_index(image_path, index, self.lot_size)
+
+    def in_flight(self, image_path):
+        """True se a foto já foi planejada e ainda não concluída nesta execução."""
+        record = self.manifest.get(Path(image_path).relative_to(self.input_dir).as_posix())
+        return record is not None and record["index"] in self.sources
+
+
+def lot_dir_for(processed_base_dir, lot_number):
+    """Caminho da pasta de um lote (ex: Lote_001)."""
+    return Path(processed_base_dir) / f"Lote_{lot_number:03d}"
+
+
+def rendition_dir_for(processed_base_dir, lot_number, rendition):
+    """Pasta de uma versão dentro do lote (ex: Lote_001/full_hd)."""
+    return lot_dir_for(processed_base_dir, lot_number) / rendition.name
+
+
+def profile_for(rendition, settings):
+    """Perfil JPEG da versão: o dela, se definido, ou o da execução."""
+    return get_profile(rendition.profile) if rendition.profile else settings.encoder_profile
+
+
+def read_source(job, in_memory_limit=SOURCE_IN_MEMORY_LIMIT):
+    """
+    Estágio de leitura: lê o arquivo de origem inteiro, uma única vez. Arquivos
+    maiores que in_memory_limit não são lidos aqui (nem copiados para o processo
+    de trabalho): o estágio de CPU os abre pelo caminho.
+    """
+    started = time.perf_counter()
+    size = os.path.getsize(job.source_path)
+    if size > in_memory_limit:
+        return SourceData(data=None, read_seconds=time.perf_counter() - started, size=size)
+    with open(job.source_path, "rb") as f:
+        data = f.read()
+    return SourceData(data=data, read_seconds=time.perf_counter() - started, size=len(data))
+
+
+def estimate_job_memory(job, settings):
+    """Pico estimado de memória da foto no pipeline (bytes), só pelo cabeçalho, para o orçamento de memória."""
+    size = os.path.getsize(job.source_path)
+    source_bytes = 2 * size if size <= SOURCE_IN_MEMORY_LIMIT else 0 # Lidos aqui e copiados para o processo
+    header = read_header(job.source_path)
+    if header is None:
+        return source_bytes
+    rendition_pixels = sum(width * height for width, height in
+                           (fitted_size(header.size, rendition) for rendition in settings.renditions))
+    return estimate_peak_bytes(header, decode_size(header.size, settings.renditions), rendition_pixels,
+                               settings.fast_decode, source_bytes)
+
+
+def render_job(job, source, settings):
+    """
+    Estágio de CPU (processo de trabalho): decodifica uma vez, gera as versões
+    (redimensionamento, corte e marca d'água), extrai metadados e codifica os
+    JPEGs em memória.
+    """
+    from PIL import Image # Só nos processos de trabalho: o PIL pesa na partida da interface
+
+    image_path = Path(job.source_path)
+    started = time.perf_counter()
+    timings = {"read": source.read_seconds}
+    spans = [] if settings.profile_dir else None
+    clock = StageClock(timings, spans)
+    try:
+        with worker_profile(settings.profile_dir):
+            # 1. Carregamento da imagem: os mesmos bytes servem para o EXIF e para os pixels
+            with Image.open(io.BytesIO(source.data) if source.data is not None else image_path) as source_img:
+                exif_data = read_exif(source_img)
+                carried = {rendition.name: carried_metadata(source_img, profile_for(rendition, settings))
+                           for rendition in settings.renditions}
+                img = decode_image(source_img, decode_size(source_img.size, settings.renditions),
+                                   settings.fast_decode)
+            clock.mark("decode")
+
+            # 2. Redimensionamento, Corte e Marca d'água (AGORA OPCIONAL E COM IMAGEM PNG) de cada versão
+            watermark_path = settings.watermark_path if settings.apply_watermark else None
+            frames = render_renditions(img, settings.renditions, watermark_path, settings.transform_backend, clock)
+
+            # 3. Extração de Metadados (a partir do EXIF lido acima)
+            metadata = build_metadata(image_path, exif_data)
+            final_filename_stem = build_filename_stem(job, image_path, metadata)
+            clock.mark("metadata")
+
+            # 4. Codificação dos JPEGs (gravados depois pelo estágio de escrita)
+            outputs = []
+            for rendition, frame in frames:
+                outputs.append((rendition, encode_jpeg(frame, profile_for(rendition, settings),
+                                                       carried[rendition.name])))
+                clock.mark("encode")
+
+        timings["render"] = time.perf_counter() - started
+        return RenderedPhoto(job=job, filename_stem=final_filename_stem, outputs=outputs,
+                             metadata=metadata, geocode_stats={}, bytes_read=source.size,
+                             error=None, timings=timings, peak_rss=process_peak(), spans=spans)
+
+    except Exception as e:
+        print(f"Erro ao processar {image_path.name}: {e}") # Loga o erro no console
+        timings["render"] = time.perf_counter() - started
+        return RenderedPhoto(job=job, filename_stem=None, outputs=None, metadata=None, geocode_stats=None,
+                             bytes_read=source.size, error=str(e), timings=timings, peak_rss=process_peak(),
+                             spans=spans)
+
+
+def cached_render(job, source, cached, settings):
+    """
+    Resultado do estágio de CPU para uma foto encontrada no cache de renderização
+    (CachedRender): os JPEGs ficam no cache até a gravação e os metadados do EXIF
+    vêm do índice; só o caminho de origem, a data e o nome do arquivo são refeitos.
+    """
+    image_path = Path(job.source_path)
+    metadata = dict(cached.metadata, original_file=str(image_path), processed_date=datetime.now().isoformat())
+    return RenderedPhoto(job=job, filename_stem=build_filename_stem(job, image_path, metadata),
+                         outputs=[(rendition, cached.paths[rendition.name]) for rendition in settings.renditions],
+                         metadata=metadata, geocode_stats={}, bytes_read=source.size, error=None,
+                         timings={"read": source.read_seconds}, peak_rss=(os.getpid(), None))
+
+
+def write_rendered(rendered, settings, location=None, sink=None):
+    """
+    Estágio de gravação: salva o JPEG e o JSON de metadados de cada versão na
+    pasta dela, dentro do lote (ou envia os metadados a sink, ver metadata_sink).
+    Com location (Future do GeocodeStage), os JPEGs ficam com nome provisório e
+    o resultado volta pendente (ver finalize_location).
+    """
+    if rendered.error is not None:
+        return PhotoResult(job=rendered.job, output_path=None, error=rendered.error, bytes_read=rendered.bytes_read,
+                           timings=rendered.timings)
+
+    started = time.perf_counter()
+    stem = provisional_stem(rendered.job) if location is not None else rendered.filename_stem
+    paths = []
+    for rendition, jpeg_bytes in rendered.outputs:
+        # Salva a imagem processada
+        processed_image_path = rendition_dir_for(settings.processed_base_dir, rendered.job.lot_number,
+                                                 rendition) / f"{stem}.jpg"
+        if isinstance(jpeg_bytes, Path):
+            link_or_copy(jpeg_bytes, processed_image_path) # JPEG do cache de renderização
+        else:
+            if processed_image_path.is_file() and processed_image_path.stat().st_nlink > 1:
+                processed_image_path.unlink() # Ligado ao cache: gravar no lugar alteraria a entrada do cache
+            with open(processed_image_path, "wb") as f:
+                f.write(jpeg_bytes)
+        paths.append(processed_image_path)
+
+    timings = dict(rendered.timings, write=time.perf_counter() - started)
+    if location is not None:
+        # Os bytes já estão em disco: só os metadados seguem para a finalização
+        rendered = rendered._replace(outputs=[(rendition, None) for rendition, _ in rendered.outputs], timings=timings)
+        return PhotoResult(job=rendered.job, output_path=None, error=None, bytes_read=rendered.bytes_read,
+                           timings=timings, pending=PendingLocation(location, rendered, paths))
+
+    outputs = _write_sidecars(rendered, settings, rendered.metadata, paths, sink)
+    timings["write"] = time.perf_counter() - started
+    return PhotoResult(job=rendered.job, output_path=outputs[0]["output_path"], error=None,
+                       geocode_stats=rendered.geocode_stats, bytes_read=rendered.bytes_read, timings=timings,
+                       outputs=outputs)
+
+
+def finalize_location(result, settings, sink=None):
+    """
+    Conclui uma foto pendente: aplica o endereço resolvido aos metadados, renomeia
+    os JPEGs provisórios para o nome final e grava os JSONs de metadados.
+    """
+    pending = result.pending
+    rendered = pending.rendered
+    image_path = Path(rendered.job.source_path)
+    metadata = rendered.metadata
+    geocode_stats = dict(rendered.geocode_stats or {})
+    try:
+        address_details, source = pending.location.result()
+        apply_address(metadata, address_details)
+    except Exception as geocoding_err: # Tentativas esgotadas (GeocoderTimedOut, ...) ou estágio encerrado
+        print(f"Erro no geocoding para {image_path.name}: {geocoding_err}")
+        source = "error"
+        metadata["exif_data"]["location"]["city"] = "SemLocal" # Define como 'SemLocal' em caso de erro
+    geocode_stats[source] = geocode_stats.get(source, 0) + 1
+
+    started = time.perf_counter()
+    stem = build_filename_stem(rendered.job, image_path, metadata)
+    paths = []
+    for provisional_path in pending.paths:
+        final_path = provisional_path.with_name(f"{stem}.jpg")
+        os.replace(provisional_path, final_path)
+        paths.append(final_path)
+    outputs = _write_sidecars(rendered, settings, metadata, paths, sink)
+
+    timings = dict(rendered.timings)
+    timings["write"] = timings.get("write", 0.0) + time.perf_counter() - started
+    return PhotoResult(job=rendered.job, output_path=outputs[0]["output_path"], error=None,
+                       geocode_stats=geocode_stats, bytes_read=rendered.bytes_read, timings=timings, outputs=outputs)
+
+
+def provisional_stem(job):
+    """Nome provisório (oculto) dos JPEGs que aguardam a localização; fixo por índice, sobrescrito ao retomar."""
+    return f".pendente_{job.index:06d}"
+
+
+def _write_sidecars(rendered, settings, metadata, paths, sink=None):
+    """
+    Grava o JSON de metadados ao lado de cada versão (ou o envia a sink) e
+    retorna a lista de saídas (para o manifesto).
+    """
+    outputs = []
+    for (rendition, _), processed_image_path in zip(rendered.outputs, paths):
+        # Salva os metadados (com a versão e o perfil JPEG que produziram este arquivo)
+        profile = profile_for(rendition, settings)
+        rendition_metadata = dict(metadata,
+                                  rendition={"name": rendition.name, "size": list(rendition.size),
+                                             "fit": rendition.fit, "watermark": rendition.watermark},
+                                  encoder_profile=profile._asdict())
+        if sink is not None:
+            sink.add(rendition_metadata, processed_image_path) # Gravado em lote, sem um arquivo por foto
+            metadata_path = None
+        else:
+            metadata_path = metadata_path_for(processed_image_path)
+            with open(metadata_path, 'w', encoding='utf-8') as f:
+                json.dump(rendition_metadata, f, indent=4, ensure_ascii=False)
+
+        outputs.append({"rendition": rendition.name, "profile": profile.name,
+                        "output_path": str(processed_image_path), "metadata_path": metadata_path})
+    return outputs
+
+
+def error_result(job, error):
+    """Resultado de erro para falhas fora do estágio de CPU (leitura ou gravação)."""
+    print(f"Erro ao processar {Path(job.source_path).name}: {error}")
+    return PhotoResult(job=job, output_path=None, error=str(error))
+
+
+def cover_size(source_size, target_resolution):
+    """Menor tamanho, mantendo a proporção, que cobre toda a resolução alvo."""
+    original_width, original_height = source_size
+    target_width, target_height = target_resolution
+
+    # Escolhe o maior fator de escala para que a imagem COBRIR a resolução alvo
+    scale_factor = max(target_width / original_width, target_height / original_height)
+
+    # Nunca menor que o alvo (evita perder 1px por arredondamento de ponto flutuante)
+    return (max(target_width, int(original_width * scale_factor)),
+            max(target_height, int(original_height * scale_factor)))
+
+
+def fit_scale(source_size, rendition):
+    """Fator de escala da origem para a versão (cobrir ou caber em rendition.size)."""
+    scales = (rendition.size[0] / source_size[0], rendition.size[1] / source_size[1])
+    return min(scales) if rendition.fit == "contain" else max(scales)
+
+
+def fitted_size(source_size, rendition):
+    """Tamanho da imagem inteira escalada para a versão (antes do corte central, no modo cover)."""
+    if rendition.fit != "contain":
+        return cover_size(source_size, rendition.size)
+    scale = fit_scale(source_size, rendition)
+    return (max(1, min(rendition.size[0], round(source_size[0] * scale))),
+            max(1, min(rendition.size[1], round(source_size[1] * scale))))
+
+
+def decode_size(source_size, renditions):
+    """Menor tamanho decodificado que ainda atende a todas as versões (para a decodificação reduzida)."""
+    sizes = [fitted_size(source_size, rendition) for rendition in renditions]
+    return max(size[0] for size in sizes), max(size[1] for size in sizes)
+
+
+def render_renditions(img, renditions, watermark_path=None, transform_backend="pil", clock=None):
+    """
+    Gera as versões a partir da imagem decodificada, em cascata: da maior escala
+    para a menor, cada uma é reduzida da imagem inteira já escalada para a
+    anterior (nunca de uma ampliação), e não da origem. Retorna [(Rendition,
+    imagem)] na ordem de renditions. No backend opencv cada versão é cortada e
+    reduzida direto da origem (só a região usada é reamostrada). Com clock
+    (StageClock), o tempo vai para os estágios resize e watermark (no opencv,
+    que faz os dois de uma vez, tudo conta como resize).
+    """
+    from PIL import Image
+
+    frames = {}
+    base = img # Imagem inteira (sem corte) da qual a próxima versão é reduzida
+    for rendition in sorted(renditions, key=lambda r: fit_scale(img.size, r), reverse=True):
+        apply_watermark = bool(watermark_path) and rendition.watermark
+        if transform_backend == "opencv":
+            from cv_transform import render_frame # Importado só quando usado (OpenCV é pesado)
+            frames[rendition.name] = render_frame(img, rendition, watermark_path if apply_watermark else None)
+            if clock is not None:
+                clock.mark("resize")
+            continue
+
+        size = fitted_size(base.size, rendition)
+        scaled = base if size == base.size else base.resize(size, Image.LANCZOS)
+        if rendition.fit == "contain":
+            # A marca d'água é aplicada no lugar: não pode alterar a base das próximas versões
+            frame = scaled.copy() if apply_watermark else scaled
+        else:
+            frame = crop_center(scaled, rendition.size)
+        if clock is not None:
+            clock.mark("resize")
+        if apply_watermark:
+            frame = apply_image_watermark(frame, watermark_path)
+            if clock is not None:
+                clock.mark("watermark")
+        frames[rendition.name] = frame
+        if scaled.width <= img.width and scaled.height <= img.height:
+            base = scaled
+    return [(rendition, frames[rendition.name]) for rendition in renditions]
+
+
+def decode_image(img, target_resolution, fast_decode=True):
+    """
+    Decodifica uma imagem recém-aberta em RGB. Com fast_decode, JPEGs são
+    decodificados pelo libjpeg já reduzidos (1/2, 1/4 ou 1/8), sem ficarem menores
+    que o tamanho de cobertura; o LANCZOS final continua em resize_to_cover.
+    Imagens enormes em outros formatos (TIFF, PNG) são reduzidas por um fator
+    inteiro logo após a carga, antes da cópia RGB (ver memory_budget).
+    """
+    if fast_decode and img.format == "JPEG":
+        img.draft("RGB", cover_size(img.size, target_resolution))
+    elif fast_decode:
+        factor = reduce_factor(img.size, cover_size(img.size, target_resolution))
+        if factor > 1:
+            img = reduce_on_load(img, factor)
+    return img.convert("RGB")
+
+
+def load_image(image_path, target_resolution, fast_decode=True):
+    """Abre e decodifica a imagem em RGB (ver decode_image)."""
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        return decode_image(img, target_resolution, fast_decode)
+
+
+def resize_to_cover(img, target_resolution):
+    """Redimensiona (LANCZOS) para cobrir a resolução alvo e corta o centro."""
+    from PIL import Image
+
+    # Calcula as novas dimensões da imagem após o escalonamento
+    img_scaled_width, img_scaled_height = cover_size(img.size, target_resolution)
+
+    # Redimensiona a imagem para as dimensões escaladas (usando LANCZOS para alta qualidade)
+    img_resized = img.resize((img_scaled_width, img_scaled_height), Image.LANCZOS)
+
+    return crop_center(img_resized, target_resolution)
+
+
+def crop_center(img, target_resolution):
+    """Corta o centro da imagem no tamanho alvo."""
+    target_width, target_height = target_resolution
+    img_scaled_width, img_scaled_height = img.size
+
+    # Calcula as coordenadas para cortar a imagem no centro para o tamanho alvo
+    left = (img_scaled_width - target_width) / 2
+    top = (img_scaled_height - target_height) / 2
+    right = (img_scaled_width + target_width) / 2
+    bottom = (img_scaled_height + target_height) / 2
+
+    # Realiza o corte
+    return img.crop((left, top, right, bottom))
+
+
+def encode_jpeg(img, profile=ENCODER_PROFILES[DEFAULT_PROFILE], carried=None):
+    """Codifica a imagem final como JPEG em memória, com o perfil e o EXIF/ICC copiados da origem (carried)."""
+    encoded = io.BytesIO()
+    img.save(encoded, "JPEG", **save_options(profile, carried))
+    return encoded.getvalue()
+
+
+def metadata_path_for(processed_image_path):
+    """Caminho do JSON de metadados que acompanha a foto processada."""
+    processed_image_path = Path(processed_image_path)
+    return str(processed_image_path.with_name(f"{processed_image_path.stem}_metadata.json"))
+
+
+def build_filename_stem(job, image_path, metadata):
+    """Monta o nome final do arquivo: 'NNN-NN - Local - Data - NomeOriginal'."""
+    base_name = image_path.stem # Nome do arquivo original sem extensão
+    processed_name_prefix = f"{job.index:03d}-{job.lot_slot:02d}"
+
+    # --- SANITIZAÇÃO DA STRING DE LOCALIZAÇÃO PARA O NOME DO ARQUIVO ---
+    location_for_filename = metadata["exif_data"]["location"]["city"]
+    if location_for_filename == "N/A":
+        location_str = "SemLocal" # Substitui "N/A" por "SemLocal" no nome do arquivo para evitar '\'
+    else:
+        # Remove caracteres inválidos do nome do arquivo (ex: \ / : * ? " < > |)
+        # e substitui por um traço ou remove.
+        # Adiciona espaços e hífens como caracteres permitidos, além de alfanuméricos
+        location_str = ''.join(c if c.isalnum() or c in [' ', '-'] else '_' for c in location_for_filename)
+        location_str = location_str.strip() # Remove espaços extras no início/fim
+        if not location_str: # Se ficar vazio depois da sanitização, usa "SemLocal"
+            location_str = "SemLocal"
+    # --- FIM DA SANITIZAÇÃO ---
+
+    # --- TRATAMENTO ROBUSTO DE DATA PARA O NOME DO ARQUIVO ---
+    date_str = "SemData" # Fallback padrão
+    exif_datetime_str = metadata["exif_data"]["datetime"]
+
+    if exif_datetime_str != "N/A":
+        try:
+            # Tenta converter a data EXIF (já em ISO format)
+            date_obj = datetime.fromisoformat(exif_datetime_str)
+            date_str = date_obj.strftime("%d%m%Y")
+        except ValueError as e:
+            print(f"Aviso: Formato de data EXIF inesperado para {image_path.name} ({exif_datetime_str}): {e}. Tentando data de modificação do arquivo.")
+            # Se falhar, tenta usar a data de modificação
+            try:
+                modification_timestamp = image_path.stat().st_mtime
+                date_obj = datetime.fromtimestamp(modification_timestamp)
+                date_str = date_obj.strftime("%d%m%Y")
+            except Exception as date_error:
+                print(f"Aviso: Não foi possível obter a data de modificação do arquivo {image_path.name}: {date_error}")
+                # Se tudo falhar, mantém "SemData"
+    else:
+        # Se a data EXIF já era N/A, tenta direto a data de modificação do arquivo
+        try:
+            modification_timestamp = image_path.stat().st_mtime
+            date_obj = datetime.fromtimestamp(modification_timestamp)
+            date_str = date_obj.strftime("%d%m%Y")
+        except Exception as date_error:
+            print(f"Aviso: Não foi possível obter a data de modificação do arquivo {image_path.name}: {date_error}")
+            # Se tudo falhar, mantém "SemData"
+    # --- FIM DO TRATAMENTO DE DATA ---
+
+    return f"{processed_name_prefix} - {location_str} - {date_str} - {base_name}"
+
+
+def prepare_watermark(watermark_image_path, base_size):
+    """
+    Carrega a marca d'água já redimensionada (20% da largura da base, em RGBA)
+    e a posição no canto inferior direito. O resultado fica em cache por processo,
+    com chave (caminho, mtime, tamanho da base), pois é o mesmo para todo o lote.
+    """
+    key = (str(watermark_image_path), os.path.getmtime(watermark_image_path), tuple(base_size))
+    cached = _watermark_cache.get(key)
+    if cached is not None:
+        return cached
+
+    from PIL import Image
+
+    with Image.open(watermark_image_path) as watermark_file:
+        watermark = watermark_file.copy()
+
+    # Redimensiona a marca d'água para 20% da largura da imagem base, mantendo proporção
+    base_width, base_height = base_size
+    watermark_width, watermark_height = watermark.size
+
+    target_watermark_width = int(base_width * 0.20) # 20% da largura da imagem base
+
+    # Calcula a nova altura mantendo a proporção
+    if watermark_width > 0: # Evita divisão por zero
+        watermark_ratio = watermark_height / watermark_width
+        target_watermark_height = int(target_watermark_width * watermark_ratio)
+    else:
+        target_watermark_height = watermark_height # Mantém a altura se a largura for zero, embora improvável
+
+    watermark = watermark.resize((target_watermark_width, target_watermark_height), Image.LANCZOS)
+
+    # Garante que a marca d'água tenha canal alfa para transparência
+    if watermark.mode != 'RGBA':
+        watermark = watermark.convert('RGBA')
+
+    # Posição: canto inferior direito com padding
+    padding = 20
+    x = base_width - watermark.width - padding
+    y = base_height - watermark.height - padding
+
+    if len(_watermark_cache) >= WATERMARK_CACHE_SIZE: # PNG trocado ou várias resoluções: descarta o antigo
+        _watermark_cache.clear()
+    _watermark_cache[key] = (watermark, (x, y))
+    return watermark, (x, y)
+
+
+def apply_image_watermark(base_image_pil, watermark_image_path):
+    """
+    Aplica uma imagem PNG como marca d'água na imagem base.
+    A marca d'água será redimensionada para 20% da largura da imagem base
+    e posicionada no canto inferior direito.
+    """
+    from PIL import Image
+
+    try:
+        watermark, (x, y) = prepare_watermark(watermark_image_path, base_image_pil.size)
+
+        # Combina apenas a região coberta pela marca d'água, sem converter o quadro inteiro para RGBA
+        box = (x, y, x + watermark.width, y + watermark.height)
+        region = base_image_pil.crop(box).convert('RGBA')
+        region = Image.alpha_composite(region, watermark)
+        base_image_pil.paste(region.convert('RGB'), box) # Volta para RGB para salvar como JPG
+        return base_image_pil
+
+    except Exception as e:
+        # Executa em processo de trabalho: sem messagebox, apenas log no console
+        print(f"Erro ao aplicar marca d'água de imagem: {e}")
+        return base_image_pil # Retorna a imagem original se houver erro
+
+
+def build_metadata(image_path, exif_data):
+    """
+    Monta o registro de metadados a partir do EXIF já lido (data, câmera e
+    coordenadas GPS). O endereço vem depois, do GeocodeStage (ver apply_address).
+    """
+    from PIL import ExifTags
+
+    metadata = {
+        "original_file": str(image_path),
+        "processed_date": datetime.now().isoformat(),
+        "exif_data": {
+            "datetime": "N/A", # Inicializa como N/A
+            "location": {
+                "city": "N/A",
+                "state": "N/A",
+                "country": "N/A",
+                "postcode": "N/A",
+                "coordinates": []
+            },
+            "camera_info": "N/A"
+        }
+    }
+
+    try:
+        if exif_data:
+            exif = {
+                ExifTags.TAGS[k]: v
+                for k, v in exif_data.items()
+                if k in ExifTags.TAGS
+            }
+
+            # Tenta extrair e formatar a data EXIF para ISO format
+            date_found = False
+            if "DateTimeOriginal" in exif:
+                try:
+                    metadata["exif_data"]["datetime"] = datetime.strptime(exif["DateTimeOriginal"], "%Y:%m:%d %H:%M:%S").isoformat()
+                    date_found = True
+                except ValueError:
+                    pass
+
+            if not date_found and "DateTime" in exif:
+                try:
+                    metadata["exif_data"]["datetime"] = datetime.strptime(exif["DateTime"], "%Y:%m:%d %H:%M:%S").isoformat()
+                    date_found = True
+                except ValueError:
+                    pass
+
+            # Informações da Câmera
+            if "Make" in exif and "Model" in exif:
+                metadata["exif_data"]["camera_info"] = f"{exif['Make']} {exif['Model']}"
+            elif "Model" in exif:
+                metadata["exif_data"]["camera_info"] = exif["Model"]
+
+            # GPS
+            coordinates = gps_coordinates(exif)
+            if coordinates is not None:
+                decimal_lat, decimal_lon = coordinates
+                metadata["exif_data"]["location"]["coordinates"] = [decimal_lat, decimal_lon]
+
+
+    except Exception as e:
+        print(f"Erro geral ao extrair metadados de {image_path.name}: {e}")
+
+    return metadata
+
+
+def read_exif(img):
+    """Lê o EXIF bruto de uma imagem já aberta (apenas o cabeçalho, sem decodificar pixels)."""
+    get_exif = getattr(img, "_getexif", None) # Nem todos os formatos oferecem _getexif (ex: PNG, BMP)
+    return get_exif() if get_exif is not None else None
+
+
+def gps_coordinates(exif):
+    """(latitude, longitude) em graus decimais do EXIF (tags por nome, ex: "GPSInfo"), ou None."""
+    if "GPSInfo" not in exif:
+        return None
+    gps_info = exif["GPSInfo"]
+    lat = _get_gps_coordinate(gps_info, "GPSLatitude")
+    lon = _get_gps_coordinate(gps_info, "GPSLongitude")
+    lat_ref = gps_info.get(1, 'N')
+    lon_ref = gps_info.get(3, 'E')
+    if not (lat and lon):
+        return None
+
+    decimal_lat = _to_degrees(lat)
+    decimal_lon = _to_degrees(lon)
+    if lat_ref != 'N':
+        decimal_lat = -decimal_lat
+    if lon_ref != 'E':
+        decimal_lon = -decimal_lon
+    return decimal_lat, decimal_lon
+
+
+def read_gps(data):
+    """Coordenadas GPS a partir dos bytes (ou do caminho) do arquivo, lendo só o cabeçalho (sem decodificar os pixels)."""
+    from PIL import ExifTags, Image
+
+    try:
+        with Image.open(io.BytesIO(data) if isinstance(data, bytes) else data) as img:
+            exif_data = read_exif(img)
+        if not exif_data:
+            return None
+        return gps_coordinates({ExifTags.TAGS[k]: v for k, v in exif_data.items() if k in ExifTags.TAGS})
+    except Exception:
+        return None # A falha real aparece na decodificação, no estágio de CPU
+
+
+def apply_address(metadata, address_details):
+    """Preenche a localização dos metadados com o endereço do geocoding (formato do Nominatim)."""
+    if address_details is None:
+        return metadata
+    metadata["exif_data"]["location"]["city"] = address_details.get("city", address_details.get("town", address_details.get("village", "N/A")))
+    metadata["exif_data"]["location"]["state"] = address_details.get("state", "N/A")
+    metadata["exif_data"]["location"]["country"] = address_details.get("country", "N/A")
+    metadata["exif_data"]["location"]["postcode"] = address_details.get("postcode", "N/A")
+
+    # Detecção de Manaus
+    if metadata["exif_data"]["location"]["city"] and "manaus" in metadata["exif_data"]["location"]["city"].lower():
+        metadata["exif_data"]["location"]["city"] = "Manaus" # Padroniza para "Manaus"
+    return metadata
+
+
+# Mapeia o nome da tag GPS para o seu número (o EXIF do Pillow usa as chaves numéricas); preenchido no primeiro uso
+_GPS_TAG_IDS = {}
+
+
+def _get_gps_coordinate(gps_info, key):
+    """Ajuda a extrair coordenadas GPS de um dicionário EXIF."""
+    if not _GPS_TAG_IDS:
+        from PIL import ExifTags
+
+        _GPS_TAG_IDS.update({name: tag for tag, name in ExifTags.GPSTAGS.items()})
+    tag = _GPS_TAG_IDS.get(key)
+    if tag is not None and tag in gps_info:
+        return gps_info[tag]
+    return None
+
+
+def _to_degrees(value):
+    """Converte as coordenadas GPS (DMS) para graus decimais."""
+    d = float(value[0])
+    m = float(value[1])
+    s = float(value[2])
+    return d + (m / 60.0) + (s / 3600.0)
+
+
+def run_batch(input_dir, output_dir, watermark_path="", apply_watermark=True, workers=DEFAULT_WORKERS,
+              lot_size=IMAGES_PER_LOT, target_resolution=TARGET_RESOLUTION, geocode_config=None, fast_decode=True,
+              resume=True, verify_content=False, scan=None, readers=DEFAULT_READER_THREADS,
+              writers=DEFAULT_WRITER_THREADS, max_in_flight=None, transform_backend="pil",
+              encoder_profile=DEFAULT_PROFILE, renditions=None, memory_budget_mb=None, render_cache_config=None,
+              metadata_sink="json", profile_dir=None, watcher=None, shard_config=None, order="scan",
+              on_scan=None, on_index=None, on_estimate=None, on_plan=None, on_progress=None):
+    """
+    Processa todas as fotos de input_dir em um pool de processos.
+
+    As fotos são salvas em output_dir/FT TRATADAS 2025/Lote_NNN/<versão>: uma
+    pasta por versão de renditions (lista de Rendition; sem ela, uma única
+    versão com target_resolution), todas geradas de uma só decodificação. Se informado,
+    on_progress(concluidas, total, resultado) é chamado a cada foto concluída,
+    na thread que chamou run_batch. geocode_config (GeocodeConfig) controla o
+    cache de geocoding e o modo offline; fast_decode ativa a decodificação
+    reduzida de JPEGs (ver load_image).
+
+    O manifesto em FT TRATADAS 2025 guarda o índice e o resultado de cada foto:
+    com resume, fotos já concluídas são puladas e a numeração é mantida entre
+    execuções. verify_content compara o hash do conteúdo em vez de tamanho/mtime.
+
+    As fotos são enviadas aos processos à medida que a varredura as encontra;
+    on_scan(encontradas) informa a contagem parcial. Uma ImageScan anterior
+    (scan) é reaproveitada se nenhuma pasta mudou desde então. Enquanto a
+    varredura não termina, o total de on_progress é o de fotos enviadas até
+    então; on_plan(total) é chamado uma vez, quando o total de fotos a
+    processar fica conhecido (no fim da varredura, ou antes do processamento
+    com order="capture"), e a partir daí on_progress recebe esse total.
+
+    Cada foto passa por threads de leitura (readers), pelo pool de processos
+    (decodificação, transformação e codificação) e por threads de gravação
+    (writers); no máximo max_in_flight fotos ficam em memória ao mesmo tempo.
+    O geocoding roda à parte, no GeocodeStage: as coordenadas são enviadas
+    assim que a foto é lida, e os JPEGs com GPS são gravados com nome provisório
+    e renomeados quando a localização chega (sem ocupar o pool enquanto isso).
+    transform_backend escolhe quem redimensiona e aplica a marca d'água: "pil"
+    ou "opencv" (corte na origem e combinação em NumPy, ver cv_transform).
+    encoder_profile (nome ou EncoderProfile) define a codificação dos JPEGs das
+    versões que não têm perfil próprio.
+
+    Com memory_budget_mb, cada foto só é lida quando a estimativa de memória
+    dela (pelo cabeçalho: tamanho decodificado, cópia RGB e versões) cabe, junto
+    com as fotos em andamento, no orçamento; uma foto maior que o orçamento
+    passa sozinha. O orçamento cobre os dados das fotos, não a memória fixa de
+    cada processo. O pico de RSS da execução volta em BatchSummary.memory.
+
+    Cada foto lida tem o conteúdo resumido (SHA-256): fotos idênticas na entrada
+    são listadas em BatchSummary.duplicates. Com render_cache_config
+    (RenderCacheConfig), fotos já renderizadas com as mesmas configurações, em
+    qualquer execução, são ligadas ou copiadas do cache em vez de renderizadas.
+
+    metadata_sink escolhe onde ficam os metadados: "json" (um arquivo por foto),
+    "jsonl" (um arquivo por lote) ou "sqlite" (um banco na pasta de saída), ver
+    metadata_sink.py.
+
+    A duração de cada estágio (leitura, decodificação, redimensionamento, marca
+    d'água, metadados, codificação, gravação e espera/consulta do geocoding) é
+    somada em histogramas (BatchSummary.stage_stats). Com profile_dir, a execução
+    também grava ali perfil.pstats (cProfile do processo principal e dos
+    processos de trabalho) e trace.json (linha do tempo no formato Chrome trace).
+
+    Com watcher (FolderWatcher de folder_watch.py), a execução não termina ao fim
+    da varredura: cada imagem nova ou alterada em input_dir entra no pipeline
+    assim que termina de ser gravada, com a numeração seguindo a do manifesto,
+    até watcher.stop(); então as fotos em andamento são concluídas normalmente.
+
+    Com shard_config (ShardConfig de shard_ledger.py), esta execução é um nó de
+    um processamento distribuído: várias máquinas com a mesma pasta de saída
+    compartilhada dividem os lotes por um livro de tarefas nela, com lotes e
+    índices iguais aos de uma execução em uma máquina só (ver shard_ledger).
+
+    order="scan" (padrão) mantém a ordem da varredura, com as fotos enviadas
+    aos processos à medida que são encontradas. Com order="capture", uma
+    passada pelos cabeçalhos (índice EXIF em disco, incremental, ver
+    exif_index) ordena as fotos novas pela data da captura antes de numerá-las:
+    o processamento só começa depois da varredura inteira e da leitura dos
+    cabeçalhos novos, com on_scan(encontradas) durante a varredura e
+    on_index(lidas, total) durante a leitura. No modo contínuo a ordem é sempre
+    a de chegada. Com o índice, on_estimate(RunEstimate) recebe a previsão de
+    duração antes do processamento, e as coordenadas GPS de todas as fotos
+    pendentes vão para o geocoding já no início.
+    """
+    if transform_backend not in TRANSFORM_BACKENDS:
+        raise ValueError(f"Backend de transformação desconhecido: {transform_backend!r}")
+    if metadata_sink not in METADATA_SINKS:
+        raise ValueError(f"Destino de metadados desconhecido: {metadata_sink!r}")
+    if order not in PLAN_ORDERS:
+        raise ValueError(f"Ordem do plano desconhecida: {order!r}")
+    if shard_config is not None and watcher is not None:
+        raise ValueError("O modo distribuído não pode ser combinado com o monitoramento da pasta")
+    if shard_config is not None and metadata_sink == "sqlite":
+        raise ValueError("O modo distribuído não aceita metadados em SQLite (o banco não é seguro em pasta de rede); "
+                         "use json ou jsonl")
+    encoder_profile = get_profile(encoder_profile)
+    if renditions is None:
+        renditions = [rendition_for_resolution(target_resolution)]
+    renditions = validate_renditions(renditions)
+    for rendition in renditions:
+        if rendition.profile:
+            get_profile(rendition.profile) # Perfil inválido falha aqui, não em cada foto
+    if geocode_config is None:
+        geocode_config = GeocodeConfig()
+    if geocode_config.cache_path:
+        # Limpa entradas expiradas uma vez por execução, antes de abrir o cache nos processos
+        cache = GeocodeCache(geocode_config.cache_path, geocode_config.grid_degrees, geocode_config.ttl_days)
+        cache.prune(geocode_config.max_entries)
+        cache.close()
+
+    processed_base_dir = Path(output_dir) / PROCESSED_DIR_NAME
+    processed_base_dir.mkdir(parents=True, exist_ok=True) # Garante que a pasta base exista
+
+    settings = ProcessingSettings(processed_base_dir=str(processed_base_dir),
+                                  watermark_path=watermark_path,
+                                  apply_watermark=apply_watermark,
+                                  renditions=renditions,
+                                  fast_decode=fast_decode,
+                                  transform_backend=transform_backend,
+                                  encoder_profile=encoder_profile,
+                                  profile_dir=str(profile_dir) if profile_dir else None)
+    fingerprint = settings_fingerprint(settings, lot_size)
+
+    def by_capture(paths):
+        """Índice EXIF atualizado e [(caminho, ExifRecord)] na ordem da captura."""
+        from exif_index import ExifIndex, capture_order # Só com order="capture"
+
+        listed = []
+        for image_path in paths:
+            listed.append(image_path)
+            if on_scan is not None and len(listed) % 100 == 0:
+                on_scan(len(listed)) # A varredura inteira vem antes do envio: mostra o andamento dela
+        if on_scan is not None:
+            on_scan(len(listed))
+        exif_index = ExifIndex(processed_base_dir)
+        return exif_index, capture_order(exif_index.update(listed, input_dir, on_progress=on_index))
+
+    ledger = None
+    if shard_config is not None:
+        ledger = ShardLedger(processed_base_dir, shard_config)
+        ledger.start()
+
+        def plan_all():
+            """Planejamento de uma execução normal, feito por um único nó para todos."""
+            plan_manifest = ProcessingManifest(processed_base_dir, node=ledger.node_id)
+            plan_planner = JobPlanner(input_dir, plan_manifest, fingerprint, lot_size, resume, verify_content)
+            try:
+                paths = scan_images(input_dir)
+                if order == "capture": # Só o nó que monta o plano lê os cabeçalhos e grava o índice
+                    paths = [path for path, _ in by_capture(paths)[1]]
+                jobs = [job for job in map(plan_planner.plan, paths) if job is not None]
+            finally:
+                plan_manifest.close()
+            return [(plan_planner.sources[job.index][0], job.index, job.lot_number) for job in jobs]
+
+        try:
+            ledger.ensure_plan(plan_all, fingerprint)
+        except BaseException:
+            ledger.close()
+            raise
+        # Fotos dos lotes reivindicados; None enquanto espera outros nós. Lote de um nó que caiu: relê o
+        # manifesto dele antes do planejamento (manifest é criado abaixo, antes de a primeira foto ser pedida)
+        image_files = ledger.paths(input_dir, on_recovered=lambda source_keys: manifest.refresh(source_keys))
+    elif watcher is not None:
+        image_files = watcher.paths(exclude=[processed_base_dir]) # Contínua: None quando não há novidades
+    elif scan is not None and scan.is_current(input_dir):
+        image_files = scan.files # Pasta inalterada desde a contagem: não varre de novo
+    else:
+        image_files = scan_images(input_dir)
+    exif_index = None
+    indexed = None # {caminho: ExifRecord} das fotos desta execução, na ordem da captura
+    if order == "capture" and ledger is None and watcher is None:
+        exif_index, entries = by_capture(image_files)
+        indexed = {str(path): record for path, record in entries}
+        image_files = [path for path, _ in entries]
+    # Com o plano da passada pelos cabeçalhos, a varredura já foi informada por by_capture: o envio não a repete
+    scan_progress = on_scan if order == "scan" or watcher is not None else None
+
+    # Lote e índice de cada foto são definidos antes do envio aos processos,
+    # para que a numeração não dependa da ordem de conclusão
+    manifest = ProcessingManifest(processed_base_dir, node=ledger.node_id if ledger is not None else None)
+    planner = JobPlanner(input_dir, manifest, fingerprint, lot_size, resume, verify_content)
+    created_lots = set()
+
+    processed = 0
+    planned = None # Fotos a processar nesta execução, quando já conhecido (ver on_plan)
+    errors = []
+    geocode_stats = {}
+    bytes_read = 0
+    first_output = None # (índice, caminho) da primeira foto na ordem original
+    completed = 0
+    if max_in_flight is None:
+        max_in_flight = max(1, workers) * 2 + readers # Mantém todos os processos ocupados, com pouca folga
+
+    budget = MemoryBudget(int(memory_budget_mb * MIB)) if memory_budget_mb else None
+    profile = RunProfile(trace=profile_dir is not None)
+    main_profiler = None
+    if profile_dir is not None:
+        Path(profile_dir).mkdir(parents=True, exist_ok=True)
+        for old_dump in Path(profile_dir).glob(WORKER_PSTATS_PATTERN):
+            old_dump.unlink() # Perfis de uma execução anterior não entram na soma desta
+        import cProfile
+
+        main_profiler = cProfile.Profile() # Só a thread que chamou run_batch (as demais aparecem no trace)
+    render_cache = None
+    if render_cache_config is not None and render_cache_config.cache_dir:
+        render_cache = RenderCache(render_cache_config.cache_dir, render_cache_config.max_mb)
+    cache_fingerprint = render_fingerprint(settings)
+    content_hashes = {} # {índice: SHA-256 da origem}, da leitura até o registro no manifesto
+    worker_peaks = {} # {pid: pico de RSS em MiB} dos processos de trabalho desta execução
+
+    by_content = {} # {SHA-256: [(índice, chave no manifesto)]}, para o relatório de duplicatas
+    locations = {} # {índice: Future do GeocodeStage} das fotos com GPS, do estágio de leitura ao de gravação
+    awaiting = [] # Resultados gravados com nome provisório, à espera da localização
+    preplanned = {} # {caminho: PhotoJob ou None}, com o índice EXIF (plano feito antes do envio)
+    rendered_megapixels = 0.0 # Fotos renderizadas nesta execução (sem as copiadas do cache), para a calibração
+    render_seconds = 0.0 # Soma do estágio de CPU dessas fotos nos processos de trabalho
+    rendered_photos = 0
+
+    def read(job):
+        started = time.perf_counter()
+        source = read_source(job)
+        content_hashes[job.index] = content_hash(source.data, job.source_path)
+        if indexed is None: # Com o índice EXIF, as coordenadas já foram enviadas no início
+            coordinates = read_gps(source.data if source.data is not None else job.source_path)
+            if coordinates is not None:
+                locations[job.index] = geocoder.submit(*coordinates) # O geocoding começa antes da decodificação
+        profile.span("read", started, Path(job.source_path).name)
+        return source
+
+    def cached(job, source):
+        hit = render_cache.get(content_hashes[job.index], cache_fingerprint)
+        return cached_render(job, source, hit, settings) if hit is not None else None
+
+    def write(rendered):
+        started = time.perf_counter()
+        name = Path(rendered.job.source_path).name
+        pid, peak = rendered.peak_rss
+        if peak is not None:
+            worker_peaks[pid] = max(peak, worker_peaks.get(pid, 0.0))
+        profile.add_spans(rendered.spans, pid=pid, tid=pid, thread_name="render", photo=name)
+        if render_cache is not None and rendered.error is None and not isinstance(rendered.outputs[0][1], Path):
+            render_cache.put(content_hashes[rendered.job.index], cache_fingerprint, rendered.outputs, rendered.metadata)
+        result = write_rendered(rendered, settings, locations.pop(rendered.job.index, None), sink)
+        profile.span("write", started, name)
+        return result
+
+    def account(result):
+        nonlocal processed, bytes_read, first_output, completed, rendered_megapixels, render_seconds, rendered_photos
+        completed += 1
+        bytes_read += result.bytes_read
+        profile.add_timings(result.timings or {})
+        for source, count in (result.geocode_stats or {}).items():
+            geocode_stats[source] = geocode_stats.get(source, 0) + count
+
+        source_key, signature = planner.sources.pop(result.job.index)
+        digest = content_hashes.pop(result.job.index, None)
+        if digest is not None:
+            by_content.setdefault(digest, []).append((result.job.index, source_key))
+        if result.error is None:
+            processed += 1
+            if indexed is not None and "render" in (result.timings or {}):
+                record = indexed[result.job.source_path]
+                rendered_megapixels += record.width * record.height / 1e6
+                render_seconds += result.timings["render"]
+                rendered_photos += 1
+            if first_output is None or result.job.index < first_output[0]:
+                first_output = (result.job.index, Path(result.output_path))
+            _record_done(manifest, source_key, signature, fingerprint, result, digest)
+        else:
+            errors.append(result)
+            manifest.record(source_key, status="error", error=result.error)
+
+        if ledger is not None:
+            ledger.finished(result.job.source_path)
+        if on_progress is not None:
+            on_progress(completed, planned if planned is not None else pipeline.submitted, result)
+
+    def collect(results):
+        for result in results:
+            if result.pending is not None:
+                awaiting.append(result)
+            else:
+                account(result)
+
+    def finalize_ready(block=False):
+        """Dá o nome final às fotos cuja localização já chegou (com block, espera ao menos uma)."""
+        if block and awaiting:
+            wait([result.pending.location for result in awaiting], return_when=FIRST_COMPLETED)
+        for result in [result for result in awaiting if result.pending.location.done()]:
+            awaiting.remove(result)
+            started = time.perf_counter()
+            try:
+                finalized = finalize_location(result, settings, sink)
+            except Exception as e:
+                finalized = error_result(result.job, e)
+            profile.span("finalize", started, Path(result.job.source_path).name)
+            account(finalized)
+
+    found = 0
+    sink = open_sink(metadata_sink, processed_base_dir)
+    from concurrent.futures import ProcessPoolExecutor # multiprocessing, asyncio e geopy só quando há um lote
+    from geocode_stage import GeocodeStage
+
+    geocoder = GeocodeStage(geocode_config, profile=profile)
+    if main_profiler is not None:
+        main_profiler.enable()
+    try:
+        if indexed is not None:
+            # Plano completo antes do envio: estimativa da duração e todas as coordenadas já na fila do geocoding
+            pending = []
+            for image_path in image_files:
+                job = preplanned[str(image_path)] = planner.plan(image_path)
+                if job is None:
+                    continue
+                record = indexed[str(image_path)]
+                pending.append(record)
+                if record.gps is not None:
+                    locations[job.index] = geocoder.submit(*record.gps)
+            planned = len(pending)
+            if on_plan is not None:
+                on_plan(planned)
+            if on_estimate is not None:
+                on_estimate(exif_index.estimate(pending, workers))
+        # O pool não consulta o geocoding (só o GeocodeStage): não precisa de lock nem de cache por processo
+        with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+            pipeline = StagedPipeline(executor, read, partial(render_job, settings=settings), write, error_result,
+                                      readers=readers, writers=writers, max_in_flight=max_in_flight, budget=budget,
+                                      estimate=partial(estimate_job_memory, settings=settings),
+                                      shortcut=cached if render_cache is not None else None)
+            try:
+                for image_path in image_files:
+                    if image_path is None: # Sem fotos novas (pasta monitorada, outros nós): conclui o que terminou
+                        collect(pipeline.get_results())
+                        finalize_ready()
+                        manifest.flush()
+                        continue
+                    if watcher is not None and planner.in_flight(image_path):
+                        watcher.retry(image_path) # Regravada durante o processamento: entra de novo depois
+                        continue
+                    found += 1
+                    if scan_progress is not None and found % 100 == 0:
+                        scan_progress(found)
+
+                    job = preplanned.pop(str(image_path)) if indexed is not None else planner.plan(image_path)
+                    if job is None:
+                        if ledger is not None:
+                            ledger.finished(image_path)
+                        continue
+                    if job.lot_number not in created_lots:
+                        for rendition in renditions:
+                            rendition_dir_for(processed_base_dir, job.lot_number, rendition).mkdir(
+                                parents=True, exist_ok=True)
+                        created_lots.add(job.lot_number)
+
+                    pipeline.submit(job) # Bloqueia se já houver max_in_flight fotos em andamento
+                    collect(pipeline.get_results())
+                    finalize_ready()
+
+                manifest.flush()
+                if scan_progress is not None:
+                    scan_progress(found)
+                if planned is None:
+                    planned = pipeline.submitted # Varredura concluída: nenhuma foto nova entra depois daqui
+                    if on_plan is not None:
+                        on_plan(planned)
+                while pipeline.pending:
+                    collect(pipeline.get_results(block=True))
+                    finalize_ready()
+                while awaiting:
+                    finalize_ready(block=True)
+            finally:
+                pipeline.close()
+    finally:
+        if main_profiler is not None:
+            main_profiler.disable()
+        geocoder.close()
+        if sink is not None:
+            sink.close()
+        manifest.close()
+        if render_cache is not None:
+            render_cache.close()
+        if ledger is not None:
+            ledger.close()
+
+    for record in planner.skipped:
+        if first_output is None or record["index"] < first_output[0]:
+            first_output = (record["index"], Path(record["output_path"]))
+        if record.get("content_sha256"):
+            by_content.setdefault(record["content_sha256"], []).append((record["index"], record["source"]))
+    if exif_index is not None:
+        # Custo por megapixel do estágio de CPU, para a estimativa da próxima execução (sem as esperas do geocoding)
+        exif_index.calibrate(render_seconds, rendered_megapixels, rendered_photos)
+    duplicates = [[source_key for _, source_key in sorted(group)]
+                  for group in sorted(by_content.values(), key=min) if len(group) > 1]
+    if profile_dir is not None:
+        profile.write_chrome_trace(Path(profile_dir) / TRACE_NAME)
+        merge_pstats(profile_dir, main_profiler)
+
+    memory = MemoryReport(budget_mb=memory_budget_mb,
+                          peak_admitted_mb=round(budget.peak / MIB, 1) if budget else None,
+                          main_peak_rss_mb=peak_rss_mb(),
+                          worker_peak_rss_mb=max(worker_peaks.values()) if worker_peaks else None,
+                          workers_total_rss_mb=round(sum(worker_peaks.values()), 1) if worker_peaks else None,
+                          oversized=budget.oversized if budget else 0)
+    return BatchSummary(total=found, processed=processed, errors=errors,
+                        first_output=first_output[1] if first_output else None,
+                        processed_base_dir=processed_base_dir, geocode_stats=geocode_stats,
+                        bytes_read=bytes_read, skipped=len(planner.skipped), memory=memory,
+                        cache_hits=render_cache.hits if render_cache is not None else 0, duplicates=duplicates,
+                        stage_stats=profile, shard_lots=ledger.lots_done if ledger is not None else None)
+
+
+def _record_done(manifest, source_key, signature, fingerprint, result, content_sha256=None):
+    """
+    Registra a foto concluída e remove as saídas anteriores cujo nome mudou.
+    Versões geradas antes e não pedidas nesta execução (ex: um master 4K
+    ocasional) são mantidas e continuam registradas.
+    """
+    primary = result.outputs[0]
+    previous = manifest.get(source_key) or {}
+    current = {output["rendition"]: output for output in result.outputs}
+    # Registro do formato de versão única (arquivo direto em Lote_NNN): substituído pela nova estrutura
+    previous_outputs = previous.get("outputs") or ([dict(previous, rendition=None)] if previous.get("output_path") else [])
+
+    kept = []
+    for output in previous_outputs:
+        if output["rendition"] is not None and output["rendition"] not in current:
+            if os.path.exists(output["output_path"]):
+                kept.append(output)
+            continue
+        new = current.get(output["rendition"], {})
+        for key in ("output_path", "metadata_path"):
+            old_path = output.get(key)
+            if old_path and old_path != new.get(key) and os.path.exists(old_path):
+                os.remove(old_path) # Evita duplicatas quando a origem ou as configurações mudaram
+
+    manifest.record(source_key, status="done", index=result.job.index, signature=signature,
+                    fingerprint=fingerprint, profile=primary["profile"], output_path=primary["output_path"],
+                    metadata_path=primary["metadata_path"], outputs=result.outputs + kept,
+                    content_sha256=content_sha256)
@@ -1,17 +1,16 @@
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-from PIL import Image, ImageEnhance, ImageDraw, ImageFont, ExifTags
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 import os
+import queue
+import sys
 import threading
-import json
-from datetime import datetime
-import cv2
-import numpy as np
-import time
 from pathlib import Path
 
+from encoder_profiles import DEFAULT_PROFILE, ENCODER_PROFILES
+from image_scan import ImageScan
+from photo_processor_core import DEFAULT_WORKERS, PROCESSED_DIR_NAME, run_batch
+from progress_report import ProgressTracker
+
 # Definindo as cores e fontes conforme as especificações
 COLOR_BACKGROUND = "#2c3e50"
 COLOR_FRAME = "#34495e"
@@ -21,6 +20,7 @@ COLOR_BUTTON_ALTER = "#9b59b6"
 COLOR_BUTTON_PROCESS = "#e74c3c"
 COLOR_BUTTON_DOWNLOAD = "#27ae60"
 COLOR_BUTTON_DEMO_VIDEO = "#f39c12" # Nova cor para o botão de vídeo demonstrativo
+COLOR_BUTTON_PREVIEW = "#3498db"
 
 FONT_TITLE = ("Arial", 20, "bold")
 FONT_SUBTITLE = ("Arial", 12)
@@ -28,11 +28,9 @@ FONT_LABEL = ("Arial", 10, "bold")
 FONT_TEXT = ("Arial", 10)
 FONT_BUTTON = ("Arial", 11, "bold") # Ajuste para um tamanho bom nos botões
 
-# Constantes para processamento
-TARGET_RESOLUTION = (1920, 1080)
+# Constantes para processamento (as do pipeline ficam em photo_processor_core)
 DEFAULT_WATERMARK_TEXT = "@tioadaotvnafesta" # Manter como fallback ou para referência
-IMAGES_PER_LOT = 50
-DEMO_VIDEO_DURATION_SECONDS = 5 # Duração do vídeo demonstrativo
+PROGRESS_POLL_MS = 100 # Intervalo de atualização do progresso (no máximo 10 vezes por segundo)
 
 # --- Classe Principal da Aplicação ---
 class PhotoProcessorApp:
@@ -45,16 +43,24 @@ class PhotoProcessorApp:
 
         # Variáveis de controle
         self.input_folder = tk.StringVar()
-        self.output_folder = tk.StringVar(value=str(Path.home() / "FT TRATADAS 2025")) # Pasta de destino padrão
+        self.output_folder = tk.StringVar(value=str(Path.home() / PROCESSED_DIR_NAME)) # Pasta de destino padrão
         self.watermark_image_path = tk.StringVar() # Caminho para a imagem PNG da marca d'água
         self.image_count = tk.IntVar(value=0)
         self.apply_watermark = tk.BooleanVar(value=True) # Opção para aplicar ou não a marca d'água
         self.processing_status = tk.StringVar(value="Aguardando...")
+        self.stage_timings = tk.StringVar(value="") # Tempo médio por estágio (leitura, CPU, gravação)
         self.processed_count = tk.IntVar(value=0)
+        self.skipped_count = tk.IntVar(value=0) # Já processadas em execuções anteriores (manifesto)
         self.total_to_process = tk.IntVar(value=0)
-        self.first_processed_image_path = None # Para o vídeo demonstrativo
-
-        self.geolocator = Nominatim(user_agent="photo_watermark_app") # Inicializa o geocodificador
+        self.first_processed_image_path = None # Para o vídeo demonstrativo (a versão dela define as fotos do vídeo)
+        self.video_cancel = None # threading.Event do vídeo demonstrativo em andamento
+        self.last_scan = None # Varredura feita ao escolher a pasta, reaproveitada se nada mudou
+        self.worker_count = tk.IntVar(value=DEFAULT_WORKERS) # Número de processos de trabalho
+        self.encoder_profile = tk.StringVar(value=DEFAULT_PROFILE) # Perfil JPEG (archive, web, proof)
+        self.watch_folder = tk.BooleanVar(value=False) # Modo contínuo: processa as fotos que chegarem na pasta
+        self.watcher = None # FolderWatcher da execução contínua em andamento
+        self.progress_events = queue.Queue() # Eventos da thread de trabalho, consumidos por _poll_progress
+        self.progress_tracker = ProgressTracker()
 
         # Referências para os widgets que terão seu estado modificado
         self.btn_browse = None
@@ -64,6 +70,11 @@ class PhotoProcessorApp:
         self.btn_process = None
         self.btn_download = None
         self.btn_generate_demo_video = None # Novo botão para o vídeo demonstrativo
+        self.btn_preview = None
+        self.preview_window = None # PreviewWindow aberta (uma por vez)
+        self.spin_workers = None
+        self.combo_profile = None
+        self.chk_watch_folder = None
 
         self._create_widgets()
 
@@ -101,7 +112,9 @@ class PhotoProcessorApp:
         self.progressbar.pack(pady=10)
 
         tk.Label(self.master, textvariable=self.processing_status, bg=COLOR_BACKGROUND, fg=COLOR_TEXT,
-                 font=FONT_TEXT).pack(pady=(0, 5))
+                 font=FONT_TEXT).pack(pady=(0, 2))
+        tk.Label(self.master, textvariable=self.stage_timings, bg=COLOR_BACKGROUND, fg="#cccccc",
+                 font=("Arial", 8)).pack(pady=(0, 5))
 
     def _create_labeled_frame(self, text):
         """Cria um LabelFrame com estilo padrão."""
@@ -165,10 +178,28 @@ class PhotoProcessorApp:
 
     def _setup_step3(self, parent_frame):
         """Configura os widgets para o Passo 3 (Iniciar Processamento)."""
-        self.btn_process = tk.Button(parent_frame, text="APLICAR MARCA D'ÁGUA AGORA", command=self._start_processing_thread,
+        frame_content = tk.Frame(parent_frame, bg=COLOR_FRAME)
+        frame_content.pack(pady=10)
+
+        tk.Label(frame_content, text="Processos:", bg=COLOR_FRAME, fg=COLOR_TEXT, font=FONT_LABEL).pack(side="left", padx=(0, 5))
+        self.spin_workers = tk.Spinbox(frame_content, from_=1, to=max(1, os.cpu_count() or 1), width=4,
+                                       textvariable=self.worker_count, font=FONT_TEXT)
+        self.spin_workers.pack(side="left", padx=(0, 20))
+
+        tk.Label(frame_content, text="Perfil:", bg=COLOR_FRAME, fg=COLOR_TEXT, font=FONT_LABEL).pack(side="left", padx=(0, 5))
+        self.combo_profile = ttk.Combobox(frame_content, textvariable=self.encoder_profile, values=list(ENCODER_PROFILES),
+                                          state="readonly", width=8, font=FONT_TEXT)
+        self.combo_profile.pack(side="left", padx=(0, 20))
+
+        self.chk_watch_folder = tk.Checkbutton(frame_content, text="Monitorar a pasta", variable=self.watch_folder,
+                                               bg=COLOR_FRAME, fg=COLOR_TEXT, selectcolor=COLOR_FRAME,
+                                               font=FONT_LABEL)
+        self.chk_watch_folder.pack(side="left", padx=(0, 20))
+
+        self.btn_process = tk.Button(frame_content, text="APLICAR MARCA D'ÁGUA AGORA", command=self._start_processing_thread,
                                 bg=COLOR_BUTTON_PROCESS, fg=COLOR_TEXT, font=FONT_BUTTON,
                                 relief="raised", bd=2, highlightbackground=COLOR_BUTTON_PROCESS)
-        self.btn_process.pack(pady=10)
+        self.btn_process.pack(side="left")
 
     def _setup_step4(self, parent_frame):
         """Configura os widgets para o Passo 4 (Resultados Finais)."""
@@ -186,6 +217,11 @@ class PhotoProcessorApp:
                                             relief="raised", bd=2, highlightbackground=COLOR_BUTTON_DEMO_VIDEO,
                                             state="disabled") # Desabilitado até o processamento
         self.btn_generate_demo_video.pack(side="left", padx=10)
+
+        self.btn_preview = tk.Button(btn_frame, text="VER FOTOS", command=self._open_preview,
+                                     bg=COLOR_BUTTON_PREVIEW, fg=COLOR_TEXT, font=FONT_BUTTON,
+                                     relief="raised", bd=2, highlightbackground=COLOR_BUTTON_PREVIEW)
+        self.btn_preview.pack(side="left", padx=10)
         
 
     def _browse_photos_folder(self):
@@ -207,15 +243,55 @@ class PhotoProcessorApp:
             self.watermark_image_path.set("")
 
     def _count_images_in_folder(self, folder_path):
-        """Conta o número de imagens suportadas na pasta."""
-        count = 0
-        supported_formats = (".jpg", ".jpeg", ".png", ".bmp", ".tiff")
-        for root, _, files in os.walk(folder_path):
-            for file in files:
-                if file.lower().endswith(supported_formats):
-                    count += 1
-        self.image_count.set(f"{count} imagens encontradas")
-        self.total_to_process.set(count) # Define o total para a barra de progresso
+        """Conta as imagens suportadas da pasta em segundo plano (uma pasta grande ou de rede não trava a janela)."""
+        self.last_scan = None
+        self.image_count.set("Contando imagens...")
+        # Outra pasta ou o processamento só depois da contagem: o processamento reaproveita esta varredura
+        self.btn_browse.config(state="disabled")
+        self.btn_process.config(state="disabled")
+
+        # Fila própria da contagem: a de progresso pode estar em uso pelo vídeo demonstrativo
+        events = queue.Queue()
+        scan_thread = threading.Thread(target=self._scan_folder, args=(ImageScan(folder_path), events), daemon=True)
+        scan_thread.start()
+        self.master.after(PROGRESS_POLL_MS, self._poll_count, events)
+
+    def _scan_folder(self, scan, events):
+        """Varre a pasta (thread de trabalho; fala com a interface só pela fila)."""
+        try:
+            scan.run(on_found=lambda found: events.put(("scan", found)))
+            events.put(("counted", scan))
+        except Exception as e:
+            print(f"Erro ao contar as imagens: {e}")
+            events.put(("failed", e))
+
+    def _poll_count(self, events):
+        """Mostra a contagem parcial e, no fim, guarda a varredura e libera os botões."""
+        finished = None
+        while True:
+            try:
+                kind, payload = events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "scan":
+                self.image_count.set(f"{payload} imagens encontradas...")
+            else:
+                finished = (kind, payload)
+        if finished is None:
+            self.master.after(PROGRESS_POLL_MS, self._poll_count, events)
+            return
+
+        kind, payload = finished
+        if kind == "counted":
+            self.last_scan = payload
+            count = len(payload.files)
+            self.image_count.set(f"{count} imagens encontradas")
+            self.total_to_process.set(count) # Define o total para a barra de progresso
+        else:
+            self.image_count.set("Não foi possível contar as imagens")
+        self.btn_browse.config(state="normal")
+        if self.video_cancel is None: # Com o vídeo em andamento, processar continua bloqueado até ele terminar
+            self.btn_process.config(state="normal")
 
     def _alter_output_folder(self):
         """Abre uma caixa de diálogo para selecionar a pasta de destino."""
@@ -249,6 +325,9 @@ class PhotoProcessorApp:
         self.btn_browse.config(state="disabled")
         self.btn_browse_watermark.config(state="disabled")
         self.chk_apply_watermark.config(state="disabled") 
+        self.spin_workers.config(state="disabled")
+        self.combo_profile.config(state="disabled")
+        self.chk_watch_folder.config(state="disabled")
         self.btn_alter_output.config(state="disabled")
         self.btn_download.config(state="disabled")
         self.btn_generate_demo_video.config(state="disabled")
@@ -258,315 +337,123 @@ class PhotoProcessorApp:
         self.progressbar.config(mode="indeterminate")
         self.progressbar.start()
         self.processed_count.set(0) # Zera contador de processados
+        self.skipped_count.set(0)
         self.first_processed_image_path = None # Reseta o caminho da primeira imagem processada
 
-        # Inicia a thread de processamento
-        process_thread = threading.Thread(target=self._process_photos)
+        # Lê as configurações aqui, na thread da interface: a thread de trabalho não acessa variáveis Tk
+        try:
+            workers = max(1, int(self.worker_count.get()))
+        except (tk.TclError, ValueError):
+            workers = DEFAULT_WORKERS
+        run_kwargs = dict(input_dir=input_path, output_dir=output_path,
+                          watermark_path=watermark_path,
+                          apply_watermark=self.apply_watermark.get(),
+                          workers=workers,
+                          encoder_profile=self.encoder_profile.get(),
+                          scan=self.last_scan)
+        self.watcher = None
+        if self.watch_folder.get():
+            from folder_watch import FolderWatcher
+
+            self.watcher = FolderWatcher(input_path)
+            run_kwargs["watcher"] = self.watcher
+            # O botão de processar vira o de encerrar o monitoramento
+            self.btn_process.config(state="normal", text="ENCERRAR MONITORAMENTO", command=self._stop_watching)
+
+        self.progress_events = queue.Queue()
+        self.progress_tracker = ProgressTracker()
+        self.stage_timings.set("")
+
+        # Inicia a thread de processamento e o temporizador que atualiza a interface
+        process_thread = threading.Thread(target=self._process_photos, args=(run_kwargs,), daemon=True)
         process_thread.start()
+        self.master.after(PROGRESS_POLL_MS, self._poll_progress)
 
-    def _process_photos(self):
-        """Lógica principal de processamento das fotos (redimensionamento e aplicação de marca d'água)."""
-        input_dir = Path(self.input_folder.get())
-        output_base_dir = Path(self.output_folder.get())
-        watermark_path = self.watermark_image_path.get()
-        
-        # Define a pasta base "FT TRATADAS 2025" dentro da pasta de destino
-        processed_base_dir = output_base_dir / "FT TRATADAS 2025"
-        processed_base_dir.mkdir(parents=True, exist_ok=True) # Garante que a pasta base exista
-
-        image_files = []
-        supported_formats = (".jpg", ".jpeg", ".png", ".bmp", ".tiff")
-        for root, _, files in os.walk(input_dir):
-            for file in files:
-                if file.lower().endswith(supported_formats):
-                    image_files.append(Path(root) / file)
-        
-        self.total_to_process.set(len(image_files))
-        
-        lot_number = 1
-        current_lot_count = 0
-        current_lot_dir = processed_base_dir / f"Lote_{lot_number:03d}"
-        current_lot_dir.mkdir(exist_ok=True)
-
-        for i, image_path in enumerate(image_files):
-            if current_lot_count >= IMAGES_PER_LOT:
-                lot_number += 1
-                current_lot_count = 0
-                current_lot_dir = processed_base_dir / f"Lote_{lot_number:03d}"
-                current_lot_dir.mkdir(exist_ok=True)
-
-            self.processing_status.set(f"Processando {i + 1}/{len(image_files)}: {image_path.name}")
-            self.progressbar.config(mode="determinate", maximum=len(image_files), value=i)
-            self.master.update_idletasks() # Atualiza a UI imediatamente
+    def _stop_watching(self):
+        """Encerra o modo contínuo: as fotos em andamento são concluídas e o resumo aparece como de costume."""
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.btn_process.config(state="disabled")
+            self.processing_status.set("Encerrando o monitoramento...")
 
-            try:
-                # 1. Carregamento da imagem
-                img = Image.open(image_path).convert("RGB")
-                original_width, original_height = img.size
-                
-                # 2. Redimensionamento e Corte para preencher Full HD
-                # Calcula os fatores de escala para largura e altura
-                scale_width = TARGET_RESOLUTION[0] / original_width
-                scale_height = TARGET_RESOLUTION[1] / original_height
-                
-                # Escolhe o maior fator de escala para que a imagem COBRIR a resolução alvo
-                scale_factor = max(scale_width, scale_height)
-                
-                # Calcula as novas dimensões da imagem após o escalonamento
-                img_scaled_width = int(original_width * scale_factor)
-                img_scaled_height = int(original_height * scale_factor)
-                
-                # Redimensiona a imagem para as dimensões escaladas (usando LANCZOS para alta qualidade)
-                img_resized = img.resize((img_scaled_width, img_scaled_height), Image.LANCZOS)
-                
-                # Calcula as coordenadas para cortar a imagem no centro para o tamanho alvo
-                left = (img_scaled_width - TARGET_RESOLUTION[0]) / 2
-                top = (img_scaled_height - TARGET_RESOLUTION[1]) / 2
-                right = (img_scaled_width + TARGET_RESOLUTION[0]) / 2
-                bottom = (img_scaled_height + TARGET_RESOLUTION[1]) / 2
-                
-                # Realiza o corte
-                processed_img_pil = img_resized.crop((left, top, right, bottom))
-
-                # 3. Extração de Metadados
-                metadata = self._extract_metadata(image_path)
-
-                # 4. Aplicação de Marca d'água (AGORA OPCIONAL E COM IMAGEM PNG)
-                if self.apply_watermark.get() and watermark_path:
-                    processed_img_pil = self._apply_image_watermark(processed_img_pil, watermark_path)
-
-                # 5. Organização de Arquivos e Nomenclatura
-                base_name = image_path.stem # Nome do arquivo original sem extensão
-                processed_name_prefix = f"{i + 1:03d}-{current_lot_count + 1:02d}"
-
-                # --- SANITIZAÇÃO DA STRING DE LOCALIZAÇÃO PARA O NOME DO ARQUIVO ---
-                location_for_filename = metadata["exif_data"]["location"]["city"]
-                if location_for_filename == "N/A":
-                    location_str = "SemLocal" # Substitui "N/A" por "SemLocal" no nome do arquivo para evitar '\'
-                else:
-                    # Remove caracteres inválidos do nome do arquivo (ex: \ / : * ? " < > |)
-                    # e substitui por um traço ou remove.
-                    # Adiciona espaços e hífens como caracteres permitidos, além de alfanuméricos
-                    location_str = ''.join(c if c.isalnum() or c in [' ', '-'] else '_' for c in location_for_filename)
-                    location_str = location_str.strip() # Remove espaços extras no início/fim
-                    if not location_str: # Se ficar vazio depois da sanitização, usa "SemLocal"
-                        location_str = "SemLocal"
-                # --- FIM DA SANITIZAÇÃO ---
-
-                # --- TRATAMENTO ROBUSTO DE DATA PARA O NOME DO ARQUIVO ---
-                date_str = "SemData" # Fallback padrão
-                exif_datetime_str = metadata["exif_data"]["datetime"]
-                
-                if exif_datetime_str != "N/A":
-                    try:
-                        # Tenta converter a data EXIF (já em ISO format)
-                        date_obj = datetime.fromisoformat(exif_datetime_str)
-                        date_str = date_obj.strftime("%d%m%Y")
-                    except ValueError as e:
-                        print(f"Aviso: Formato de data EXIF inesperado para {image_path.name} ({exif_datetime_str}): {e}. Tentando data de modificação do arquivo.")
-                        # Se falhar, tenta usar a data de modificação
-                        try:
-                            modification_timestamp = image_path.stat().st_mtime
-                            date_obj = datetime.fromtimestamp(modification_timestamp)
-                            date_str = date_obj.strftime("%d%m%Y")
-                        except Exception as date_error:
-                            print(f"Aviso: Não foi possível obter a data de modificação do arquivo {image_path.name}: {date_error}")
-                            # Se tudo falhar, mantém "SemData"
-                else:
-                    # Se a data EXIF já era N/A, tenta direto a data de modificação do arquivo
-                    try:
-                        modification_timestamp = image_path.stat().st_mtime
-                        date_obj = datetime.fromtimestamp(modification_timestamp)
-                        date_str = date_obj.strftime("%d%m%Y")
-                    except Exception as date_error:
-                        print(f"Aviso: Não foi possível obter a data de modificação do arquivo {image_path.name}: {date_error}")
-                        # Se tudo falhar, mantém "SemData"
-                # --- FIM DO TRATAMENTO DE DATA ---
-                
-                final_filename_stem = f"{processed_name_prefix} - {location_str} - {date_str} - {base_name}"
-                
-                # Salva a imagem processada
-                processed_image_path = current_lot_dir / f"{final_filename_stem}.jpg"
-                processed_img_pil.save(processed_image_path, "JPEG", quality=95, optimize=True)
-
-                # Armazena o caminho da primeira imagem processada para o vídeo demonstrativo
-                if self.first_processed_image_path is None:
-                    self.first_processed_image_path = processed_image_path
-
-                # Salva os metadados
-                metadata_path = current_lot_dir / f"{final_filename_stem}_metadata.json"
-                with open(metadata_path, 'w', encoding='utf-8') as f:
-                    json.dump(metadata, f, indent=4, ensure_ascii=False)
-                
-                current_lot_count += 1
-
-            except Exception as e:
-                self.processing_status.set(f"Erro ao processar {image_path.name}: {e}")
-                print(f"Erro ao processar {image_path.name}: {e}") # Loga o erro no console
-                continue # Continua para a próxima foto mesmo com erro
-
-            self.processed_count.set(self.processed_count.get() + 1)
-
-        self._processing_complete()
-
-    def _apply_image_watermark(self, base_image_pil, watermark_image_path):
-        """
-        Aplica uma imagem PNG como marca d'água na imagem base.
-        A marca d'água será redimensionada para 20% da largura da imagem base
-        e posicionada no canto inferior direito.
-        """
+    def _process_photos(self, run_kwargs):
+        """Executa o pipeline de photo_processor_core (thread de trabalho; fala com a interface só pela fila)."""
         try:
-            watermark = Image.open(watermark_image_path)
-            
-            # Redimensiona a marca d'água para 20% da largura da imagem base, mantendo proporção
-            base_width, base_height = base_image_pil.size
-            watermark_width, watermark_height = watermark.size
-            
-            target_watermark_width = int(base_width * 0.20) # 20% da largura da imagem base
-            
-            # Calcula a nova altura mantendo a proporção
-            if watermark_width > 0: # Evita divisão por zero
-                watermark_ratio = watermark_height / watermark_width
-                target_watermark_height = int(target_watermark_width * watermark_ratio)
-            else:
-                target_watermark_height = watermark_height # Mantém a altura se a largura for zero, embora improvável
-
-            watermark = watermark.resize((target_watermark_width, target_watermark_height), Image.LANCZOS)
-
-            # Garante que a marca d'água tenha canal alfa para transparência
-            if watermark.mode != 'RGBA':
-                watermark = watermark.convert('RGBA')
-
-            # Posição: canto inferior direito com padding
-            padding = 20
-            x = base_width - watermark.width - padding
-            y = base_height - watermark.height - padding
-
-            # Cria uma imagem temporária para colar a marca d'água com transparência
-            temp_image = Image.new('RGBA', base_image_pil.size, (0, 0, 0, 0))
-            temp_image.paste(watermark, (x, y), watermark)
-            
-            # Combina a imagem base com a marca d'água
-            final_image = Image.alpha_composite(base_image_pil.convert('RGBA'), temp_image)
-            return final_image.convert('RGB') # Converte de volta para RGB para salvar como JPG
-
+            summary = run_batch(**run_kwargs, on_scan=self._on_images_found, on_estimate=self._on_estimate,
+                                on_progress=self._on_photo_processed)
+            self.progress_events.put(("done", summary))
         except Exception as e:
-            print(f"Erro ao aplicar marca d'água de imagem: {e}")
-            messagebox.showwarning("Erro na Marca d'Água", f"Não foi possível aplicar a marca d'água da imagem. Verifique o arquivo PNG.\nErro: {e}")
-            return base_image_pil # Retorna a imagem original se houver erro
-
-    def _extract_metadata(self, image_path):
-        """Extrai metadados EXIF, GPS e faz geocoding."""
-        metadata = {
-            "original_file": str(image_path),
-            "processed_date": datetime.now().isoformat(),
-            "exif_data": {
-                "datetime": "N/A", # Inicializa como N/A
-                "location": {
-                    "city": "N/A",
-                    "state": "N/A",
-                    "country": "N/A",
-                    "postcode": "N/A",
-                    "coordinates": []
-                },
-                "camera_info": "N/A"
-            }
-        }
-
-        try:
-            with Image.open(image_path) as img:
-                exif_data = img._getexif()
-                if exif_data:
-                    exif = {
-                        ExifTags.TAGS[k]: v
-                        for k, v in exif_data.items()
-                        if k in ExifTags.TAGS
-                    }
-
-                    # Tenta extrair e formatar a data EXIF para ISO format
-                    date_found = False
-                    if "DateTimeOriginal" in exif:
-                        try:
-                            metadata["exif_data"]["datetime"] = datetime.strptime(exif["DateTimeOriginal"], "%Y:%m:%d %H:%M:%S").isoformat()
-                            date_found = True
-                        except ValueError:
-                            pass
-                    
-                    if not date_found and "DateTime" in exif:
-                        try:
-                            metadata["exif_data"]["datetime"] = datetime.strptime(exif["DateTime"], "%Y:%m:%d %H:%M:%S").isoformat()
-                            date_found = True
-                        except ValueError:
-                            pass
-
-                    # Informações da Câmera
-                    if "Make" in exif and "Model" in exif:
-                        metadata["exif_data"]["camera_info"] = f"{exif['Make']} {exif['Model']}"
-                    elif "Model" in exif:
-                        metadata["exif_data"]["camera_info"] = exif["Model"]
-
-                    # GPS
-                    if "GPSInfo" in exif:
-                        gps_info = exif["GPSInfo"]
-                        lat = self._get_gps_coordinate(gps_info, "GPSLatitude")
-                        lon = self._get_gps_coordinate(gps_info, "GPSLongitude")
-                        lat_ref = gps_info.get(1, 'N')
-                        lon_ref = gps_info.get(3, 'E')
-
-                        if lat and lon:
-                            decimal_lat = self._to_degrees(lat)
-                            decimal_lon = self._to_degrees(lon)
-
-                            if lat_ref != 'N':
-                                decimal_lat = -decimal_lat
-                            if lon_ref != 'E':
-                                decimal_lon = -decimal_lon
-                                
-                            metadata["exif_data"]["location"]["coordinates"] = [decimal_lat, decimal_lon]
-
-                            # Geocoding reverso
-                            try:
-                                time.sleep(1) # Rate limiting para API Nominatim
-                                location = self.geolocator.reverse((decimal_lat, decimal_lon), language="pt-BR")
-                                if location and location.address:
-                                    address_details = location.raw.get('address', {})
-                                    metadata["exif_data"]["location"]["city"] = address_details.get("city", address_details.get("town", address_details.get("village", "N/A")))
-                                    metadata["exif_data"]["location"]["state"] = address_details.get("state", "N/A")
-                                    metadata["exif_data"]["location"]["country"] = address_details.get("country", "N/A")
-                                    metadata["exif_data"]["location"]["postcode"] = address_details.get("postcode", "N/A")
-
-                                    # Detecção de Manaus
-                                    if metadata["exif_data"]["location"]["city"] and "manaus" in metadata["exif_data"]["location"]["city"].lower():
-                                        metadata["exif_data"]["location"]["city"] = "Manaus" # Padroniza para "Manaus"
-                            except (GeocoderTimedOut, GeocoderServiceError) as geocoding_err:
-                                print(f"Erro no geocoding para {image_path.name}: {geocoding_err}")
-                                metadata["exif_data"]["location"]["city"] = "SemLocal" # Define como 'SemLocal' em caso de erro
+            print(f"Erro inesperado no processamento: {e}")
+            self.progress_events.put(("failed", e))
+
+    def _on_images_found(self, found):
+        """Contagem parcial da varredura (thread de trabalho): apenas enfileira o evento."""
+        self.progress_events.put(("scan", found))
+
+    def _on_estimate(self, estimate):
+        """Previsão de duração pelo índice EXIF (thread de trabalho): apenas enfileira o evento."""
+        self.progress_events.put(("estimate", estimate))
+
+    def _on_photo_processed(self, completed, total, result):
+        """Foto concluída (thread de trabalho): apenas enfileira o evento."""
+        self.progress_events.put(("photo", (completed, total, result)))
+
+    def _poll_progress(self):
+        """Consome os eventos pendentes e atualiza a interface de uma vez (no máximo 10x por segundo)."""
+        tracker = self.progress_tracker
+        finished = None
+        while True:
+            try:
+                kind, payload = self.progress_events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "scan":
+                tracker.scanned(payload)
+                self.image_count.set(f"{payload} imagens encontradas")
+            elif kind == "estimate":
+                minutes = max(1, round(payload.seconds / 60))
+                self.processing_status.set(f"{payload.photos} fotos a processar · estimativa: ~{minutes} min")
+            elif kind == "photo":
+                tracker.update(*payload)
+            else:
+                finished = (kind, payload)
+
+        if tracker.completed:
+            total = max(tracker.total, tracker.found)
+            self.total_to_process.set(total)
+            self.processed_count.set(tracker.completed - len(tracker.errors))
+            self.processing_status.set(f"{tracker.status_line()} · {tracker.last_name}")
+            self.stage_timings.set(tracker.stage_line())
+            self.progressbar.stop()
+            self.progressbar.config(mode="determinate", maximum=max(total, 1), value=tracker.completed)
+
+        if finished is None:
+            self.master.after(PROGRESS_POLL_MS, self._poll_progress)
+        else:
+            self._processing_complete(*finished)
 
-        except Exception as e:
-            print(f"Erro geral ao extrair metadados ou abrir {image_path.name}: {e}")
-
-        return metadata
-
-    def _get_gps_coordinate(self, gps_info, key):
-        """Ajuda a extrair coordenadas GPS de um dicionário EXIF."""
-        if key in ExifTags.GPSTAGS:
-            tag = ExifTags.GPSTAGS[key]
-            if tag in gps_info:
-                return gps_info[tag]
-        return None
-
-    def _to_degrees(self, value):
-        """Converte as coordenadas GPS (DMS) para graus decimais."""
-        d = float(value[0])
-        m = float(value[1])
-        s = float(value[2])
-        return d + (m / 60.0) + (s / 3600.0)
-
-    def _processing_complete(self):
-        """Chamado quando o processamento é concluído."""
+    def _processing_complete(self, kind, payload):
+        """Chamado (na thread da interface) quando o processamento termina ou falha."""
         self.progressbar.stop()
         self.progressbar.config(mode="determinate", value=self.total_to_process.get())
-        self.processing_status.set(f"Processamento Concluído! {self.processed_count.get()} fotos processadas.")
+
+        error_report_path = None
+        if kind == "done":
+            summary = payload
+            # Armazena o caminho da primeira imagem processada para o vídeo demonstrativo
+            self.first_processed_image_path = summary.first_output
+            self.skipped_count.set(summary.skipped)
+            self.processed_count.set(summary.processed)
+            error_report_path = self.progress_tracker.write_error_report(summary.processed_base_dir)
+
+            status = f"Processamento Concluído! {self.processed_count.get()} fotos processadas."
+            if self.skipped_count.get():
+                status += f" {self.skipped_count.get()} já estavam prontas."
+            if summary.errors:
+                status += f" {len(summary.errors)} com erro."
+            self.processing_status.set(status)
+        else:
+            self.processing_status.set(f"Processamento interrompido: {payload}")
         
         # Habilita o botão de download e o de vídeo demonstrativo
         self.btn_download.config(state="normal")
@@ -574,14 +461,25 @@ class PhotoProcessorApp:
             self.btn_generate_demo_video.config(state="normal")
         
         # Habilita novamente os botões de controle de UI
-        self.btn_process.config(state="normal")
+        self.watcher = None
+        self.btn_process.config(state="normal", text="APLICAR MARCA D'ÁGUA AGORA", command=self._start_processing_thread)
         self.btn_browse.config(state="normal")
         self.btn_browse_watermark.config(state="normal")
         self.chk_apply_watermark.config(state="normal") 
+        self.spin_workers.config(state="normal")
+        self.combo_profile.config(state="readonly")
+        self.chk_watch_folder.config(state="normal")
         self.btn_alter_output.config(state="normal")
 
-        # Exibe o popup de confirmação
-        messagebox.showinfo("Sucesso!", "Todas as fotos foram processadas e organizadas com sucesso!")
+        # Exibe o popup de confirmação (um único aviso no fim, com o relatório de erros se houver)
+        if kind != "done":
+            messagebox.showerror("Erro", f"O processamento foi interrompido por um erro inesperado:\n{payload}")
+        elif error_report_path is not None:
+            messagebox.showwarning("Concluído com erros",
+                                   f"{len(self.progress_tracker.errors)} fotos não puderam ser processadas.\n"
+                                   f"Veja o relatório em:\n{error_report_path}")
+        else:
+            messagebox.showinfo("Sucesso!", "Todas as fotos foram processadas e organizadas com sucesso!")
 
     def _open_output_folder(self):
         """Abre a pasta de destino no explorador de arquivos do sistema."""
@@ -600,49 +498,119 @@ class PhotoProcessorApp:
         else:
             messagebox.showwarning("Aviso", "A pasta de destino não existe.")
 
+    def _open_preview(self):
+        """Abre a grade de miniaturas: as fotos de origem e as tratadas da pasta de destino."""
+        from preview_grid import PreviewWindow # Só na primeira pré-visualização, não na partida
+        from renditions import DEFAULT_RENDITIONS
+        from slideshow import slideshow_images
+
+        if self.preview_window is not None and self.preview_window.window.winfo_exists():
+            self.preview_window.close() # Reabre com as listas atuais
+
+        input_path = self.input_folder.get()
+        source_dir = None
+        if self.last_scan is not None and self.last_scan.is_current(input_path):
+            source_paths = self.last_scan.files
+        elif input_path and os.path.isdir(input_path):
+            source_paths, source_dir = None, input_path # A janela varre em segundo plano e preenche a grade
+        else:
+            source_paths = []
+        # As tratadas são as da versão da primeira foto processada (a principal, antes de processar)
+        rendition_name = (self.first_processed_image_path.parent.name if self.first_processed_image_path
+                          else DEFAULT_RENDITIONS[0].name)
+        output_paths = slideshow_images(Path(self.output_folder.get()) / PROCESSED_DIR_NAME, rendition_name)
+        if not source_paths and source_dir is None and not output_paths:
+            messagebox.showwarning("Aviso", "Nenhuma foto para mostrar. Selecione a pasta das fotos primeiro.")
+            return
+        self.preview_window = PreviewWindow(self.master, source_paths, output_paths, source_dir)
+
     def _generate_demo_video(self):
-        """Gera um vídeo demonstrativo da aplicação da marca d'água."""
+        """Gera em segundo plano o vídeo demonstrativo: as fotos da execução em sequência, com transições."""
         if not self.first_processed_image_path or not self.first_processed_image_path.exists():
             messagebox.showwarning("Aviso", "Nenhuma imagem processada disponível para gerar o vídeo demonstrativo. Por favor, processe algumas fotos primeiro.")
             return
-        
-        output_dir = self.output_folder.get()
-        demo_video_path = Path(output_dir) / "FT TRATADAS 2025" / "video_demonstrativo_marca_dagua.mp4"
 
-        try:
-            # Carrega a primeira imagem processada
-            img_pil = Image.open(self.first_processed_image_path)
-            
-            width, height = img_pil.size
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v') # Codec para MP4
-            out = cv2.VideoWriter(str(demo_video_path), fourcc, VIDEO_FPS, (width, height))
+        from slideshow import SLIDESHOW_NAME, slideshow_images # Só no primeiro vídeo, não na partida
+
+        # Todas as fotos da execução, da mesma versão (pasta dentro do lote) da primeira foto processada
+        processed_base_dir = self.first_processed_image_path.parent.parent.parent
+        image_paths = slideshow_images(processed_base_dir, self.first_processed_image_path.parent.name)
+        demo_video_path = processed_base_dir / SLIDESHOW_NAME
 
-            if not out.isOpened():
-                messagebox.showerror("Erro de Vídeo", "Não foi possível criar o arquivo de vídeo. Verifique as permissões ou o codec.")
-                return
+        # O botão do vídeo vira o de cancelar; processar fica bloqueado até o vídeo terminar
+        self.video_cancel = threading.Event()
+        self.btn_generate_demo_video.config(text="CANCELAR VÍDEO", command=self._cancel_demo_video)
+        self.btn_process.config(state="disabled")
+        self.processing_status.set(f"Gerando o vídeo demonstrativo ({len(image_paths)} fotos)...")
+        self.progressbar.config(mode="determinate", maximum=max(len(image_paths), 1), value=0)
 
-            # Converte a imagem PIL para formato OpenCV (BGR)
-            opencv_image = np.array(img_pil) 
-            opencv_image = cv2.cvtColor(opencv_image, cv2.COLOR_RGB2BGR)
+        self.progress_events = queue.Queue()
+        video_thread = threading.Thread(target=self._render_demo_video,
+                                        args=(image_paths, demo_video_path, self.video_cancel), daemon=True)
+        video_thread.start()
+        self.master.after(PROGRESS_POLL_MS, self._poll_video_progress)
 
-            # Adiciona frames estáticos da imagem processada
-            num_frames = DEMO_VIDEO_DURATION_SECONDS * VIDEO_FPS
-            for _ in range(num_frames):
-                out.write(opencv_image)
+    def _cancel_demo_video(self):
+        if self.video_cancel is not None:
+            self.video_cancel.set()
+            self.btn_generate_demo_video.config(state="disabled")
+            self.processing_status.set("Cancelando o vídeo demonstrativo...")
 
-            out.release()
-            messagebox.showinfo("Vídeo Gerado", f"Vídeo demonstrativo salvo em:\n{demo_video_path}")
+    def _render_demo_video(self, image_paths, demo_video_path, cancel):
+        """Monta o vídeo (thread de trabalho; fala com a interface só pela fila)."""
+        from slideshow import render_slideshow
 
+        try:
+            result = render_slideshow(image_paths, demo_video_path, cancel=cancel,
+                                      on_progress=lambda done, total: self.progress_events.put(("video", done)))
+            self.progress_events.put(("done", result))
         except Exception as e:
-            messagebox.showerror("Erro ao Gerar Vídeo", f"Ocorreu um erro ao gerar o vídeo demonstrativo:\n{e}")
             print(f"Erro ao gerar vídeo demonstrativo: {e}")
+            self.progress_events.put(("failed", e))
+
+    def _poll_video_progress(self):
+        """Atualiza a barra com as fotos já no vídeo e, no fim, restaura os botões e avisa o resultado."""
+        finished = None
+        while True:
+            try:
+                kind, payload = self.progress_events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "video":
+                self.progressbar.config(value=payload)
+                self.processing_status.set(f"Gerando o vídeo demonstrativo: {payload} de "
+                                           f"{int(self.progressbar.cget('maximum'))} fotos")
+            else:
+                finished = (kind, payload)
+        if finished is None:
+            self.master.after(PROGRESS_POLL_MS, self._poll_video_progress)
+            return
+
+        self.video_cancel = None
+        self.btn_generate_demo_video.config(state="normal", text="GERAR VÍDEO DEMONSTRATIVO",
+                                            command=self._generate_demo_video)
+        self.btn_process.config(state="normal")
+        kind, payload = finished
+        if kind != "done":
+            self.processing_status.set("Falha ao gerar o vídeo demonstrativo.")
+            messagebox.showerror("Erro ao Gerar Vídeo", f"Ocorreu um erro ao gerar o vídeo demonstrativo:\n{payload}")
+        elif payload.cancelled:
+            self.processing_status.set(f"Vídeo demonstrativo cancelado ({payload.images} fotos gravadas).")
+        else:
+            self.processing_status.set(f"Vídeo demonstrativo pronto: {payload.images} fotos em {payload.seconds:.0f}s.")
+            messagebox.showinfo("Vídeo Gerado", f"Vídeo demonstrativo salvo em:\n{payload.path}")
 
 
 # --- Execução da Aplicação ---
 if __name__ == "__main__":
     # Garante que a pasta padrão 'FT TRATADAS 2025' existe para evitar erros iniciais
-    Path(Path.home() / "FT TRATADAS 2025").mkdir(parents=True, exist_ok=True)
+    Path(Path.home() / PROCESSED_DIR_NAME).mkdir(parents=True, exist_ok=True)
+
+    if "--sonda-partida" in sys.argv: # startup_timing.STARTUP_PROBE_FLAG: desenha a janela uma vez e sai
+        from startup_timing import run_probe
 
-    root = tk.Tk()
-    app = PhotoProcessorApp(root)
-    root.mainloop()
+        run_probe(lambda: PhotoProcessorApp(tk.Tk()).master)
+    else:
+        root = tk.Tk()
+        app = PhotoProcessorApp(root)
+        root.mainloop()
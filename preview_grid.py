@@ -0,0 +1,251 @@
+"""
+Grade de pré-visualização da interface: as fotos de origem antes da execução
+e as já tratadas (com a marca d'água) depois dela, sem abrir o explorador de
+arquivos.
+
+A grade é virtual: a área de rolagem tem a altura de todas as linhas, mas só
+as linhas visíveis (mais uma de folga acima e abaixo) têm itens no Canvas e
+miniaturas na memória; as que saem da tela são descartadas. As miniaturas
+vêm do ThumbnailLoader (threads próprias e cache em disco, ver
+thumbnail_cache) e entram na grade por um temporizador da interface. Assim a
+rolagem por uma pasta de 10 mil fotos continua leve e a memória não cresce.
+"""
+import queue
+import threading
+import tkinter as tk
+from pathlib import Path
+
+from thumbnail_cache import DEFAULT_THUMBNAIL_SIZE, ThumbnailCache, ThumbnailLoader
+
+CELL_PADDING = 8
+LABEL_HEIGHT = 16
+SPARE_ROWS = 1 # Linhas carregadas além das visíveis, acima e abaixo
+RESULTS_POLL_MS = 50
+COLOR_GRID = "#2c3e50"
+COLOR_PLACEHOLDER = "#34495e"
+COLOR_LABEL = "#cccccc"
+
+
+class PreviewGrid(tk.Frame):
+    """Canvas rolável com uma miniatura por foto; set_paths troca a lista exibida."""
+
+    def __init__(self, master, loader, thumb_size=DEFAULT_THUMBNAIL_SIZE, **kwargs):
+        super().__init__(master, bg=COLOR_GRID, **kwargs)
+        self.loader = loader
+        self.thumb_size = thumb_size
+        self.cell_width = thumb_size + CELL_PADDING
+        self.cell_height = thumb_size + LABEL_HEIGHT + CELL_PADDING
+        self.paths = []
+        self.columns = 1
+        self.generation = 0 # Muda a cada lista nova: resultados de listas anteriores são ignorados
+        self.cells = {} # {índice: [ids dos itens do Canvas]} das células desenhadas
+        self.photos = {} # {índice: PhotoImage} das células visíveis (o Tk só mostra enquanto houver referência)
+        self._refresh_pending = False
+
+        self.canvas = tk.Canvas(self, bg=COLOR_GRID, highlightthickness=0, yscrollincrement=self.cell_height // 3)
+        scrollbar = tk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.canvas.configure(yscrollcommand=lambda first, last: (scrollbar.set(first, last), self._schedule_refresh()))
+        scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.canvas.bind("<Configure>", lambda event: self._relayout())
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.canvas.bind(sequence, self._on_wheel)
+        self._poll_id = self.after(RESULTS_POLL_MS, self._poll_results)
+
+    def destroy(self):
+        self.after_cancel(self._poll_id)
+        super().destroy()
+
+    def set_paths(self, paths):
+        self.paths = list(paths)
+        self.generation += 1
+        self.canvas.yview_moveto(0)
+        self._clear()
+        self._relayout()
+
+    def extend_paths(self, paths):
+        """Acrescenta fotos ao fim da lista exibida, sem voltar ao topo (varredura ainda em andamento)."""
+        self.paths.extend(paths)
+        self._relayout()
+
+    def _clear(self):
+        self.canvas.delete("all")
+        self.cells = {}
+        self.photos = {}
+
+    def _relayout(self):
+        width = max(self.canvas.winfo_width(), self.cell_width)
+        columns = max(1, width // self.cell_width)
+        if columns != self.columns:
+            self.columns = columns
+            self._clear() # As posições mudaram
+        rows = -(-len(self.paths) // self.columns)
+        self.canvas.configure(scrollregion=(0, 0, self.columns * self.cell_width, rows * self.cell_height))
+        self._schedule_refresh()
+
+    def _on_scrollbar(self, *args):
+        self.canvas.yview(*args)
+
+    def _on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.canvas.yview_scroll(-1, "units")
+        else:
+            self.canvas.yview_scroll(1, "units")
+
+    def _schedule_refresh(self):
+        """Agrupa os eventos de rolagem: a grade é refeita uma vez quando a interface fica ociosa."""
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.after_idle(self._refresh)
+
+    def _visible_range(self):
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first_row = max(0, int(top // self.cell_height) - SPARE_ROWS)
+        last_row = int(bottom // self.cell_height) + SPARE_ROWS
+        return first_row * self.columns, min(len(self.paths), (last_row + 1) * self.columns)
+
+    def _refresh(self):
+        """Desenha as células que entraram na tela, descarta as que saíram e pede as miniaturas que faltam."""
+        self._refresh_pending = False
+        if not self.winfo_exists():
+            return # Janela fechada com a atualização ainda na fila
+        start, end = self._visible_range()
+        for index in [index for index in self.cells if not start <= index < end]:
+            for item in self.cells.pop(index):
+                self.canvas.delete(item)
+            self.photos.pop(index, None)
+        for index in range(start, end):
+            if index not in self.cells:
+                self.cells[index] = self._draw_cell(index)
+        self.loader.want({(self.generation, index): self.paths[index]
+                          for index in range(start, end) if index not in self.photos})
+
+    def _cell_origin(self, index):
+        row, column = divmod(index, self.columns)
+        return column * self.cell_width + CELL_PADDING // 2, row * self.cell_height + CELL_PADDING // 2
+
+    def _draw_cell(self, index):
+        x, y = self._cell_origin(index)
+        size = self.thumb_size
+        return [self.canvas.create_rectangle(x, y, x + size, y + size, fill=COLOR_PLACEHOLDER, outline=""),
+                self.canvas.create_text(x + size // 2, y + size + LABEL_HEIGHT // 2, fill=COLOR_LABEL,
+                                        font=("Arial", 8), text=_short_name(self.paths[index], size))]
+
+    def _poll_results(self):
+        """Coloca na grade as miniaturas prontas (thread da interface: só ela cria PhotoImage)."""
+        from PIL import ImageTk
+
+        while True:
+            try:
+                (generation, index), path, result = self.loader.results.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self.generation or index not in self.cells:
+                continue # Lista trocada ou célula fora da tela
+            x, y = self._cell_origin(index)
+            size = self.thumb_size
+            if isinstance(result, Exception):
+                self.cells[index].append(self.canvas.create_text(x + size // 2, y + size // 2, fill=COLOR_LABEL,
+                                                                 font=("Arial", 8), text="ilegível"))
+                self.photos[index] = None
+                continue
+            photo = ImageTk.PhotoImage(result)
+            self.photos[index] = photo
+            self.cells[index].append(self.canvas.create_image(x + size // 2, y + size // 2, image=photo))
+        self._poll_id = self.after(RESULTS_POLL_MS, self._poll_results)
+
+
+def _short_name(path, width_px):
+    name = Path(path).name
+    limit = max(8, width_px // 6) # Caracteres que cabem na largura, com a fonte de 8 pontos
+    return name if len(name) <= limit else name[:limit - 1] + "…"
+
+
+class PreviewWindow:
+    """
+    Janela com a grade e a escolha entre as fotos de origem e as tratadas. Sem
+    source_paths, as fotos de origem vêm de uma varredura de source_dir em
+    segundo plano e entram na grade à medida que são encontradas.
+    """
+
+    def __init__(self, master, source_paths, output_paths, source_dir=None):
+        self.window = tk.Toplevel(master)
+        self.window.title("Pré-visualização")
+        self.window.geometry("900x640")
+        self.window.configure(bg=COLOR_GRID)
+        self.sources = list(source_paths) if source_paths is not None else []
+        self.outputs = list(output_paths)
+        self.loader = ThumbnailLoader(ThumbnailCache())
+        self.scan = None
+        self._scan_poll_id = None
+
+        scanning = source_paths is None and source_dir is not None
+        self.showing = tk.StringVar(value="outputs" if self.outputs or not scanning else "sources")
+        self.count = tk.StringVar()
+        bar = tk.Frame(self.window, bg=COLOR_GRID)
+        bar.pack(fill="x", padx=10, pady=5)
+        for value, text in (("sources", "Origem"), ("outputs", "Tratadas")):
+            tk.Radiobutton(bar, text=text, value=value, variable=self.showing, command=self._show,
+                           bg=COLOR_GRID, fg="#ffffff", selectcolor=COLOR_PLACEHOLDER,
+                           font=("Arial", 10, "bold")).pack(side="left", padx=(0, 10))
+        tk.Label(bar, textvariable=self.count, bg=COLOR_GRID, fg=COLOR_LABEL, font=("Arial", 10)).pack(side="left")
+
+        self.grid = PreviewGrid(self.window, self.loader)
+        self.grid.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self._show()
+        if scanning:
+            self._start_scan(source_dir)
+
+    def _show(self):
+        paths = self.outputs if self.showing.get() == "outputs" else self.sources
+        self.count.set(f"{len(paths)} fotos" + ("..." if paths is self.sources and self.scan is not None else ""))
+        self.grid.set_paths(paths)
+
+    def _start_scan(self, source_dir):
+        from image_scan import ImageScan
+
+        self.scan = ImageScan(source_dir)
+        events = queue.Queue()
+        # O ImageScan só acrescenta em scan.files: a interface lê o trecho novo a cada contagem recebida
+        scan_thread = threading.Thread(target=self._run_scan, args=(self.scan, events), daemon=True)
+        scan_thread.start()
+        self._scan_poll_id = self.window.after(RESULTS_POLL_MS, self._poll_scan, events)
+
+    def _run_scan(self, scan, events):
+        """Varre a pasta de origem (thread de trabalho; fala com a interface só pela fila)."""
+        try:
+            scan.run(on_found=events.put)
+        except OSError as e:
+            print(f"Erro ao varrer {scan.input_dir}: {e}")
+        events.put(None) # Fim da varredura
+
+    def _poll_scan(self, events):
+        done = False
+        found = len(self.sources)
+        while True:
+            try:
+                event = events.get_nowait()
+            except queue.Empty:
+                break
+            if event is None:
+                done = True
+            else:
+                found = event
+        new = self.scan.files[len(self.sources):found]
+        self.sources.extend(new)
+        if done:
+            self.scan = None
+        if self.showing.get() == "sources":
+            if new:
+                self.grid.extend_paths(new)
+            self.count.set(f"{len(self.sources)} fotos" + ("" if done else "..."))
+        self._scan_poll_id = None if done else self.window.after(RESULTS_POLL_MS, self._poll_scan, events)
+
+    def close(self):
+        if self._scan_poll_id is not None:
+            self.window.after_cancel(self._scan_poll_id)
+        self.loader.close()
+        self.loader.cache.close()
+        self.window.destroy()
@@ -0,0 +1,139 @@
+"""
+Manifesto de processamento para execuções incrementais e retomáveis.
+
+Fica dentro da pasta "FT TRATADAS 2025" como um arquivo JSON Lines, com um
+registro por evento (planejada, concluída, erro). Para cada foto de origem vale
+o último registro. Como as linhas são apenas acrescentadas, uma execução
+interrompida perde no máximo a foto que estava sendo gravada.
+
+No processamento distribuído (shard_ledger.py), cada nó grava o próprio
+arquivo (.manifest.<nó>.jsonl): acréscimos simultâneos de várias máquinas no
+mesmo arquivo não são seguros em NFS/SMB. A leitura junta todos os arquivos, e
+a próxima execução em uma máquina só os incorpora ao manifesto principal. Um
+nó que assume o lote de outro que caiu relê os registros desse lote (refresh)
+para não refazer as fotos que o outro já tinha concluído.
+"""
+from pathlib import Path
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = ".manifest.jsonl"
+NODE_MANIFEST_PATTERN = ".manifest.*.jsonl"
+
+
+def source_signature(path, verify_content=False):
+    """Identidade do arquivo de origem: tamanho, mtime e, opcionalmente, hash SHA-256 do conteúdo."""
+    stat = os.stat(path)
+    signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if verify_content:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        signature["sha256"] = digest.hexdigest()
+    return signature
+
+
+def _node_paths(base_dir):
+    """Arquivos dos nós do processamento distribuído, do mais antigo para o mais recente."""
+    return sorted(Path(base_dir).glob(NODE_MANIFEST_PATTERN), key=lambda path: path.stat().st_mtime_ns)
+
+
+class ProcessingManifest:
+    """
+    Estado por foto de origem (chave: caminho relativo à pasta de entrada).
+    Com node, os registros desta execução vão para o arquivo do nó.
+    """
+
+    def __init__(self, processed_base_dir, node=None):
+        base_dir = Path(processed_base_dir)
+        self.path = base_dir / MANIFEST_NAME
+        self.entries = {}
+        line_count = self._load(self.path)
+        node_paths = _node_paths(base_dir)
+        for node_path in node_paths:
+            line_count += self._load(node_path)
+        if node is None and (node_paths or line_count > 2 * len(self.entries)):
+            self._compact() # Também incorpora os arquivos dos nós de uma execução distribuída
+            for node_path in node_paths:
+                node_path.unlink()
+        if node is not None:
+            self.path = base_dir / NODE_MANIFEST_PATTERN.replace("*", node)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _load(self, path, only=None):
+        """Lê um arquivo do manifesto (só as fotos de only, se informado); retorna quantos registros tinha."""
+        if not path.exists():
+            return 0
+        line_count = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue # Última linha truncada por uma queda: ignora
+                if only is not None and record["source"] not in only:
+                    continue
+                previous = self.entries.get(record["source"])
+                if (record.get("status") == "planned" and previous is not None
+                        and previous.get("status") != "planned" and previous.get("index") == record.get("index")):
+                    continue # O plano de um nó não desfaz o que outro nó já concluiu
+                self.entries[record["source"]] = record
+                line_count += 1
+        return line_count
+
+    def _compact(self):
+        """Reescreve o manifesto apenas com o último registro de cada foto."""
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in self.entries.values():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def refresh(self, source_keys):
+        """
+        Relê, dos arquivos dos outros nós, os registros de source_keys gravados
+        depois que este manifesto foi carregado (ex: as fotos que um nó concluiu
+        antes de cair). Os registros deste nó continuam os da memória.
+        """
+        only = set(source_keys)
+        for node_path in _node_paths(self.path.parent):
+            if node_path != self.path:
+                self._load(node_path, only)
+
+    def get(self, source_key):
+        return self.entries.get(source_key)
+
+    def next_index(self):
+        """Próximo índice global livre (índices já atribuídos nunca são reutilizados)."""
+        return max((record["index"] for record in self.entries.values()), default=0) + 1
+
+    def is_done(self, source_key, signature, fingerprint):
+        """True se a foto já foi concluída com a mesma origem e as mesmas configurações."""
+        record = self.entries.get(source_key)
+        if (record is None or record.get("status") != "done" or record.get("signature") != signature
+                or record.get("fingerprint") != fingerprint or not record.get("output_path")):
+            return False
+        # Todas as versões precisam existir (registros antigos têm só output_path)
+        outputs = record.get("outputs") or [record]
+        return all(os.path.exists(output["output_path"]) for output in outputs)
+
+    def record(self, source_key, flush=True, **fields):
+        """Acrescenta um registro para a foto (mescla com o anterior); flush=False adia a gravação em disco."""
+        record = dict(self.entries.get(source_key, {}))
+        record.update(fields, source=source_key)
+        self.entries[source_key] = record
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if flush:
+            self._file.flush()
+        return record
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
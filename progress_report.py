@@ -0,0 +1,83 @@
+"""
+Acompanhamento do progresso de uma execução: vazão, tempo restante estimado,
+tempo médio por estágio e erros por foto (para o relatório final).
+
+Não depende do Tkinter: a interface apenas lê os textos prontos.
+"""
+from pathlib import Path
+from datetime import datetime
+import time
+
+STAGE_LABELS = (("read", "Leitura"), ("render", "CPU"), ("write", "Gravação"))
+ERROR_REPORT_NAME = "relatorio_erros.txt"
+
+
+class ProgressTracker:
+    """Acumula os resultados de run_batch. Use sempre a partir de uma única thread."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.found = 0
+        self.completed = 0
+        self.total = 0
+        self.last_name = ""
+        self.errors = [] # [(arquivo de origem, mensagem)]
+        self.stage_seconds = {}
+        self.stage_counts = {}
+
+    def scanned(self, found):
+        self.found = found
+
+    def update(self, completed, total, result):
+        """Registra uma foto concluída (mesma assinatura de on_progress)."""
+        self.completed = completed
+        self.total = total
+        self.last_name = Path(result.job.source_path).name
+        if result.error is not None:
+            self.errors.append((result.job.source_path, result.error))
+        for stage, seconds in (result.timings or {}).items():
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+            self.stage_counts[stage] = self.stage_counts.get(stage, 0) + 1
+
+    def throughput(self):
+        """Fotos concluídas por segundo desde o início."""
+        elapsed = time.monotonic() - self.started
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    def eta_seconds(self):
+        """Tempo restante estimado, ou None enquanto não houver vazão medida."""
+        rate = self.throughput()
+        if rate <= 0:
+            return None
+        return max(0, max(self.total, self.found) - self.completed) / rate
+
+    def stage_means(self):
+        """Tempo médio (s) de cada estágio por foto."""
+        return {stage: self.stage_seconds[stage] / self.stage_counts[stage] for stage in self.stage_seconds}
+
+    def status_line(self):
+        total = max(self.total, self.found)
+        line = f"Processadas {self.completed}/{total} · {self.throughput():.1f} img/s"
+        eta = self.eta_seconds()
+        if eta is not None:
+            minutes, seconds = divmod(int(eta), 60)
+            line += f" · restante {minutes:02d}:{seconds:02d}"
+        if self.errors:
+            line += f" · {len(self.errors)} erros"
+        return line
+
+    def stage_line(self):
+        means = self.stage_means()
+        return " · ".join(f"{label} {means[stage] * 1000:.0f} ms" for stage, label in STAGE_LABELS if stage in means)
+
+    def write_error_report(self, folder):
+        """Grava a lista de erros em folder/relatorio_erros.txt e retorna o caminho (ou None se não houve erros)."""
+        if not self.errors:
+            return None
+        report_path = Path(folder) / ERROR_REPORT_NAME
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(f"Relatório de erros - {datetime.now().isoformat(timespec='seconds')}\n")
+            f.write(f"{len(self.errors)} de {max(self.total, self.found)} fotos não foram processadas.\n\n")
+            for source_path, message in self.errors:
+                f.write(f"{source_path}\n    {message}\n")
+        return report_path
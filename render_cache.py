@@ -0,0 +1,155 @@
+"""
+Cache de renderização endereçado por conteúdo, compartilhado entre execuções.
+
+A chave é (hash SHA-256 do arquivo de origem, resumo das configurações que
+alteram a imagem: versões, marca d'água, perfis JPEG, decodificação e
+backend). Uma foto reenviada em outra pasta, ou misturada a uma entrega
+posterior, não é decodificada de novo: os JPEGs de cada versão são ligados
+(hardlink) ou copiados do cache para o novo Lote_NNN, com o novo nome, e os
+metadados extraídos do EXIF vêm do índice.
+
+Os arquivos ficam em <pasta>/<2 primeiros caracteres>/<chave>/<versão>.jpg e
+o índice (tamanho, último uso e metadados) em SQLite. Acima de max_mb, as
+entradas usadas há mais tempo são removidas (LRU por tamanho).
+"""
+from collections import namedtuple
+from pathlib import Path
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+DEFAULT_RENDER_CACHE_DIR = Path.home() / ".restorephotos" / "render_cache"
+DEFAULT_RENDER_CACHE_MB = 4096
+INDEX_NAME = "index.sqlite"
+
+# Configuração do cache de renderização; cache_dir=None o desativa.
+RenderCacheConfig = namedtuple("RenderCacheConfig", ["cache_dir", "max_mb"],
+                               defaults=[str(DEFAULT_RENDER_CACHE_DIR), DEFAULT_RENDER_CACHE_MB])
+
+# Entrada encontrada no cache: metadados (sem o endereço) e {nome da versão: caminho do JPEG}.
+CachedRender = namedtuple("CachedRender", ["metadata", "paths"])
+
+
+def content_hash(data=None, path=None):
+    """SHA-256 dos bytes já lidos ou, sem eles, do arquivo (lido em blocos)."""
+    if data is not None:
+        return hashlib.sha256(data).hexdigest()
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(source, destination):
+    """Cria destination como hardlink de source (mesmo disco) ou, se não der, como cópia."""
+    if os.path.lexists(destination):
+        os.remove(destination) # Nunca sobrescreve no lugar: poderia ser um hardlink de outro arquivo
+    try:
+        os.link(source, destination)
+    except OSError: # Outro sistema de arquivos, ou sem suporte a hardlink
+        shutil.copyfile(source, destination)
+
+
+class RenderCache:
+    """
+    JPEGs já renderizados por (hash da origem, resumo das configurações). Pode
+    ser usado por várias threads (as de leitura consultam, as de gravação
+    guardam) e por várias execuções ao mesmo tempo (SQLite em modo WAL).
+    """
+
+    def __init__(self, cache_dir, max_mb=DEFAULT_RENDER_CACHE_MB):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+        import sqlite3 # Só com o cache ativado: fora da partida da interface
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.cache_dir / INDEX_NAME), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS renders ("
+            " key TEXT PRIMARY KEY, renditions TEXT, metadata TEXT, size INTEGER, created_at REAL, last_used REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS renders_last_used ON renders (last_used)")
+        self.conn.commit()
+
+    @staticmethod
+    def key(source_hash, fingerprint):
+        return f"{source_hash}_{fingerprint}"
+
+    def entry_dir(self, key):
+        return self.cache_dir / key[:2] / key
+
+    def get(self, source_hash, fingerprint):
+        """CachedRender da origem com estas configurações, ou None (entradas com arquivos faltando são descartadas)."""
+        key = self.key(source_hash, fingerprint)
+        with self._lock:
+            row = self.conn.execute("SELECT renditions, metadata FROM renders WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                entry_dir = self.entry_dir(key)
+                paths = {name: entry_dir / f"{name}.jpg" for name in json.loads(row[0])}
+                if all(path.exists() for path in paths.values()):
+                    self.conn.execute("UPDATE renders SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self.conn.commit()
+                    self.hits += 1
+                    return CachedRender(json.loads(row[1]), paths)
+                self._delete(key) # Apagados por fora: a entrada não serve mais
+            self.misses += 1
+            return None
+
+    def put(self, source_hash, fingerprint, outputs, metadata):
+        """Guarda os JPEGs ([(Rendition, bytes)]) e os metadados da foto; depois aplica o limite de tamanho."""
+        key = self.key(source_hash, fingerprint)
+        entry_dir = self.entry_dir(key)
+        with self._lock:
+            if self.conn.execute("SELECT 1 FROM renders WHERE key = ?", (key,)).fetchone() is not None:
+                return # Duplicata renderizada ao mesmo tempo, ou outra execução chegou antes
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        size = 0
+        for rendition, jpeg_bytes in outputs:
+            path = entry_dir / f"{rendition.name}.jpg"
+            # Nome próprio de cada gravador: duplicatas renderizadas ao mesmo tempo (outra thread de gravação ou
+            # outra execução com o mesmo cache) não trocam um arquivo que ainda está sendo escrito
+            tmp_path = path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(jpeg_bytes)
+            os.replace(tmp_path, path) # Saídas ligadas a um arquivo antigo continuam com o conteúdo delas
+            size += len(jpeg_bytes)
+
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO renders (key, renditions, metadata, size, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, json.dumps([rendition.name for rendition, _ in outputs]),
+                 json.dumps(metadata, ensure_ascii=False), size, now, now))
+            self.conn.commit()
+            self._evict()
+
+    def _evict(self):
+        """Remove as entradas usadas há mais tempo até o total caber em max_bytes."""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM renders").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute("SELECT key, size FROM renders ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._delete(key)
+            self.evicted += 1
+            total -= size
+
+    def _delete(self, key):
+        self.conn.execute("DELETE FROM renders WHERE key = ?", (key,))
+        self.conn.commit()
+        shutil.rmtree(self.entry_dir(key), ignore_errors=True) # Saídas ligadas por hardlink não são afetadas
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,82 @@
+"""
+Versões (renditions) geradas para cada foto.
+
+Todas saem de uma única decodificação da origem, em cascata (da maior para a
+menor), e cada uma vai para a sua própria pasta dentro de cada Lote_NNN (ex:
+Lote_001/full_hd, Lote_001/thumb).
+"""
+from collections import namedtuple
+import re
+
+FIT_MODES = ("cover", "contain")
+
+# fit: "cover" preenche exatamente size cortando o centro; "contain" cabe inteira dentro de size, sem bordas.
+# watermark: aplica a marca d'água da execução (se houver); profile: perfil JPEG (None = o perfil da execução).
+Rendition = namedtuple("Rendition", ["name", "size", "fit", "watermark", "profile"], defaults=["cover", True, None])
+
+RENDITION_PRESETS = {
+    "full_hd": Rendition("full_hd", (1920, 1080)),
+    "social": Rendition("social", (1080, 1080)),
+    "thumb": Rendition("thumb", (400, 400), fit="contain", watermark=False, profile="web"),
+    "master_4k": Rendition("master_4k", (3840, 2160), watermark=False, profile="archive"),
+}
+DEFAULT_RENDITIONS = (RENDITION_PRESETS["full_hd"],)
+
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$") # Vira nome de pasta
+
+
+def rendition_for_resolution(resolution):
+    """Versão única equivalente à antiga resolução alvo (full_hd se for 1920x1080)."""
+    resolution = tuple(resolution)
+    if resolution == RENDITION_PRESETS["full_hd"].size:
+        return RENDITION_PRESETS["full_hd"]
+    return Rendition(f"{resolution[0]}x{resolution[1]}", resolution)
+
+
+def parse_rendition(spec):
+    """
+    Converte 'preset' ou 'nome=LARGURAxALTURA[:cover|contain][:marca|sem-marca][:perfil]'
+    em uma Rendition (ex: 'social', 'galeria=600x600:contain:sem-marca:web').
+    """
+    spec = spec.strip()
+    if spec in RENDITION_PRESETS:
+        return RENDITION_PRESETS[spec]
+    name, separator, rest = spec.partition("=")
+    if not separator or not _NAME_PATTERN.match(name):
+        raise ValueError(f"Versão inválida: {spec!r} (use um preset ({', '.join(RENDITION_PRESETS)}) "
+                         f"ou nome=LARGURAxALTURA[:cover|contain][:marca|sem-marca][:perfil])")
+    size_text, *options = rest.split(":")
+    try:
+        width, height = (int(part) for part in size_text.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"Tamanho inválido na versão {spec!r}: {size_text!r}") from None
+    if width <= 0 or height <= 0:
+        raise ValueError(f"Tamanho inválido na versão {spec!r}: {size_text!r}")
+
+    rendition = Rendition(name, (width, height))
+    for option in options:
+        if option in FIT_MODES:
+            rendition = rendition._replace(fit=option)
+        elif option in ("marca", "sem-marca"):
+            rendition = rendition._replace(watermark=option == "marca")
+        elif option:
+            rendition = rendition._replace(profile=option) # Validado por get_profile em run_batch
+    return rendition
+
+
+def validate_renditions(renditions):
+    """Confere nomes (únicos, válidos como pasta), tamanhos e modos de ajuste; retorna uma tupla."""
+    renditions = tuple(renditions)
+    if not renditions:
+        raise ValueError("Informe ao menos uma versão de saída")
+    names = [rendition.name for rendition in renditions]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Nomes de versão repetidos: {', '.join(names)}")
+    for rendition in renditions:
+        if not _NAME_PATTERN.match(rendition.name):
+            raise ValueError(f"Nome de versão inválido: {rendition.name!r} (use letras, números, _ e -)")
+        if rendition.fit not in FIT_MODES:
+            raise ValueError(f"Modo de ajuste inválido na versão {rendition.name!r}: {rendition.fit!r}")
+        if min(rendition.size) <= 0:
+            raise ValueError(f"Tamanho inválido na versão {rendition.name!r}: {rendition.size!r}")
+    return renditions
@@ -0,0 +1,186 @@
+"""
+Instrumentação da execução: cronômetros por estágio, histogramas e, no modo
+de perfil, um dump do cProfile e uma linha do tempo no formato Chrome trace.
+
+Os cronômetros ficam sempre ligados (duas leituras de relógio por estágio e
+por foto). O modo de perfil (run_batch(profile_dir=...)) também registra o
+intervalo de cada estágio com processo e thread, para abrir em
+chrome://tracing ou https://ui.perfetto.dev, e liga o cProfile no processo
+principal e em cada processo de trabalho; os dumps são somados em
+perfil.pstats (python -m pstats perfil.pstats).
+"""
+from contextlib import contextmanager
+from pathlib import Path
+import bisect
+import json
+import os
+import threading
+import time
+
+# Estágios de cada foto, na ordem do pipeline (render é o total do estágio de CPU)
+STAGES = ("read", "decode", "resize", "watermark", "metadata", "encode", "render", "write", "finalize",
+          "geocode_wait", "geocode_network")
+HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000) # Limites superiores das faixas
+TRACE_NAME = "trace.json"
+PSTATS_NAME = "perfil.pstats"
+WORKER_PSTATS_PATTERN = "worker-*.pstats"
+
+# cProfile de cada processo de trabalho (só no modo de perfil)
+_worker_profiler = None
+
+
+class StageHistogram:
+    """Durações de um estágio em faixas logarítmicas (contagem, soma e máximo exatos; percentis aproximados)."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.buckets[bisect.bisect_left(HISTOGRAM_BOUNDS_MS, seconds * 1000)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        """Limite superior (s) da faixa que contém o percentil p (o máximo, na última faixa)."""
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                return min(HISTOGRAM_BOUNDS_MS[i] / 1000, self.max) if i < len(HISTOGRAM_BOUNDS_MS) else self.max
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+
+class RunProfile:
+    """
+    Histogramas por estágio da execução e, com trace, os intervalos para o
+    Chrome trace. Pode ser alimentado por várias threads.
+    """
+
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.histograms = {}
+        self.events = []
+        self._thread_names = {} # {(pid, tid): nome}
+        self._lock = threading.Lock()
+
+    def add_timings(self, timings):
+        """Soma as durações (s) de uma foto ({estágio: segundos}) aos histogramas."""
+        with self._lock:
+            for stage, seconds in timings.items():
+                self.histograms.setdefault(stage, StageHistogram()).add(seconds)
+
+    def add_spans(self, spans, pid=None, tid=None, thread_name=None, photo=None):
+        """Registra intervalos [(estágio, início em time.time(), duração)] de um processo/thread."""
+        if not self.trace or not spans:
+            return
+        pid = pid or os.getpid()
+        tid = tid or threading.get_ident()
+        args = {"photo": photo} if photo else {}
+        with self._lock:
+            self._thread_names.setdefault((pid, tid), thread_name or threading.current_thread().name)
+            for stage, start, duration in spans:
+                self.events.append({"name": stage, "cat": "estagio", "ph": "X", "pid": pid, "tid": tid,
+                                    "ts": round(start * 1e6), "dur": round(duration * 1e6), "args": args})
+
+    def record(self, stage, started, photo=None):
+        """Fecha um estágio medido nesta thread (started: time.perf_counter() do início): histograma e trace."""
+        duration = time.perf_counter() - started
+        self.add_timings({stage: duration})
+        if self.trace:
+            self.add_spans([(stage, time.time() - duration, duration)], photo=photo)
+        return duration
+
+    def span(self, stage, started, photo=None):
+        """Como record, mas só no trace (a duração já chega aos histogramas pelos timings da foto)."""
+        if self.trace:
+            duration = time.perf_counter() - started
+            self.add_spans([(stage, time.time() - duration, duration)], photo=photo)
+
+    def write_chrome_trace(self, path):
+        """Grava a linha do tempo (formato Trace Event do Chrome) com nomes de processos e threads."""
+        main_pid = os.getpid()
+        metadata = []
+        for pid in sorted({pid for pid, _ in self._thread_names}):
+            name = "principal" if pid == main_pid else f"trabalho {pid}"
+            metadata.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": name}})
+        for (pid, tid), name in self._thread_names.items():
+            metadata.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + sorted(self.events, key=lambda event: event["ts"]),
+                       "displayTimeUnit": "ms"}, f)
+
+    def summary_lines(self):
+        """Uma linha por estágio: contagem, média, p50, p95 e máximo (ms)."""
+        lines = []
+        for stage in sorted(self.histograms, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES)):
+            histogram = self.histograms[stage]
+            lines.append(f"{stage:<16} n={histogram.count:<6} média {histogram.mean() * 1000:8.1f} ms"
+                         f" · p50 ≤{histogram.percentile(50) * 1000:7.0f} ms"
+                         f" · p95 ≤{histogram.percentile(95) * 1000:7.0f} ms · máx {histogram.max * 1000:7.0f} ms")
+        return lines
+
+
+class StageClock:
+    """
+    Cronômetro de uma foto: mark(estágio) soma o tempo desde a marca anterior
+    em timings e, se spans for uma lista, guarda o intervalo para o trace.
+    """
+
+    def __init__(self, timings, spans=None):
+        self.timings = timings
+        self.spans = spans
+        self._last = time.perf_counter()
+        self._wall_offset = time.time() - self._last # Converte perf_counter em horário (comparável entre processos)
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + now - self._last
+        if self.spans is not None:
+            self.spans.append((stage, self._last + self._wall_offset, now - self._last))
+        self._last = now
+
+
+@contextmanager
+def worker_profile(profile_dir):
+    """Liga o cProfile deste processo durante o bloco e grava o acumulado em profile_dir/worker-<pid>.pstats."""
+    global _worker_profiler
+    if not profile_dir:
+        yield
+        return
+    if _worker_profiler is None:
+        import cProfile # Só no modo de perfil
+
+        _worker_profiler = cProfile.Profile()
+    _worker_profiler.enable()
+    try:
+        yield
+    finally:
+        _worker_profiler.disable()
+        _worker_profiler.dump_stats(str(Path(profile_dir) / f"worker-{os.getpid()}.pstats"))
+
+
+def merge_pstats(profile_dir, main_profiler=None):
+    """Soma o perfil do processo principal e os dos processos de trabalho em profile_dir/perfil.pstats."""
+    import pstats
+
+    profile_dir = Path(profile_dir)
+    sources = ([main_profiler] if main_profiler is not None else []) + sorted(
+        str(path) for path in profile_dir.glob(WORKER_PSTATS_PATTERN))
+    if not sources:
+        return None
+    stats = pstats.Stats(sources[0])
+    for source in sources[1:]:
+        stats.add(source)
+    path = profile_dir / PSTATS_NAME
+    stats.dump_stats(str(path))
+    return path
@@ -0,0 +1,303 @@
+"""
+Processamento distribuído: várias máquinas (ou processos) dividem a mesma
+pasta de entrada por meio de um livro de tarefas na pasta de saída
+compartilhada (NAS), sem servidor de filas.
+
+    FT TRATADAS 2025/.ledger/
+        plan.json                    fotos de cada lote, com o índice de cada uma
+        plan.lease                   posse de quem está montando o plano
+        <plano>/leases/Lote_NNN.lease  posse de quem está processando o lote
+        <plano>/done/Lote_NNN          lote concluído
+
+O primeiro nó a chegar monta o plano com o planejador de sempre (manifesto e
+varredura), então lotes e índices são os mesmos de uma execução em uma
+máquina só. Depois, cada nó reivindica um lote por vez (criação exclusiva do
+arquivo de posse), processa as fotos dele e o marca como concluído.
+
+Quem tem uma posse a renova a cada lease_seconds / 4 (um contador dentro do
+arquivo). Uma posse que não muda por lease_seconds, medidos no relógio de quem
+observa (relógios desencontrados entre máquinas não importam), é de um nó que
+caiu: o arquivo é renomeado (só um nó consegue) e o lote é reprocessado; antes
+disso o nó relê do manifesto do nó anterior os registros das fotos do lote
+(on_recovered), e as que ele já tinha concluído são puladas. Um nó que perde a
+posse (ex: ficou parado mais que lease_seconds) não marca o lote.
+
+Quando todos os lotes terminam, o próximo nó a chegar arquiva o plano (uma
+renomeação, que só um nó consegue) e monta um novo, com uma pasta própria para
+posses e lotes concluídos.
+"""
+from collections import namedtuple
+from pathlib import Path
+import json
+import os
+import re
+import shutil
+import socket
+import threading
+import time
+
+LEDGER_DIR_NAME = ".ledger"
+PLAN_NAME = "plan.json"
+PLAN_LEASE_NAME = "plan.lease"
+DEFAULT_LEASE_SECONDS = 60
+WAIT_SECONDS = 0.5 # Consulta ao livro enquanto os lotes restantes estão com outros nós
+
+# Configuração do modo distribuído; node_id=None usa <máquina>-<pid>.
+ShardConfig = namedtuple("ShardConfig", ["node_id", "lease_seconds"], defaults=[None, DEFAULT_LEASE_SECONDS])
+
+
+def default_node_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _safe_name(node_id):
+    """Identificador do nó utilizável em nomes de arquivo."""
+    return re.sub(r"[^A-Za-z0-9._-]", "_", node_id)
+
+
+def _create_exclusive(path, content):
+    """Cria o arquivo só se ele não existir (O_EXCL); False se outro nó chegou antes."""
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    return True
+
+
+def _read_text(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _owner(content):
+    try:
+        return json.loads(content)["node"]
+    except (TypeError, ValueError, KeyError):
+        return None # Arquivo vazio ou sendo regravado
+
+
+class ShardLedger:
+    """Livro de tarefas de um nó: plano, posses dos lotes e lotes concluídos."""
+
+    def __init__(self, processed_base_dir, config=ShardConfig()):
+        self.node_id = _safe_name(config.node_id or default_node_id())
+        self.lease_seconds = config.lease_seconds
+        self.root = Path(processed_base_dir) / LEDGER_DIR_NAME
+        self.plan = None
+        self.plan_dir = None # Posses e lotes concluídos do plano em andamento
+        self.lots_done = 0 # Lotes concluídos por este nó
+        self.recovered = 0 # Posses abandonadas que este nó recuperou
+        self.held = {} # {caminho da posse: contador}
+        self.lost = set() # Posses tomadas por outro nó enquanto este processava
+        self._observed = {} # {caminho da posse: (conteúdo, visto desde)} para detectar posses paradas
+        self._pending = {} # {número do lote: fotos ainda não concluídas}
+        self._lot_of = {} # {caminho da foto: número do lote}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = threading.Thread(target=self._renew_loop, name="ledger-heartbeat", daemon=True)
+
+    def start(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._heartbeat.start()
+
+    def close(self):
+        """Para a renovação e devolve as posses ainda abertas (outro nó pode assumir sem esperar)."""
+        self._stop.set()
+        with self._lock:
+            for path in list(self.held):
+                self._release_locked(path)
+
+    # --- Posses ---
+
+    def _lease_content(self, beat):
+        return json.dumps({"node": self.node_id, "beat": beat})
+
+    def _acquire(self, path):
+        """Toma a posse em path: se estiver livre ou, se estiver parada há lease_seconds, de um nó que caiu."""
+        path = str(path)
+        if _create_exclusive(path, self._lease_content(0)):
+            with self._lock:
+                self.held[path] = 0
+            return True
+        content = _read_text(path)
+        if content is None or not self._is_stale(path, content):
+            return False
+        stale_path = f"{path}.stale-{self.node_id}"
+        try:
+            os.rename(path, stale_path) # Atômico: só um nó recupera a posse
+        except FileNotFoundError:
+            return False
+        os.remove(stale_path)
+        self._observed.pop(path, None)
+        print(f"Posse abandonada recuperada: {Path(path).stem} (de {_owner(content)})")
+        self.recovered += 1
+        return self._acquire(path)
+
+    def _is_stale(self, path, content):
+        now = time.monotonic()
+        seen = self._observed.get(path)
+        if seen is None or seen[0] != content:
+            self._observed[path] = (content, now)
+            return False
+        return now - seen[1] >= self.lease_seconds
+
+    def _release_locked(self, path):
+        self.held.pop(path, None)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _renew_loop(self):
+        while not self._stop.wait(self.lease_seconds / 4):
+            with self._lock:
+                for path, beat in list(self.held.items()):
+                    if _owner(_read_text(path)) != self.node_id:
+                        del self.held[path]
+                        self.lost.add(path)
+                        print(f"Aviso: a posse de {Path(path).stem} passou para outro nó")
+                        continue
+                    with open(path, "r+", encoding="utf-8") as f: # No lugar: o arquivo continua o mesmo
+                        f.write(self._lease_content(beat + 1))
+                        f.truncate()
+                        f.flush()
+                        os.fsync(f.fileno())
+                    self.held[path] = beat + 1
+
+    # --- Plano ---
+
+    def _load_plan(self):
+        content = _read_text(self.root / PLAN_NAME)
+        return json.loads(content) if content else None
+
+    def _all_done(self, plan):
+        done_dir = self.root / plan["generation"] / "done"
+        return all((done_dir / lot_name(lot["lot"])).exists() for lot in plan["lots"])
+
+    def _archive(self, plan):
+        """Arquiva um plano concluído (só um nó consegue renomeá-lo) e remove a pasta dele."""
+        archived = self.root / f"{PLAN_NAME}.{plan['generation']}.done"
+        try:
+            os.rename(self.root / PLAN_NAME, archived)
+        except FileNotFoundError:
+            return # Outro nó já arquivou
+        shutil.rmtree(self.root / plan["generation"], ignore_errors=True)
+        os.remove(archived)
+
+    def ensure_plan(self, build_jobs, fingerprint):
+        """
+        Carrega o plano em andamento ou, se não houver (ou se o último já foi
+        concluído), monta um com build_jobs() ([(chave da foto, índice, lote)])
+        enquanto os outros nós esperam.
+        """
+        built = False
+        while True:
+            plan = self._load_plan()
+            if plan is not None and not built and self._all_done(plan):
+                self._archive(plan)
+                continue
+            if plan is not None:
+                if plan["fingerprint"] != fingerprint:
+                    raise ValueError("As configurações deste nó (marca d'água, versões, perfis ou tamanho do lote) "
+                                     f"são diferentes das do plano em andamento em {self.root}")
+                self.plan = plan
+                self.plan_dir = self.root / plan["generation"]
+                return plan
+            lease_path = self.root / PLAN_LEASE_NAME
+            if self._acquire(lease_path):
+                try:
+                    if self._load_plan() is None: # Pode ter sido gravado enquanto a posse era recuperada
+                        self._write_plan(build_jobs(), fingerprint)
+                        built = True # Mesmo sem lotes (tudo já concluído), este plano vale para esta execução
+                finally:
+                    with self._lock:
+                        self._release_locked(str(lease_path))
+                continue
+            time.sleep(WAIT_SECONDS)
+
+    def _write_plan(self, jobs, fingerprint):
+        lots = {}
+        for source_key, index, lot_number in sorted(jobs, key=lambda job: job[1]):
+            lots.setdefault(lot_number, []).append([source_key, index])
+        generation = f"{time.strftime('%Y%m%d-%H%M%S')}-{self.node_id}"
+        (self.root / generation / "leases").mkdir(parents=True)
+        (self.root / generation / "done").mkdir()
+        plan = {"fingerprint": fingerprint, "generation": generation, "node": self.node_id,
+                "lots": [{"lot": lot_number, "sources": sources} for lot_number, sources in sorted(lots.items())]}
+        tmp_path = self.root / f"{PLAN_NAME}.{self.node_id}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(plan, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.root / PLAN_NAME)
+
+    # --- Lotes ---
+
+    def paths(self, input_dir, on_recovered=None):
+        """
+        Gera as fotos dos lotes que este nó reivindica, um lote por vez, e None
+        a cada WAIT_SECONDS enquanto os lotes restantes estão com outros nós.
+        Termina quando todos os lotes do plano estão concluídos ou reivindicados
+        por este nó. Quando o lote vem de uma posse abandonada, on_recovered
+        (chaves das fotos do lote) é chamado antes de gerar as fotos dele.
+        """
+        done_dir = self.plan_dir / "done"
+        while True:
+            remaining = [lot for lot in self.plan["lots"] if not (done_dir / lot_name(lot["lot"])).exists()
+                         and lot["lot"] not in self._pending]
+            if not remaining:
+                return
+            claimed = None
+            for lot in remaining:
+                recovered = self.recovered
+                if self._acquire(self._lease_path(lot["lot"])):
+                    if (done_dir / lot_name(lot["lot"])).exists(): # Concluído entre a consulta e a posse
+                        with self._lock:
+                            self._release_locked(self._lease_path(lot["lot"]))
+                        continue
+                    claimed = lot
+                    break
+            if claimed is None:
+                time.sleep(WAIT_SECONDS)
+                yield None
+                continue
+            if self.recovered > recovered and on_recovered is not None:
+                on_recovered([source_key for source_key, _ in claimed["sources"]])
+            paths = [Path(input_dir) / source_key for source_key, _ in claimed["sources"]]
+            with self._lock:
+                self._pending[claimed["lot"]] = len(paths)
+                self._lot_of.update((str(path), claimed["lot"]) for path in paths)
+            yield from paths
+
+    def _lease_path(self, lot_number):
+        return str(self.plan_dir / "leases" / f"{lot_name(lot_number)}.lease")
+
+    def finished(self, source_path):
+        """Uma foto do lote terminou (concluída, com erro ou pulada); o último a terminar conclui o lote."""
+        lot_number = self._lot_of.pop(str(source_path), None)
+        if lot_number is None:
+            return
+        self._pending[lot_number] -= 1
+        if self._pending[lot_number] == 0:
+            self._complete(lot_number)
+
+    def _complete(self, lot_number):
+        lease_path = self._lease_path(lot_number)
+        with self._lock:
+            if lease_path in self.lost or lease_path not in self.held:
+                return # Outro nó assumiu o lote e o concluirá
+            with open(self.plan_dir / "done" / lot_name(lot_number), "w", encoding="utf-8") as f:
+                json.dump({"node": self.node_id, "finished": time.strftime("%Y-%m-%dT%H:%M:%S")}, f)
+            self._release_locked(lease_path)
+        self.lots_done += 1
+
+
+def lot_name(lot_number):
+    return f"Lote_{lot_number:03d}"
@@ -0,0 +1,119 @@
+"""
+Simulação do modo distribuído em uma máquina só: vários processos
+photo_processor_cli.py --shard dividem uma pasta temporária, um deles é
+derrubado no meio (SIGKILL) e os demais recuperam o lote dele quando a posse
+expira. No fim, os JPEGs (nomes, lotes e conteúdo) são comparados com os de
+uma execução normal em um único processo.
+
+Exemplo:
+    python shard_simulation.py --photos 120 --nodes 3 --lot-size 7 --kill-after 2
+"""
+import argparse
+import hashlib
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark_pipeline import synthetic_image
+from photo_processor_core import PROCESSED_DIR_NAME
+
+CLI = str(Path(__file__).with_name("photo_processor_cli.py"))
+
+
+def generate_photos(folder, count, seed=0):
+    """JPEGs pequenos em algumas subpastas (como cartões de fotógrafos diferentes)."""
+    rng = random.Random(seed)
+    for i in range(count):
+        subfolder = Path(folder) / f"cartao_{i % 4 + 1}"
+        subfolder.mkdir(parents=True, exist_ok=True)
+        img = synthetic_image(rng.choice((640, 800, 960)), rng.choice((480, 600)), seed=i)
+        img.save(subfolder / f"IMG_{i:04d}.jpg", quality=85)
+
+
+def output_digests(output_dir):
+    """{caminho relativo do JPEG: SHA-256} da pasta de saída."""
+    base_dir = Path(output_dir) / PROCESSED_DIR_NAME
+    return {path.relative_to(base_dir).as_posix(): hashlib.sha256(path.read_bytes()).hexdigest()
+            for path in base_dir.rglob("*.jpg")}
+
+
+def cli_args(input_dir, output_dir, lot_size, workers):
+    return [sys.executable, CLI, str(input_dir), str(output_dir), "--no-watermark", "--offline", "--no-geocode-cache",
+            "--lot-size", str(lot_size), "--workers", str(workers)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simula o modo distribuído com vários processos locais.")
+    parser.add_argument("--photos", type=int, default=120, help="Fotos sintéticas (padrão: %(default)s)")
+    parser.add_argument("--nodes", type=int, default=3, help="Processos (nós) simultâneos (padrão: %(default)s)")
+    parser.add_argument("--lot-size", type=int, default=7, help="Fotos por lote (padrão: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1, help="Processos de trabalho por nó (padrão: %(default)s)")
+    parser.add_argument("--lease-seconds", type=float, default=3.0,
+                        help="Validade das posses sem renovação (padrão: %(default)s)")
+    parser.add_argument("--kill-after", type=float, default=2.0,
+                        help="Derruba o primeiro nó após estes segundos; 0 não derruba (padrão: %(default)s)")
+    parser.add_argument("--keep", action="store_true", help="Mantém a pasta temporária para inspeção")
+    args = parser.parse_args(argv)
+
+    work_dir = Path(tempfile.mkdtemp(prefix="shard_sim_"))
+    try:
+        input_dir = work_dir / "entrada"
+        generate_photos(input_dir, args.photos)
+        print(f"{args.photos} fotos em {input_dir}")
+
+        started = time.perf_counter()
+        subprocess.run(cli_args(input_dir, work_dir / "referencia", args.lot_size, args.workers),
+                       stdout=subprocess.DEVNULL, check=True)
+        print(f"Execução de referência (1 processo): {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        logs = []
+        nodes = []
+        for i in range(args.nodes):
+            log = open(work_dir / f"no_{i}.log", "w")
+            logs.append(log)
+            command = cli_args(input_dir, work_dir / "distribuida", args.lot_size, args.workers) + [
+                "--shard", "--node-id", f"no_{i}", "--lease-seconds", str(args.lease_seconds)]
+            # Cada nó em um grupo de processos próprio: o SIGKILL derruba também os processos de trabalho dele
+            nodes.append(subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, start_new_session=True))
+        if args.kill_after > 0:
+            time.sleep(args.kill_after)
+            if nodes[0].poll() is None:
+                os.killpg(nodes[0].pid, signal.SIGKILL)
+                print(f"no_0 derrubado após {args.kill_after:g}s")
+        codes = [node.wait() for node in nodes]
+        for log in logs:
+            log.close()
+        print(f"Execução distribuída ({args.nodes} nós): {time.perf_counter() - started:.1f}s, códigos {codes}")
+        for i in range(args.nodes):
+            for line in (work_dir / f"no_{i}.log").read_text(encoding="utf-8").splitlines():
+                if line.startswith(("Modo distribuído", "Posse abandonada", "Aviso")):
+                    print(f"  no_{i}: {line}")
+
+        reference = output_digests(work_dir / "referencia")
+        distributed = output_digests(work_dir / "distribuida")
+        missing = sorted(set(reference) - set(distributed))
+        extra = sorted(set(distributed) - set(reference))
+        different = sorted(name for name in set(reference) & set(distributed) if reference[name] != distributed[name])
+        if missing or extra or different:
+            for label, names in (("faltando", missing), ("a mais", extra), ("com conteúdo diferente", different)):
+                if names:
+                    print(f"{len(names)} JPEGs {label}: {', '.join(names[:5])}")
+            return 1
+        print(f"OK: os {len(reference)} JPEGs (nomes, lotes e conteúdo) são idênticos aos da execução de referência")
+        return 0
+    finally:
+        if args.keep:
+            print(f"Pasta mantida: {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""
+Vídeo de apresentação de um lote ou de uma execução inteira: as fotos
+processadas em sequência, com transição suave (cross-fade) entre elas.
+
+O vídeo é montado em fluxo, uma foto por vez. Um grupo de threads decodifica
+as próximas fotos (no máximo prefetch à frente, então a memória não cresce com
+o tamanho da execução), já reduzidas no próprio libjpeg (draft) e centralizadas
+em um quadro do tamanho do vídeo. Os quadros de cada transição são misturados
+com NumPy em buffers reaproveitados; os quadros parados de uma foto são o mesmo
+array, sem recalcular nada.
+
+Com o PyAV instalado (pip install av), cada foto parada é codificada uma única
+vez, com a duração inteira (MP4 com taxa de quadros variável), e o tempo do
+vídeo acompanha o número de transições, não o de quadros. Sem ele, o
+VideoWriter do OpenCV grava taxa constante: o quadro parado é o mesmo array,
+mas passa pelo codificador em cada quadro.
+
+Exemplo:
+    python slideshow.py "FT TRATADAS 2025" --lote 3 --hold 2 --fade 0.5
+"""
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import sys
+import time
+
+from photo_processor_core import PROCESSED_DIR_NAME, lot_dir_for
+from renditions import DEFAULT_RENDITIONS
+
+SLIDESHOW_NAME = "video_demonstrativo_marca_dagua.mp4"
+VIDEO_FPS = 30
+VIDEO_CODEC = "mp4v" # MPEG-4 Part 2: disponível no OpenCV de qualquer plataforma (H.264 depende do FFmpeg instalado)
+PYAV_CODEC = "mpeg4" # O mesmo codec no PyAV
+VIDEO_BIT_RATE = 8_000_000
+BLEND_SHIFT = 7 # Pesos da transição em 1/128: diferença (±255) × peso cabe em int16
+
+# fps, hold_seconds (foto parada) e fade_seconds (transição); size é o quadro do vídeo (as fotos são
+# centralizadas sem corte); prefetch limita as fotos decodificadas à frente; workers são as threads de decodificação.
+SlideshowConfig = namedtuple("SlideshowConfig", ["fps", "hold_seconds", "fade_seconds", "size", "prefetch", "workers"],
+                             defaults=[VIDEO_FPS, 2.0, 0.5, DEFAULT_RENDITIONS[0].size, 4, 2])
+
+# Resultado: caminho do vídeo, fotos usadas, transições, quadros do vídeo e quadros de fato codificados
+# (menos que frames com o PyAV), fotos ilegíveis, segundos e se foi cancelado
+SlideshowResult = namedtuple("SlideshowResult", ["path", "images", "transitions", "frames", "encoded", "skipped",
+                                                 "seconds", "cancelled"])
+
+
+def slideshow_images(processed_base_dir, rendition_name=DEFAULT_RENDITIONS[0].name, lot_number=None):
+    """JPEGs de uma versão, na ordem dos lotes e dos nomes (só do lote lot_number, se informado)."""
+    base_dir = Path(processed_base_dir)
+    lot_dirs = [lot_dir_for(base_dir, lot_number)] if lot_number is not None else sorted(base_dir.glob("Lote_*"))
+    return [path for lot_dir in lot_dirs for path in sorted((lot_dir / rendition_name).glob("*.jpg"))]
+
+
+def load_frame(image_path, size):
+    """Decodifica a foto (reduzida no libjpeg) e a centraliza em um quadro BGR de size, com bordas pretas."""
+    import numpy as np
+    from PIL import Image
+
+    width, height = size
+    with Image.open(image_path) as img:
+        scale = min(width / img.width, height / img.height)
+        fitted = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        if img.format == "JPEG":
+            img.draft("RGB", fitted)
+        img = img.convert("RGB")
+    if img.size != fitted:
+        img = img.resize(fitted, Image.LANCZOS)
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    left, top = (width - fitted[0]) // 2, (height - fitted[1]) // 2
+    frame[top:top + fitted[1], left:left + fitted[0]] = np.asarray(img)[:, :, ::-1] # RGB -> BGR (OpenCV)
+    return frame
+
+
+class CrossFade:
+    """
+    Quadros intermediários entre duas fotos em aritmética inteira:
+    a + ((b - a) × peso >> 7). A diferença é calculada uma vez por transição
+    e os buffers (int16) são os mesmos em todas.
+    """
+
+    def __init__(self, size):
+        import numpy as np
+
+        self._np = np
+        shape = (size[1], size[0], 3)
+        self.base = np.empty(shape, dtype=np.int16)
+        self.delta = np.empty(shape, dtype=np.int16)
+        self.work = np.empty(shape, dtype=np.int16)
+        self.frame = np.empty(shape, dtype=np.uint8)
+
+    def frames(self, start, end, count):
+        """Gera count quadros de start para end (o mesmo array, sobrescrito a cada quadro)."""
+        np = self._np
+        np.copyto(self.base, start)
+        np.subtract(end, self.base, out=self.delta)
+        for k in range(1, count + 1):
+            weight = round(k * (1 << BLEND_SHIFT) / (count + 1))
+            np.multiply(self.delta, weight, out=self.work)
+            np.right_shift(self.work, BLEND_SHIFT, out=self.work)
+            np.add(self.work, self.base, out=self.work)
+            np.copyto(self.frame, self.work, casting="unsafe")
+            yield self.frame
+
+
+class _OpenCVWriter:
+    """Taxa constante (cv2.VideoWriter): um quadro repetido é enviado ao codificador repeat vezes."""
+
+    def __init__(self, output_path, config):
+        import cv2
+
+        self.encoded = 0
+        self._writer = cv2.VideoWriter(str(output_path), cv2.VideoWriter_fourcc(*VIDEO_CODEC), config.fps,
+                                       tuple(config.size))
+        if not self._writer.isOpened():
+            raise OSError(f"Não foi possível criar o vídeo {output_path} (codec {VIDEO_CODEC})")
+
+    def write(self, frame, repeat=1):
+        for _ in range(repeat):
+            self._writer.write(frame)
+        self.encoded += repeat
+
+    def close(self):
+        self._writer.release()
+
+
+class _PyAVWriter:
+    """
+    Taxa variável (PyAV): um quadro repetido é codificado uma vez e dura
+    repeat quadros. O último é repetido no fim para o vídeo ter a duração certa.
+    """
+
+    def __init__(self, output_path, config):
+        import av
+        from fractions import Fraction
+
+        self._av = av
+        self.encoded = 0
+        self._pts = 0
+        self._last = None
+        self._container = av.open(str(output_path), "w")
+        self._stream = self._container.add_stream(PYAV_CODEC, rate=config.fps)
+        self._stream.width, self._stream.height = config.size
+        self._stream.pix_fmt = "yuv420p"
+        self._stream.bit_rate = VIDEO_BIT_RATE
+        self._stream.codec_context.time_base = Fraction(1, config.fps)
+
+    def _encode(self, frame, pts):
+        video_frame = self._av.VideoFrame.from_ndarray(frame, format="bgr24")
+        video_frame.pts = pts
+        self._container.mux(self._stream.encode(video_frame))
+        self.encoded += 1
+
+    def write(self, frame, repeat=1):
+        self._encode(frame, self._pts)
+        self._pts += repeat
+        self._last = frame if repeat > 1 else None
+
+    def close(self):
+        try:
+            if self._last is not None:
+                self._encode(self._last, self._pts - 1)
+            self._container.mux(self._stream.encode())
+        finally:
+            self._container.close()
+
+
+def _open_writer(output_path, config):
+    """PyAV (opcional) se estiver instalado; senão, o VideoWriter do OpenCV."""
+    from importlib.util import find_spec
+
+    return (_PyAVWriter if find_spec("av") else _OpenCVWriter)(output_path, config)
+
+
+def _prefetched_frames(image_paths, config):
+    """(caminho, quadro ou erro) na ordem, com até config.prefetch fotos decodificando à frente."""
+    with ThreadPoolExecutor(max_workers=max(1, config.workers), thread_name_prefix="slideshow-decode") as pool:
+        pending = deque()
+        paths = iter(image_paths)
+        for path in paths:
+            pending.append((path, pool.submit(load_frame, path, config.size)))
+            if len(pending) >= max(1, config.prefetch):
+                break
+        try:
+            while pending:
+                path, future = pending.popleft()
+                next_path = next(paths, None)
+                if next_path is not None:
+                    pending.append((next_path, pool.submit(load_frame, next_path, config.size)))
+                try:
+                    yield path, future.result()
+                except (OSError, ValueError) as e: # Foto ilegível ou apagada: fica de fora do vídeo
+                    yield path, e
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+def render_slideshow(image_paths, output_path, config=SlideshowConfig(), on_progress=None, cancel=None):
+    """
+    Grava o vídeo (MP4) com as fotos de image_paths. on_progress(feitas, total)
+    é chamado a cada foto (na thread que renderiza); cancel (threading.Event)
+    interrompe o vídeo na foto seguinte, mantendo o que já foi gravado.
+    """
+    image_paths = list(image_paths)
+    if not image_paths:
+        raise ValueError("Nenhuma foto processada para o vídeo")
+    started = time.perf_counter()
+    hold_frames = max(1, round(config.hold_seconds * config.fps))
+    fade_frames = max(0, round(config.fade_seconds * config.fps))
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    writer = _open_writer(output_path, config)
+    fade = CrossFade(config.size) if fade_frames else None
+    previous = None
+    images = transitions = frames = 0
+    skipped = []
+    cancelled = False
+    try:
+        for done, (path, frame) in enumerate(_prefetched_frames(image_paths, config), 1):
+            if cancel is not None and cancel.is_set():
+                cancelled = True
+                break
+            if isinstance(frame, Exception):
+                print(f"Foto fora do vídeo ({path.name}): {frame}")
+                skipped.append(path)
+            else:
+                if previous is not None and fade is not None:
+                    for blended in fade.frames(previous, frame, fade_frames):
+                        writer.write(blended)
+                    frames += fade_frames
+                    transitions += 1
+                writer.write(frame, repeat=hold_frames) # O mesmo array: nada é recalculado
+                frames += hold_frames
+                images += 1
+                previous = frame
+            if on_progress is not None:
+                on_progress(done, len(image_paths))
+    finally:
+        writer.close()
+    return SlideshowResult(output_path, images, transitions, frames, writer.encoded, skipped,
+                           time.perf_counter() - started, cancelled)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Gera o vídeo de apresentação (cross-fade) das fotos processadas.")
+    parser.add_argument("processed_dir", help=f"Pasta das fotos processadas (a {PROCESSED_DIR_NAME})")
+    parser.add_argument("--lote", type=int, default=None, help="Só as fotos deste lote (padrão: a execução inteira)")
+    parser.add_argument("--versao", default=DEFAULT_RENDITIONS[0].name,
+                        help="Versão (pasta dentro de cada lote) usada no vídeo (padrão: %(default)s)")
+    parser.add_argument("--output", default=None, help=f"Arquivo do vídeo (padrão: <pasta>/{SLIDESHOW_NAME})")
+    parser.add_argument("--fps", type=int, default=VIDEO_FPS, help="Quadros por segundo (padrão: %(default)s)")
+    parser.add_argument("--hold", type=float, default=SlideshowConfig().hold_seconds,
+                        help="Segundos de cada foto parada (padrão: %(default)s)")
+    parser.add_argument("--fade", type=float, default=SlideshowConfig().fade_seconds,
+                        help="Segundos de cada transição (padrão: %(default)s)")
+    args = parser.parse_args(argv)
+
+    image_paths = slideshow_images(args.processed_dir, args.versao, args.lote)
+    if not image_paths:
+        print(f"Nenhuma foto da versão {args.versao} em {args.processed_dir}")
+        return 1
+    config = SlideshowConfig(fps=args.fps, hold_seconds=args.hold, fade_seconds=args.fade)
+    result = render_slideshow(image_paths, args.output or Path(args.processed_dir) / SLIDESHOW_NAME, config)
+    print(f"Vídeo salvo em {result.path}: {result.images} fotos, {result.transitions} transições, "
+          f"{result.frames} quadros ({result.encoded} codificados) em {result.seconds:.1f}s "
+          f"({result.seconds / max(result.images, 1) * 1000:.0f} ms por foto)")
+    if result.skipped:
+        print(f"{len(result.skipped)} fotos ilegíveis ficaram de fora")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
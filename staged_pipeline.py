@@ -0,0 +1,129 @@
+"""
+Pipeline em estágios com filas limitadas: leitura (threads) -> CPU (pool de
+processos) -> gravação (threads).
+
+A leitura do disco/NAS e a gravação dos resultados acontecem em paralelo com a
+decodificação e a codificação, e o número de fotos em andamento (bytes lidos,
+imagens em processamento, JPEGs aguardando gravação) nunca passa de
+max_in_flight. Com um orçamento de memória (memory_budget.MemoryBudget), cada
+foto também só é lida depois que a sua estimativa de memória é admitida.
+"""
+from concurrent.futures import Future
+import queue
+import threading
+
+DEFAULT_READER_THREADS = 2
+DEFAULT_WRITER_THREADS = 2
+
+
+class StagedPipeline:
+    """
+    Encadeia read(job) -> render(job, dados) -> write(renderizado).
+
+    read e write rodam em threads deste processo; render é enviado ao executor
+    (deve ser "picklable" se o executor for um ProcessPoolExecutor). Exceções em
+    read e write viram resultados por meio de error_result(job, exceção). Os
+    resultados finais são retirados com get_results(), na thread que preferir.
+    Com budget, estimate(job) dá o custo em bytes reservado da leitura até o
+    resultado final. shortcut(job, dados), se informado, pode devolver o
+    resultado de render já pronto (ex: do cache), sem passar pelo executor.
+    """
+
+    def __init__(self, executor, read, render, write, error_result, readers=DEFAULT_READER_THREADS,
+                 writers=DEFAULT_WRITER_THREADS, max_in_flight=16, budget=None, estimate=None,
+                 shortcut=None):
+        self.executor = executor
+        self.read = read
+        self.render = render
+        self.write = write
+        self.error_result = error_result
+        self.budget = budget
+        self.estimate = estimate
+        self.shortcut = shortcut
+        self.submitted = 0
+        self.finished = 0
+
+        self._slots = threading.BoundedSemaphore(max(1, max_in_flight))
+        self._read_queue = queue.Queue()
+        self._write_queue = queue.Queue()
+        self._results = queue.Queue()
+        self._readers = [threading.Thread(target=self._reader_loop, name=f"leitor-{i}", daemon=True)
+                         for i in range(max(1, readers))]
+        self._writers = [threading.Thread(target=self._writer_loop, name=f"gravador-{i}", daemon=True)
+                         for i in range(max(1, writers))]
+        for thread in self._readers + self._writers:
+            thread.start()
+
+    def submit(self, job):
+        """Enfileira uma foto; bloqueia enquanto já houver max_in_flight fotos em andamento."""
+        self._slots.acquire()
+        self.submitted += 1
+        self._read_queue.put(job)
+
+    def get_results(self, block=False):
+        """Resultados concluídos desde a última chamada; com block, espera ao menos um (se houver pendentes)."""
+        results = []
+        if block and self.finished < self.submitted:
+            results.append(self._results.get())
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                break
+        self.finished += len(results)
+        return results
+
+    @property
+    def pending(self):
+        return self.submitted - self.finished
+
+    def close(self):
+        """Encerra as threads. Chame depois de retirar todos os resultados."""
+        for _ in self._readers:
+            self._read_queue.put(None)
+        for thread in self._readers:
+            thread.join()
+        for _ in self._writers:
+            self._write_queue.put(None)
+        for thread in self._writers:
+            thread.join()
+
+    def _finish(self, result, cost=0):
+        if cost:
+            self.budget.release(cost)
+        self._results.put(result)
+        self._slots.release()
+
+    def _reader_loop(self):
+        while True:
+            job = self._read_queue.get()
+            if job is None:
+                return
+            cost = 0
+            try:
+                if self.budget is not None:
+                    cost = self.estimate(job)
+                    self.budget.acquire(cost) # Espera a memória das fotos anteriores ser liberada
+                data = self.read(job)
+                rendered = self.shortcut(job, data) if self.shortcut is not None else None
+                if rendered is not None:
+                    future = Future()
+                    future.set_result(rendered)
+                else:
+                    future = self.executor.submit(self.render, job, data)
+            except Exception as e:
+                self._finish(self.error_result(job, e), cost)
+                continue
+            future.add_done_callback(lambda f, job=job, cost=cost: self._write_queue.put((job, cost, f)))
+
+    def _writer_loop(self):
+        while True:
+            item = self._write_queue.get()
+            if item is None:
+                return
+            job, cost, future = item
+            try:
+                result = self.write(future.result())
+            except Exception as e:
+                result = self.error_result(job, e)
+            self._finish(result, cost)
@@ -0,0 +1,137 @@
+"""
+Medição da partida da interface: tempo até a janela aparecer e de onde vem o
+tempo de importação, para manter a abertura abaixo de uma meta nos notebooks
+dos operadores.
+
+Cada medição abre photo_processor_gui.py em um processo novo, com
+python -X importtime e no modo sonda (a janela é desenhada uma vez e fechada).
+O tempo da janela vai do início do processo até ela ser desenhada; sem display
+(servidor, CI) mede-se só até o fim das importações.
+
+Exemplo:
+    python startup_timing.py --runs 5 --target-ms 800
+"""
+from collections import namedtuple
+from pathlib import Path
+import sys
+import time
+
+GUI_SCRIPT = Path(__file__).with_name("photo_processor_gui.py")
+STARTUP_PROBE_FLAG = "--sonda-partida"
+PROBE_MARKER = "PARTIDA"
+DEFAULT_TARGET_MS = 1000
+DEFAULT_RUNS = 3
+
+# Uma linha do -X importtime: nível de aninhamento (1 = importado pelo script) e tempos em ms
+ImportTiming = namedtuple("ImportTiming", ["name", "level", "self_ms", "cumulative_ms"])
+
+# Uma medição: ms até a janela (ou até o fim das importações, sem display) e as importações
+StartupMeasurement = namedtuple("StartupMeasurement", ["window_ms", "window_shown", "imports"])
+
+
+def run_probe(build_window):
+    """
+    Lado da interface no modo sonda: build_window() cria a janela Tk; ela é
+    desenhada uma vez e fechada, e o processo que mede é avisado pela saída padrão.
+    """
+    import tkinter as tk
+
+    try:
+        root = build_window()
+    except tk.TclError: # Sem display: a medição fica só com as importações
+        print(f"{PROBE_MARKER} sem-janela", flush=True)
+        return
+    root.update() # Processa os eventos pendentes: a janela é mapeada e desenhada
+    print(f"{PROBE_MARKER} janela", flush=True)
+    root.destroy()
+
+
+def parse_importtime(text):
+    """ImportTiming de cada linha "import time: self | cumulative | nome" (stderr do -X importtime)."""
+    timings = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue # Cabeçalho
+        name = fields[2].rstrip()
+        level = (len(name) - len(name.lstrip()) + 1) // 2
+        timings.append(ImportTiming(name.strip(), level, int(fields[0]) / 1000, int(fields[1]) / 1000))
+    return timings
+
+
+def measure_startup(script=GUI_SCRIPT, timeout=60):
+    """Abre a interface em modo sonda em um processo novo e mede a partida (StartupMeasurement)."""
+    import subprocess
+    import tempfile
+
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as stderr:
+        started = time.perf_counter()
+        process = subprocess.Popen([sys.executable, "-X", "importtime", str(script), STARTUP_PROBE_FLAG],
+                                   stdout=subprocess.PIPE, stderr=stderr, text=True)
+        window_ms = None
+        window_shown = False
+        for line in process.stdout:
+            if line.startswith(PROBE_MARKER):
+                window_ms = (time.perf_counter() - started) * 1000
+                window_shown = line.split()[1] == "janela"
+                break
+        process.stdout.read()
+        process.wait(timeout)
+        stderr.seek(0)
+        log = stderr.read()
+    if window_ms is None:
+        raise RuntimeError(f"A interface terminou sem abrir (código {process.returncode}):\n{log[-2000:]}")
+    return StartupMeasurement(window_ms, window_shown, parse_importtime(log))
+
+
+def package_totals(imports):
+    """{pacote de primeiro nível: ms próprios somados}, do mais caro para o mais barato."""
+    totals = {}
+    for timing in imports:
+        package = timing.name.split(".")[0]
+        totals[package] = totals.get(package, 0.0) + timing.self_ms
+    return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+def report_lines(measurements, target_ms, top=10):
+    """Resumo das medições: tempo até a janela, importações de primeiro nível e pacotes mais caros (da mediana)."""
+    ordered = sorted(measurements, key=lambda measurement: measurement.window_ms)
+    median = ordered[len(ordered) // 2]
+    what = "janela desenhada" if median.window_shown else "fim das importações (sem display)"
+    direct = sorted((timing for timing in median.imports if timing.level == 1),
+                    key=lambda timing: -timing.cumulative_ms)
+    lines = [f"Partida até {what}: mediana {median.window_ms:.0f} ms"
+             f" (mín {ordered[0].window_ms:.0f}, máx {ordered[-1].window_ms:.0f}, {len(ordered)} execuções)"
+             f" · meta {target_ms} ms",
+             f"Importações: {sum(timing.cumulative_ms for timing in direct):.0f} ms",
+             "Importações de primeiro nível (ms acumulados):"]
+    lines += [f"  {timing.name:<28} {timing.cumulative_ms:8.1f}" for timing in direct[:top]]
+    lines.append("Pacotes mais caros (ms próprios, somando os submódulos):")
+    lines += [f"  {package:<28} {ms:8.1f}" for package, ms in list(package_totals(median.imports).items())[:top]]
+    return lines
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mede a partida da interface (tempo até a janela e importações).")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="Medições (padrão: %(default)s)")
+    parser.add_argument("--target-ms", type=int, default=DEFAULT_TARGET_MS,
+                        help="Meta para a mediana; acima dela o código de saída é 1 (padrão: %(default)s)")
+    parser.add_argument("--top", type=int, default=10, help="Linhas de cada lista (padrão: %(default)s)")
+    args = parser.parse_args(argv)
+
+    measurements = [measure_startup() for _ in range(max(1, args.runs))]
+    for line in report_lines(measurements, args.target_ms, args.top):
+        print(line)
+    median_ms = sorted(measurement.window_ms for measurement in measurements)[len(measurements) // 2]
+    if median_ms > args.target_ms:
+        print(f"Acima da meta de {args.target_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,16 @@
+"""Paridade do backend NumPy/OpenCV com o PIL (ver benchmark_pipeline.bench_backend_parity)."""
+import pytest
+
+pytest.importorskip("cv2")
+
+from benchmark_pipeline import DEFAULT_MIN_PSNR, bench_backend_parity, generate_fixtures
+
+
+@pytest.mark.parametrize("fast_decode", [True, False])
+def test_opencv_matches_pil_when_enlarging(tmp_path, fast_decode):
+    # 0,5 MP: todas as fotos (paisagem, retrato e panorâmica) têm menos de 1080 linhas e são ampliadas
+    files, _, watermark_path = generate_fixtures(tmp_path, [0.5], ["jpg", "png"])
+
+    parity = bench_backend_parity(files, watermark_path, fast_decode, DEFAULT_MIN_PSNR)
+
+    assert parity["ok"], parity["files"]
@@ -0,0 +1,90 @@
+"""GeocodeStage contra o Nominatim local de nominatim_stub.py (porta efêmera, sem internet)."""
+import pytest
+
+pytest.importorskip("geopy")
+
+from geopy.exc import GeocoderTimedOut
+
+from geocode_cache import GeocodeConfig
+from geocode_stage import GeocodeStage
+from nominatim_stub import DEFAULT_ADDRESS, start_server
+
+MIN_INTERVAL = 0.2 # Rate limiter mais curto que o do Nominatim público, para o teste não demorar
+MANAUS = [(-3.1190, -60.0217), (-3.1200, -60.0230), (-3.1185, -60.0210)] # A menos de 1 km uns dos outros
+RIO = (-22.9068, -43.1729)
+
+
+@pytest.fixture
+def stub():
+    """Inicia servidores locais do Nominatim: stub(fail_every) -> (url, estado)."""
+    servers = []
+
+    def start(fail_every=0):
+        server, state = start_server(port=0, fail_every=fail_every)
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}", state
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def run_stage(config, points):
+    """Envia os pontos a um GeocodeStage novo e retorna [(endereço, origem)] (ou a exceção de cada um)."""
+    stage = GeocodeStage(config, min_interval=MIN_INTERVAL, backoff_seconds=0.01)
+    try:
+        futures = [stage.submit(lat, lon) for lat, lon in points]
+        results = [future.exception(timeout=30) or future.result() for future in futures]
+    finally:
+        stage.close()
+    return stage, results
+
+
+def geocode_config(tmp_path, url, retries=2):
+    return GeocodeConfig(cache_path=str(tmp_path / "geocode.sqlite"), nominatim_url=url, retries=retries)
+
+
+def test_cluster_uses_one_request_under_the_rate_limiter(tmp_path, stub):
+    url, state = stub()
+
+    stage, results = run_stage(geocode_config(tmp_path, url), MANAUS + [RIO])
+
+    assert [source for _, source in results] == ["network", "cluster", "cluster", "network"]
+    assert all(address == DEFAULT_ADDRESS for address, _ in results)
+    assert stage.network_requests == len(state.requests) == 2 # Uma por cluster
+    intervals = [b[0] - a[0] for a, b in zip(state.requests, state.requests[1:])]
+    assert min(intervals) >= MIN_INTERVAL * 0.9
+
+
+def test_timed_out_request_is_retried(tmp_path, stub):
+    url, state = stub(fail_every=2) # A 2ª requisição recebe 504 (GeocoderTimedOut no geopy)
+
+    stage, results = run_stage(geocode_config(tmp_path, url), [MANAUS[0], RIO])
+
+    assert results == [(DEFAULT_ADDRESS, "network"), (DEFAULT_ADDRESS, "network")]
+    assert [status for _, _, _, status in state.requests] == [200, 504, 200]
+    assert stage.retries == 1
+
+
+def test_retries_are_bounded(tmp_path, stub):
+    url, state = stub(fail_every=1)
+
+    stage, results = run_stage(geocode_config(tmp_path, url, retries=1), [RIO])
+
+    assert isinstance(results[0], GeocoderTimedOut)
+    assert len(state.requests) == 2 # A consulta e uma nova tentativa
+
+
+def test_second_run_is_served_from_the_cache(tmp_path, stub):
+    url, state = stub()
+    config = geocode_config(tmp_path, url)
+    run_stage(config, MANAUS + [RIO])
+    requests_first_run = len(state.requests)
+
+    stage, results = run_stage(config, MANAUS + [RIO])
+
+    assert len(state.requests) == requests_first_run # Nenhuma requisição nova
+    assert stage.network_requests == 0
+    assert [source for _, source in results] == ["cache_hit", "cluster", "cluster", "cache_hit"]
+    assert all(address == DEFAULT_ADDRESS for address, _ in results)
@@ -0,0 +1,92 @@
+"""Recuperação do lote de um nó derrubado no modo distribuído (ver shard_ledger e shard_simulation)."""
+from processing_manifest import ProcessingManifest, source_signature
+from shard_ledger import ShardConfig, ShardLedger, lot_name
+
+LEASE_SECONDS = 0.2
+FINGERPRINT = "teste"
+MAX_WAITS = 20 # Esperas de WAIT_SECONDS antes de desistir: sem recuperação o nó sobrevivente esperaria para sempre
+
+
+def build_jobs():
+    # 4 fotos em 2 lotes de 2: [(chave da foto, índice, lote)]
+    return [(f"IMG_{i:04d}.jpg", i, i // 2 + 1) for i in range(4)]
+
+
+def kill_after_first_claim(tmp_path, input_dir):
+    """Nó que reivindica o Lote_001 e cai sem concluir nem devolver a posse (a renovação para, como em um SIGKILL)."""
+    killed = ShardLedger(tmp_path, ShardConfig("no_0", LEASE_SECONDS))
+    killed.start()
+    killed.ensure_plan(build_jobs, FINGERPRINT)
+    assert next(killed.paths(input_dir)) == input_dir / "IMG_0000.jpg"
+    killed._stop.set()
+
+
+def run_survivor(tmp_path, input_dir, on_recovered=None, on_path=None):
+    """Processa todos os lotes restantes em outro nó; retorna o livro e os nomes das fotos geradas."""
+    survivor = ShardLedger(tmp_path, ShardConfig("no_1", LEASE_SECONDS))
+    survivor.start()
+    try:
+        survivor.ensure_plan(build_jobs, FINGERPRINT)
+        processed = []
+        waits = 0
+        for path in survivor.paths(input_dir, on_recovered=on_recovered):
+            if path is None:
+                waits += 1
+                assert waits < MAX_WAITS, "o Lote_001 do nó derrubado não foi recuperado"
+            else:
+                if on_path is None or on_path(path):
+                    processed.append(path.name)
+                survivor.finished(path)
+    finally:
+        survivor.close()
+    return survivor, processed
+
+
+def test_lot_of_killed_node_is_recovered(tmp_path):
+    input_dir = tmp_path / "entrada"
+    kill_after_first_claim(tmp_path, input_dir)
+
+    survivor, processed = run_survivor(tmp_path, input_dir)
+
+    assert sorted(processed) == [source_key for source_key, _, _ in build_jobs()]
+    assert survivor.recovered == 1
+    assert survivor.lots_done == 2
+    done_dir = survivor.plan_dir / "done"
+    assert all((done_dir / lot_name(lot)).exists() for lot in (1, 2))
+    assert not list((survivor.plan_dir / "leases").iterdir())
+
+
+def test_recovered_lot_skips_photos_the_killed_node_finished(tmp_path):
+    input_dir = tmp_path / "entrada"
+    input_dir.mkdir()
+    for source_key, _, _ in build_jobs():
+        (input_dir / source_key).write_bytes(source_key.encode())
+    # Os dois nós começam juntos: o manifesto do sobrevivente é carregado antes de o outro concluir qualquer foto
+    manifest = ProcessingManifest(tmp_path, node="no_1")
+    kill_after_first_claim(tmp_path, input_dir)
+    output_path = tmp_path / "Lote_001" / "IMG_0000.jpg"
+    output_path.parent.mkdir()
+    output_path.write_bytes(b"jpeg")
+    killed_manifest = ProcessingManifest(tmp_path, node="no_0")
+    killed_manifest.record("IMG_0000.jpg", index=0, status="done", output_path=str(output_path),
+                           signature=source_signature(input_dir / "IMG_0000.jpg"), fingerprint=FINGERPRINT)
+    killed_manifest.close()
+
+    refreshed = []
+
+    def on_recovered(source_keys):
+        refreshed.append(source_keys)
+        manifest.refresh(source_keys)
+
+    def needs_render(path):
+        source_key = path.relative_to(input_dir).as_posix()
+        return not manifest.is_done(source_key, source_signature(path), FINGERPRINT)
+
+    try:
+        survivor, processed = run_survivor(tmp_path, input_dir, on_recovered, needs_render)
+    finally:
+        manifest.close()
+
+    assert refreshed == [["IMG_0000.jpg", "IMG_0001.jpg"]]
+    assert sorted(processed) == ["IMG_0001.jpg", "IMG_0002.jpg", "IMG_0003.jpg"]
+    assert survivor.lots_done == 2
@@ -0,0 +1,209 @@
+"""
+Miniaturas para a pré-visualização da interface, com cache em disco.
+
+A chave é (caminho absoluto, mtime, tamanho do arquivo e lado da miniatura):
+uma foto alterada ganha miniatura nova e a antiga sai pelo LRU. As miniaturas
+ficam em <pasta>/<2 primeiros caracteres>/<chave>.jpg e o índice (tamanho e
+último uso) em SQLite, como no cache de renderização; acima de max_mb as
+usadas há mais tempo são removidas.
+
+As miniaturas são geradas fora da thread da interface (ThumbnailLoader), com
+decodificação reduzida do JPEG (draft): uma foto de 24 MP é lida a 1/8 da
+resolução. Pedidos que deixaram de interessar (a grade rolou para longe) são
+descartados antes de decodificar.
+
+Exemplo (gera as miniaturas de uma pasta e mede o tempo com e sem o cache):
+    python thumbnail_cache.py ./entrada
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import hashlib
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+DEFAULT_THUMBNAIL_CACHE_DIR = Path.home() / ".restorephotos" / "thumbnails"
+DEFAULT_THUMBNAIL_CACHE_MB = 256
+DEFAULT_THUMBNAIL_SIZE = 160 # Lado maior da miniatura, em pixels
+DEFAULT_LOADER_THREADS = 2
+THUMBNAIL_QUALITY = 80
+INDEX_NAME = "index.sqlite"
+
+
+def build_thumbnail(image_path, size=DEFAULT_THUMBNAIL_SIZE):
+    """Miniatura RGB (PIL) com lado maior size, decodificando o JPEG já reduzido e respeitando a orientação EXIF."""
+    from PIL import Image, ImageOps
+
+    with Image.open(image_path) as img:
+        if img.format == "JPEG":
+            img.draft("RGB", (size, size)) # Escala do libjpeg: nunca menor que size
+        img = ImageOps.exif_transpose(img).convert("RGB")
+    img.thumbnail((size, size), Image.BILINEAR)
+    return img
+
+
+class ThumbnailCache:
+    """
+    Miniaturas em disco por (caminho, mtime, tamanho). Pode ser usado por várias
+    threads (as do ThumbnailLoader) e por várias instâncias da interface.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_THUMBNAIL_CACHE_DIR, max_mb=DEFAULT_THUMBNAIL_CACHE_MB,
+                 size=DEFAULT_THUMBNAIL_SIZE):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.cache_dir / INDEX_NAME), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS thumbs (key TEXT PRIMARY KEY, size INTEGER, last_used REAL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS thumbs_last_used ON thumbs (last_used)")
+        self.conn.commit()
+        self.total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM thumbs").fetchone()[0]
+
+    def key(self, image_path):
+        stat = os.stat(image_path)
+        identity = f"{os.path.abspath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}|{self.size}"
+        return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+    def path_for(self, key):
+        return self.cache_dir / key[:2] / f"{key}.jpg"
+
+    def get(self, image_path):
+        """Miniatura (PIL) da foto: do cache ou gerada agora e guardada."""
+        from PIL import Image
+
+        key = self.key(image_path)
+        path = self.path_for(key)
+        with self._lock:
+            known = self.conn.execute("SELECT 1 FROM thumbs WHERE key = ?", (key,)).fetchone() is not None
+            if known:
+                self.conn.execute("UPDATE thumbs SET last_used = ? WHERE key = ?", (time.time(), key))
+                self.conn.commit()
+        if known:
+            try:
+                with Image.open(path) as img:
+                    img.load()
+                self.hits += 1
+                return img
+            except OSError:
+                pass # Apagada por fora: gera de novo
+        self.misses += 1
+        img = build_thumbnail(image_path, self.size)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        img.save(tmp_path, "JPEG", quality=THUMBNAIL_QUALITY)
+        os.replace(tmp_path, path)
+        size = path.stat().st_size
+        with self._lock:
+            previous = self.conn.execute("SELECT size FROM thumbs WHERE key = ?", (key,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO thumbs (key, size, last_used) VALUES (?, ?, ?)",
+                              (key, size, time.time()))
+            self.conn.commit()
+            self.total += size - (previous[0] if previous else 0)
+            self._evict()
+        return img
+
+    def _evict(self):
+        """Remove as miniaturas usadas há mais tempo até o total caber em max_bytes."""
+        if self.total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute("SELECT key, size FROM thumbs ORDER BY last_used").fetchall():
+            if self.total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM thumbs WHERE key = ?", (key,))
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+            self.total -= size
+            self.evicted += 1
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class ThumbnailLoader:
+    """
+    Gera miniaturas em threads próprias. want({célula: caminho}) define o que
+    interessa agora (as células visíveis); pedidos fora dele são descartados
+    sem decodificar. Os resultados (célula, caminho, imagem PIL ou exceção)
+    chegam em results, para a thread da interface consumir.
+    """
+
+    def __init__(self, cache, threads=DEFAULT_LOADER_THREADS):
+        self.cache = cache
+        self.results = queue.Queue()
+        self._wanted = {}
+        self._submitted = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="thumbnail")
+
+    def want(self, cells):
+        with self._lock:
+            self._wanted = dict(cells)
+            new = [(cell, path) for cell, path in cells.items() if cell not in self._submitted]
+            self._submitted.update(cell for cell, _ in new)
+        for cell, path in new:
+            self._pool.submit(self._load, cell, path)
+
+    def _load(self, cell, path):
+        with self._lock:
+            wanted = self._wanted.get(cell) == path
+            if not wanted:
+                self._submitted.discard(cell) # Saiu da tela antes da vez: pode ser pedida de novo
+                return
+        try:
+            result = self.cache.get(path)
+        except Exception as e: # Foto ilegível: a grade mostra o erro no lugar da miniatura
+            result = e
+        with self._lock:
+            self._submitted.discard(cell)
+        self.results.put((cell, path, result))
+
+    def close(self):
+        with self._lock:
+            self._wanted = {}
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def main(argv=None):
+    import argparse
+
+    from image_scan import scan_images
+
+    parser = argparse.ArgumentParser(description="Gera as miniaturas de uma pasta e mede o cache.")
+    parser.add_argument("folder", help="Pasta com as fotos (varrida recursivamente)")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_THUMBNAIL_CACHE_DIR),
+                        help="Pasta do cache (padrão: %(default)s)")
+    parser.add_argument("--threads", type=int, default=DEFAULT_LOADER_THREADS,
+                        help="Threads de geração (padrão: %(default)s)")
+    args = parser.parse_args(argv)
+
+    paths = list(scan_images(args.folder))
+    cache = ThumbnailCache(args.cache_dir)
+    for attempt in ("1ª passada", "2ª passada (cache)"):
+        loader = ThumbnailLoader(cache, args.threads)
+        started = time.perf_counter()
+        loader.want({i: path for i, path in enumerate(paths)})
+        errors = sum(isinstance(loader.results.get()[2], Exception) for _ in paths)
+        elapsed = time.perf_counter() - started
+        loader.close()
+        print(f"{attempt}: {len(paths)} miniaturas em {elapsed:.2f}s "
+              f"({elapsed / max(len(paths), 1) * 1000:.1f} ms cada, {errors} erros) · "
+              f"acertos {cache.hits}, gerações {cache.misses}, removidas {cache.evicted}")
+    cache.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())